@@ -1,6 +1,6 @@
 # api/v1/__init__.py
 from fastapi import APIRouter
-from . import transformation, buffering, storage, rules, alarms, analytics
+from . import transformation, buffering, storage, rules, alarms, analytics, ingest
 
 api_router = APIRouter()
 
@@ -10,3 +10,4 @@ api_router.include_router(storage.router)
 api_router.include_router(rules.router)
 api_router.include_router(alarms.router)
 api_router.include_router(analytics.router)
+api_router.include_router(ingest.router)
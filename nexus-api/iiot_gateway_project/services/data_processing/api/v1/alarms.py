@@ -153,6 +153,7 @@ async def acknowledge_alarm(
 @router.put("/{alarm_id}/clear", summary="Clear Alarm")
 async def clear_alarm(
     alarm_id: str,
+    request: Request,
     alarm_manager: AlarmManager = Depends(get_alarm_manager)
 ):
     """
@@ -168,6 +169,11 @@ async def clear_alarm(
                 status_code=404, 
                 detail="Alarm not found, already cleared, or in an unexpected state."
             )
+
+        # Alarm latch di rule engine (semua worker) kembali normal setelah di-clear operator
+        rule_sync = getattr(request.app.state, 'rule_sync', None)
+        if rule_sync is not None:
+            await rule_sync.publish_release(alarm_id)
             
         return {"message": f"Alarm {alarm_id} cleared successfully."}
         
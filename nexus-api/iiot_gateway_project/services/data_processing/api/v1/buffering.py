@@ -1,11 +1,17 @@
 # api/v1/buffering.py
 from fastapi import APIRouter, HTTPException, Depends, Request
-from typing import List
+from typing import List, Optional
 import logging
+import math
+import time
 
 # Import dari schemas, bukan models
-from ...models.data_processing import BufferedDataEntryResponse
+from ...models.data_processing import (
+    BufferedDataEntryResponse, BufferedBatchEnqueueRequest, BufferedBatchEnqueueResponse
+)
 from ...core.buffer_manager import BufferManager
+from ...core.buffer_quota import BufferQuotaExceeded
+from ...config import config
 
 logger = logging.getLogger(__name__)
 
@@ -14,26 +20,80 @@ router = APIRouter(prefix="/buffering", tags=["buffering"])
 # Dependency untuk mendapatkan BufferManager
 async def get_buffer_manager(request: Request) -> BufferManager:
     """
-    Dependency untuk mendapatkan instance BufferManager.
-    Dalam implementasi produksi, Anda bisa mendapatkan ini dari app state.
+    Dependency untuk mendapatkan instance BufferManager bersama dari app state
+    (dibuat sekali saat startup, dengan connection pool Redis bersama).
     """
-    # Untuk sekarang, kita buat instance baru
-    # Dalam produksi, sebaiknya gunakan singleton dari app state
-    return BufferManager()
+    if not hasattr(request.app.state, 'buffer_manager'):
+        raise HTTPException(status_code=500, detail="BufferManager setup error: Instance not found.")
+
+    if not getattr(request.app.state, 'buffer_manager_initialized', False):
+        raise HTTPException(status_code=500, detail="BufferManager not initialized. Check server logs for startup errors.")
+
+    return request.app.state.buffer_manager
 
 @router.get("/status")
 async def get_buffer_status(buffer_manager: BufferManager = Depends(get_buffer_manager)):
-    """Get current buffering status."""
+    """
+    Get current buffering status for every destination (depth, bytes, oldest entry age,
+    retry histogram, drain rate, quota usage) from one SCAN and one Redis pipeline,
+    cached for BUFFER_METRICS_CACHE_TTL seconds, plus disk spool stats.
+    """
     try:
-        # Implementasi sederhana - bisa diperluas untuk informasi lebih detail
+        destinations = await buffer_manager.get_buffer_metrics()
         return {
-            "status": "active", 
-            "message": "Buffer manager is running. Use specific endpoints for detailed stats."
+            "status": "active",
+            "cache_ttl_seconds": config.BUFFER_METRICS_CACHE_TTL,
+            "default_quota": buffer_manager.quota_for(None).as_dict(),
+            "destinations": destinations,
+            "spool": buffer_manager.spool.stats() if buffer_manager.spool else None
         }
     except Exception as e:
         logger.error(f"Failed to get buffer status: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Failed to retrieve buffer status: {str(e)}")
 
+@router.post("/enqueue/batch", response_model=BufferedBatchEnqueueResponse)
+async def enqueue_batch(
+    request_data: BufferedBatchEnqueueRequest,
+    buffer_manager: BufferManager = Depends(get_buffer_manager)
+):
+    """Enqueue many payloads for a destination, one Redis round trip per chunk."""
+    try:
+        chunk_size = request_data.chunk_size or config.BUFFER_ENQUEUE_CHUNK_SIZE
+        if chunk_size <= 0:
+            raise HTTPException(status_code=400, detail="chunk_size must be positive")
+
+        start = time.perf_counter()
+        entry_ids = await buffer_manager.enqueue_many(
+            request_data.destination, request_data.payloads, request_data.max_retries, chunk_size
+        )
+        elapsed = time.perf_counter() - start
+
+        return BufferedBatchEnqueueResponse(
+            destination=request_data.destination,
+            enqueued_count=len(entry_ids),
+            dropped_count=len(request_data.payloads) - len(entry_ids),
+            chunk_count=math.ceil(len(request_data.payloads) / chunk_size),
+            first_id=entry_ids[0] if entry_ids else None,
+            last_id=entry_ids[-1] if entry_ids else None,
+            elapsed_ms=round(elapsed * 1000, 3),
+            entries_per_second=round(len(entry_ids) / elapsed, 1) if elapsed > 0 else 0.0
+        )
+    except HTTPException:
+        raise
+    except BufferQuotaExceeded as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    except Exception as e:
+        logger.error(f"Failed to enqueue batch for destination {request_data.destination}: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Failed to enqueue batch: {str(e)}")
+
+@router.get("/forwarders")
+async def get_forwarder_stats(request: Request):
+    """Get per-destination forwarder state: batch size, throughput, last latency and errors."""
+    forwarder = getattr(request.app.state, 'buffer_forwarder', None)
+    if forwarder is None:
+        raise HTTPException(status_code=500, detail="Buffer forwarder not configured.")
+    return forwarder.stats()
+
 @router.get("/pending/{destination}", response_model=List[BufferedDataEntryResponse])
 async def get_pending_entries(
     destination: str, 
@@ -42,7 +102,7 @@ async def get_pending_entries(
 ):
     """Get pending entries for a destination."""
     try:
-        entries_dict = buffer_manager.get_pending_entries(destination, limit)
+        entries_dict = await buffer_manager.get_pending_entries(destination, limit)
         
         # Konversi dictionary ke Pydantic model
         entries = []
@@ -69,7 +129,7 @@ async def get_buffer_size(
 ):
     """Get the number of pending entries in buffer for a destination."""
     try:
-        size = buffer_manager.get_buffer_size(destination)
+        size = await buffer_manager.get_buffer_size(destination)
         return {
             "destination": destination,
             "pending_count": size,
@@ -79,6 +139,65 @@ async def get_buffer_size(
         logger.error(f"Failed to get buffer size for destination {destination}: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Failed to retrieve buffer size: {str(e)}")
 
+@router.get("/inflight/{destination}")
+async def get_inflight_entries(
+    destination: str,
+    buffer_manager: BufferManager = Depends(get_buffer_manager)
+):
+    """Get entries delivered to forwarders but not yet acknowledged."""
+    try:
+        return await buffer_manager.get_pending_summary(destination)
+    except Exception as e:
+        logger.error(f"Failed to get in-flight entries for destination {destination}: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Failed to retrieve in-flight entries: {str(e)}")
+
+@router.get("/dead-letter/{destination}")
+async def get_dead_letters(
+    destination: str,
+    limit: int = 10,
+    buffer_manager: BufferManager = Depends(get_buffer_manager)
+):
+    """Get entries that exhausted their retries (or had unreadable payloads) for a destination."""
+    try:
+        return await buffer_manager.get_dead_letters(destination, limit)
+    except Exception as e:
+        logger.error(f"Failed to get dead-letter entries for destination {destination}: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Failed to retrieve dead-letter entries: {str(e)}")
+
+@router.post("/dead-letter/{destination}/replay")
+async def replay_dead_letters(
+    destination: str,
+    entry_ids: Optional[List[str]] = None,
+    limit: int = 100,
+    buffer_manager: BufferManager = Depends(get_buffer_manager)
+):
+    """Move dead-letter entries (given IDs, or the oldest `limit`) back into the buffer with a fresh retry budget."""
+    try:
+        replayed = await buffer_manager.replay_dead_letters(destination, entry_ids, limit)
+        return {
+            "message": f"Replayed {replayed} dead-letter entries.",
+            "destination": destination,
+            "replayed_count": replayed
+        }
+    except Exception as e:
+        logger.error(f"Failed to replay dead-letter entries for destination {destination}: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Failed to replay dead-letter entries: {str(e)}")
+
+@router.post("/codec/train/{destination}")
+async def train_codec_dictionary(
+    destination: str,
+    sample_size: int = 1000,
+    buffer_manager: BufferManager = Depends(get_buffer_manager)
+):
+    """Train a zstd dictionary from a destination's buffered entries and use it for new entries."""
+    try:
+        return await buffer_manager.train_codec_dictionary(destination, sample_size)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Failed to train codec dictionary for destination {destination}: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Failed to train codec dictionary: {str(e)}")
+
 @router.delete("/clear/{destination}")
 async def clear_buffer(
     destination: str,
@@ -87,7 +206,7 @@ async def clear_buffer(
     """Clear all entries from buffer for a destination."""
     try:
         # Cek apakah buffer kosong
-        if buffer_manager.is_destination_buffer_empty(destination):
+        if await buffer_manager.is_destination_buffer_empty(destination):
             return {"message": f"Buffer for destination '{destination}' is already empty."}
         
         # Untuk implementasi yang lebih kompleks, Anda mungkin perlu
@@ -108,9 +227,9 @@ async def acknowledge_entries(
     entry_ids: List[str],
     buffer_manager: BufferManager = Depends(get_buffer_manager)
 ):
-    """Acknowledge and remove specific entries from buffer."""
+    """Acknowledge and remove specific entries (by stream entry ID) from buffer."""
     try:
-        removed_count = buffer_manager.acknowledge_and_remove(destination, entry_ids)
+        removed_count = await buffer_manager.acknowledge_and_remove(destination, entry_ids)
         return {
             "message": f"Successfully acknowledged and removed {removed_count} entries.",
             "destination": destination,
@@ -0,0 +1,114 @@
+# api/v1/ingest.py
+from fastapi import APIRouter, HTTPException, Depends, Request, Query, WebSocket, WebSocketDisconnect
+from typing import List, Optional
+import logging
+from datetime import datetime
+
+from ...core.ingest_pipeline import IngestPipeline
+from ...core.pipeline import CompiledPipeline
+from ...core.transformer import DataTransformer
+from .transformation import get_data_transformer, get_transform_functions_store
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/ingest", tags=["ingest"])
+
+async def get_ingest_pipeline(request: Request) -> IngestPipeline:
+    """Dependency untuk mendapatkan IngestPipeline bersama dari app state."""
+    if not hasattr(request.app.state, 'ingest_pipeline'):
+        raise HTTPException(status_code=500, detail="IngestPipeline setup error: Instance not found.")
+    return request.app.state.ingest_pipeline
+
+def resolve_transform_plan(transformer: DataTransformer, transform_ids: Optional[List[str]]) -> Optional[CompiledPipeline]:
+    """
+    Rantai transformasi sesuai urutan transform_ids, dikompilasi lewat plan cache
+    (sekali per rantai, bukan per batch). Tanpa transform_ids data tidak ditransformasi.
+    """
+    if not transform_ids:
+        return None
+    functions = {f["id"]: f for f in get_transform_functions_store() if f.get("is_active", True)}
+    missing = [transform_id for transform_id in transform_ids if transform_id not in functions]
+    if missing:
+        raise HTTPException(status_code=400, detail=f"Unknown or inactive transform functions: {', '.join(missing)}")
+    return transformer.plan_cache.get([functions[transform_id] for transform_id in transform_ids])
+
+@router.post("/")
+async def ingest_data(
+    request: Request,
+    transform_ids: Optional[List[str]] = Query(None),
+    config_ids: Optional[List[str]] = Query(None),
+    batch_size: Optional[int] = Query(None, gt=0),
+    pipeline: IngestPipeline = Depends(get_ingest_pipeline),
+    transformer: DataTransformer = Depends(get_data_transformer)
+):
+    """
+    Ingest NDJSON data points (one JSON object per line) in a single pass:
+    decode, apply transforms (transform_ids, in order), evaluate alarm rules, persist alarm
+    transitions, and fan out to every active storage backend (or only config_ids).
+    Stages overlap across batches; the response reports per-stage latency.
+    A batch whose transform fails is reported as failed and is neither evaluated nor stored.
+    """
+    try:
+        plan = resolve_transform_plan(transformer, transform_ids)
+        kwargs = {"batch_size": batch_size} if batch_size else {}
+        result = await pipeline.run(request.stream(), plan, config_ids, **kwargs)
+        return {
+            "message": f"Ingested {result['points']} data points in {result['batches']} batches"
+                       + (f" ({result['failed_batches']} failed and not stored)" if result["failed_batches"] else ""),
+            **result,
+            "timestamp": datetime.now().isoformat()
+        }
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Ingest failed: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Failed to ingest data: {str(e)}")
+
+@router.get("/stats")
+async def get_ingest_stats(pipeline: IngestPipeline = Depends(get_ingest_pipeline)):
+    """Get cumulative per-stage latency of the ingest pipeline."""
+    return pipeline.stats()
+
+@router.websocket("/ws")
+async def ingest_websocket(
+    websocket: WebSocket,
+    transform_ids: Optional[List[str]] = Query(None),
+    config_ids: Optional[List[str]] = Query(None)
+):
+    """
+    WebSocket variant of POST /ingest: each message (NDJSON text or bytes) is processed
+    as one batch, and a JSON result with per-stage latency is sent back for every batch.
+    """
+    pipeline = getattr(websocket.app.state, 'ingest_pipeline', None)
+    if pipeline is None:
+        await websocket.close(code=1011, reason="IngestPipeline not initialized")
+        return
+    transformer = getattr(websocket.app.state, 'data_transformer', None) or DataTransformer()
+    try:
+        plan = resolve_transform_plan(transformer, transform_ids)
+    except HTTPException as e:
+        await websocket.close(code=1008, reason=e.detail)
+        return
+    await websocket.accept()
+
+    async def messages():
+        try:
+            while True:
+                message = await websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    return
+                yield message.get("bytes") or (message.get("text") or "").encode()
+        except WebSocketDisconnect:
+            return
+
+    try:
+        result = await pipeline.run(messages(), plan, config_ids, flush_each_chunk=True, on_batch=websocket.send_json)
+        logger.info(f"Ingest WebSocket closed after {result['points']} data points in {result['batches']} batches.")
+    except ValueError as e:
+        await websocket.send_json({"error": str(e)})
+        await websocket.close(code=1009)
+    except Exception as e:
+        logger.error(f"Ingest WebSocket failed: {str(e)}", exc_info=True)
+        await websocket.close(code=1011)
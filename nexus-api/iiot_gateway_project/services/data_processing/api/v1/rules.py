@@ -15,6 +15,7 @@ from ...models.event_alarm import (
 )
 from ...models.alarm_schema import *
 from ...core.alarm_manager import AlarmManager
+from ...core.rule_conditions import ConditionError, compile_condition
 from ...databases import get_db_session
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, update, delete
@@ -68,6 +69,26 @@ except ImportError:
         logger.error(f"Failed to import AlarmRule: {e}")
         raise ImportError("Cannot import AlarmRule model. Please check your project structure.")
 
+async def notify_rule_change(request: Request, rule: AlarmRule = None, rule_id: str = None):
+    """Meneruskan perubahan rule yang sudah di-commit ke RuleEngine (semua worker, lewat RuleSync)."""
+    rule_sync = getattr(request.app.state, 'rule_sync', None)
+    if rule_sync is None:
+        return
+    try:
+        if rule is not None:
+            await rule_sync.publish_upsert(rule)
+        else:
+            await rule_sync.publish_delete(rule_id)
+    except Exception as e:
+        logger.warning(f"Error propagating alarm rule change to rule engine: {e}")
+
+def validate_condition(condition: str):
+    """Menolak kondisi yang tidak bisa dikompilasi RuleEngine (400) sebelum disimpan."""
+    try:
+        compile_condition(condition)
+    except ConditionError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid condition: {e}")
+
 def serialize_alarm_rule(rule: AlarmRule) -> dict:
     """Serialize SQLAlchemy model to dictionary."""
     return {
@@ -198,11 +219,14 @@ async def get_alarm_rule(
 @router.post("/", response_model=AlarmRuleResponse, status_code=201)
 async def create_alarm_rule(
     rule: AlarmRuleCreate,
+    request: Request,
     db: AsyncSession = Depends(get_db_session),
     redis_client: redis.Redis = Depends(get_redis_client)
 ):
     """Create a new alarm rule and invalidate cache."""
     try:
+        validate_condition(rule.condition)
+
         # Buat alarm rule baru
         new_rule = AlarmRule(
             id=str(uuid.uuid4()),
@@ -227,11 +251,15 @@ async def create_alarm_rule(
                 logger.debug("Invalidated alarm rules cache after creation")
             except Exception as e:
                 logger.warning(f"Error invalidating cache after creation: {e}")
+
+        await notify_rule_change(request, rule=new_rule)
         
         # Serialize dan return response
         rule_serialized = serialize_alarm_rule(new_rule)
         return AlarmRuleResponse(**rule_serialized)
         
+    except HTTPException:
+        raise
     except SQLAlchemyError as e:
         await db.rollback()
         logger.error(f"Database error while creating alarm rule: {e}")
@@ -245,6 +273,7 @@ async def create_alarm_rule(
 async def update_alarm_rule(
     rule_id: str,
     rule: AlarmRuleUpdate,
+    request: Request,
     db: AsyncSession = Depends(get_db_session),
     redis_client: redis.Redis = Depends(get_redis_client)
 ):
@@ -265,6 +294,8 @@ async def update_alarm_rule(
 
         # Update fields yang disediakan
         update_data = rule.dict(exclude_unset=True)
+        if update_data.get("condition") is not None:
+            validate_condition(update_data["condition"])
         for field, value in update_data.items():
             if value is not None:
                 setattr(existing_rule, field, value)
@@ -285,6 +316,8 @@ async def update_alarm_rule(
                 logger.debug(f"Invalidated alarm rule cache after update: {rule_id}")
             except Exception as e:
                 logger.warning(f"Error invalidating cache after update: {e}")
+
+        await notify_rule_change(request, rule=existing_rule)
         
         # Serialize dan return response
         rule_serialized = serialize_alarm_rule(existing_rule)
@@ -304,6 +337,7 @@ async def update_alarm_rule(
 @router.delete("/{rule_id}")
 async def delete_alarm_rule(
     rule_id: str,
+    request: Request,
     db: AsyncSession = Depends(get_db_session),
     redis_client: redis.Redis = Depends(get_redis_client)
 ):
@@ -336,6 +370,8 @@ async def delete_alarm_rule(
                 logger.debug(f"Invalidated alarm rule cache after deletion: {rule_id}")
             except Exception as e:
                 logger.warning(f"Error invalidating cache after deletion: {e}")
+
+        await notify_rule_change(request, rule_id=rule_id)
         
         return {
             "message": f"Alarm rule {rule_id} deleted successfully",
@@ -356,6 +392,7 @@ async def delete_alarm_rule(
 @router.post("/{rule_id}/toggle", response_model=AlarmRuleResponse)
 async def toggle_alarm_rule(
     rule_id: str,
+    request: Request,
     db: AsyncSession = Depends(get_db_session),
     redis_client: redis.Redis = Depends(get_redis_client)
 ):
@@ -393,6 +430,8 @@ async def toggle_alarm_rule(
                 logger.debug(f"Invalidated alarm rule cache after toggle: {rule_id}")
             except Exception as e:
                 logger.warning(f"Error invalidating cache after toggle: {e}")
+
+        await notify_rule_change(request, rule=existing_rule)
         
         # Serialize dan return response
         rule_serialized = serialize_alarm_rule(existing_rule)
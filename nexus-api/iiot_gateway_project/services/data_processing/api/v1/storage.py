@@ -1,6 +1,6 @@
 # api/v1/storage.py
-from fastapi import APIRouter, HTTPException, Depends, Request
-from typing import List
+from fastapi import APIRouter, HTTPException, Depends, Request, Query
+from typing import List, Optional, Dict, Any
 import logging
 from datetime import datetime
 
@@ -9,9 +9,13 @@ from ...models.data_processing import (
     StorageConfigResponse, 
     StorageConfigCreate,
     StorageConfigUpdate,
-    DataPointResponse
+    DataPointResponse,
+    DataPointCreate
 )
 from ...core.db_integrator import DatabaseIntegrator
+from ...core.write_router import WriteRouter
+from ...core.ingest_stream import stream_write, StreamIngestError
+from ...config import config as app_config
 
 logger = logging.getLogger(__name__)
 
@@ -40,13 +44,40 @@ def get_storage_configs_store():
         }
     ]
 
+def find_storage_config(config_id: str) -> Optional[Dict[str, Any]]:
+    """Mencari konfigurasi storage berdasarkan ID (dipakai juga oleh forwarder buffer)."""
+    return next((c for c in get_storage_configs_store() if c["id"] == config_id), None)
+
+def get_active_storage_config(config_id: str) -> Dict[str, Any]:
+    """Konfigurasi storage tujuan write; 404 jika tidak ada, 400 jika tidak aktif."""
+    config = find_storage_config(config_id)
+    if not config:
+        raise HTTPException(status_code=404, detail="Storage configuration not found")
+    if not config["is_active"]:
+        raise HTTPException(status_code=400, detail="Storage configuration is not active")
+    return config
+
 # Dependency untuk mendapatkan DatabaseIntegrator
 async def get_db_integrator(request: Request) -> DatabaseIntegrator:
     """
-    Dependency untuk mendapatkan instance DatabaseIntegrator yang sudah diinisialisasi.
+    Dependency untuk mendapatkan instance DatabaseIntegrator yang sudah diinisialisasi
+    saat startup (pool dan registry koneksi dipakai bersama semua request).
     """
-    # Dalam implementasi produksi, Anda bisa mendapatkan ini dari app state
-    return DatabaseIntegrator()
+    if not hasattr(request.app.state, 'db_integrator'):
+        raise HTTPException(status_code=500, detail="DatabaseIntegrator setup error: Instance not found.")
+    return request.app.state.db_integrator
+
+async def reload_storage_connection(request: Request, config_id: str):
+    """Menutup koneksi registry untuk config_id agar dibuat ulang dengan konfigurasi terbaru."""
+    db_integrator = getattr(request.app.state, 'db_integrator', None)
+    if db_integrator is not None:
+        await db_integrator.registry.reload(config_id)
+
+async def get_write_router(request: Request) -> WriteRouter:
+    """Dependency untuk mendapatkan WriteRouter bersama dari app state."""
+    if not hasattr(request.app.state, 'write_router'):
+        raise HTTPException(status_code=500, detail="WriteRouter setup error: Instance not found.")
+    return request.app.state.write_router
 
 @router.get("/configurations", response_model=List[StorageConfigResponse])
 async def list_storage_configs():
@@ -100,24 +131,14 @@ async def write_data_to_storage(
 ):
     """Write data to a specific storage backend."""
     try:
-        # Dapatkan konfigurasi storage
-        configs = get_storage_configs_store()
-        config = next((c for c in configs if c["id"] == config_id), None)
-        
-        if not config:
-            raise HTTPException(status_code=404, detail="Storage configuration not found")
-            
-        if not config["is_active"]:
-            raise HTTPException(status_code=400, detail="Storage configuration is not active")
+        config = get_active_storage_config(config_id)
 
         # Konversi data points ke format yang dibutuhkan
         data_points_dict = [point.dict() for point in data_batch]
-        
-        # Di implementasi sebenarnya, Anda akan memanggil method write_data
-        # await db.write_data(data_points_dict, config)
+        await db.write_data(data_points_dict, config)
         
         return {
-            "message": f"Successfully processed {len(data_batch)} data points",
+            "message": f"Successfully wrote {len(data_batch)} data points",
             "storage_type": config["type"],
             "storage_name": config["name"],
             "timestamp": datetime.now().isoformat()
@@ -129,6 +150,89 @@ async def write_data_to_storage(
         logger.error(f"Failed to write data to storage {config_id}: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Failed to write data: {str(e)}")
 
+@router.post("/write/stream")
+async def write_data_stream(
+    request: Request,
+    config_id: str,
+    batch_size: Optional[int] = Query(None, gt=0),
+    db: DatabaseIntegrator = Depends(get_db_integrator)
+):
+    """
+    Stream NDJSON data points (one JSON object per line, plain or chunked body) to a storage backend.
+    Points are written in batches while the body is still being read, so uploads of any size
+    use bounded memory. Invalid lines are skipped and counted.
+    """
+    try:
+        config = get_active_storage_config(config_id)
+        result = await stream_write(
+            request.stream(),
+            lambda batch: db.write_batch(batch, config),
+            batch_size=batch_size or app_config.STORAGE_STREAM_BATCH_SIZE,
+            max_pending=app_config.STORAGE_STREAM_MAX_PENDING_BATCHES,
+            max_line_bytes=app_config.STORAGE_STREAM_MAX_LINE_BYTES,
+            max_errors=app_config.STORAGE_STREAM_MAX_REPORTED_ERRORS
+        )
+        return {
+            "message": f"Successfully wrote {result['points_written']} data points",
+            "storage_type": config["type"],
+            "storage_name": config["name"],
+            **result,
+            "timestamp": datetime.now().isoformat()
+        }
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except StreamIngestError as e:
+        logger.error(f"Streaming write to storage {config_id} failed: {str(e)}", exc_info=True)
+        # Progres dikembalikan agar backfill bisa dilanjutkan dari baris yang belum tersimpan
+        raise HTTPException(status_code=500, detail={"error": f"Failed to write data: {str(e)}", **e.stats})
+    except Exception as e:
+        logger.error(f"Failed to stream data to storage {config_id}: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Failed to write data: {str(e)}")
+
+@router.post("/write/fanout")
+async def write_data_fanout(
+    data_batch: List[DataPointCreate],
+    config_ids: Optional[List[str]] = Query(None),
+    write_router: WriteRouter = Depends(get_write_router)
+):
+    """
+    Write one batch to every active storage backend (or only config_ids) concurrently.
+    Each backend has its own timeout and circuit breaker; a failing backend's share is buffered.
+    """
+    try:
+        results = await write_router.write([point.dict() for point in data_batch], config_ids)
+        if not results:
+            raise HTTPException(status_code=404, detail="No active storage configuration to write to")
+        return {
+            "message": f"Processed {len(data_batch)} data points for {len(results)} storage backends",
+            "results": results,
+            "timestamp": datetime.now().isoformat()
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Failed to fan out data write: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Failed to write data: {str(e)}")
+
+@router.get("/write/fanout/circuits")
+async def get_fanout_circuits(write_router: WriteRouter = Depends(get_write_router)):
+    """Get circuit breaker state per storage backend."""
+    return write_router.stats()
+
+@router.get("/connections")
+async def get_storage_connections(request: Request):
+    """Get the cached per-configuration connections (type, usage, health, idle time)."""
+    if not hasattr(request.app.state, 'db_integrator'):
+        raise HTTPException(status_code=500, detail="DatabaseIntegrator setup error: Instance not found.")
+    registry = request.app.state.db_integrator.registry
+    return {
+        "max_connections": registry.max_connections,
+        "idle_timeout_seconds": registry.idle_timeout,
+        "connections": registry.stats()
+    }
+
 @router.post("/configurations", response_model=StorageConfigResponse, status_code=201)
 async def create_storage_config(config: StorageConfigCreate):
     """Create a new storage configuration."""
@@ -155,7 +259,7 @@ async def create_storage_config(config: StorageConfigCreate):
         raise HTTPException(status_code=500, detail=f"Failed to create storage configuration: {str(e)}")
 
 @router.put("/configurations/{config_id}", response_model=StorageConfigResponse)
-async def update_storage_config(config_id: str, config: StorageConfigUpdate):
+async def update_storage_config(config_id: str, config: StorageConfigUpdate, request: Request):
     """Update an existing storage configuration."""
     try:
         configs = get_storage_configs_store()
@@ -175,6 +279,8 @@ async def update_storage_config(config_id: str, config: StorageConfigUpdate):
         updated_config["updated_at"] = datetime.now()
         
         # Simulasi update
+        # Koneksi lama ditutup; write berikutnya membuka koneksi dengan konfigurasi baru
+        await reload_storage_connection(request, config_id)
         logger.info(f"Updated storage configuration: {config_id}")
         
         return StorageConfigResponse(**updated_config)
@@ -186,7 +292,7 @@ async def update_storage_config(config_id: str, config: StorageConfigUpdate):
         raise HTTPException(status_code=500, detail=f"Failed to update storage configuration: {str(e)}")
 
 @router.delete("/configurations/{config_id}")
-async def delete_storage_config(config_id: str):
+async def delete_storage_config(config_id: str, request: Request):
     """Delete a storage configuration."""
     try:
         configs = get_storage_configs_store()
@@ -196,6 +302,7 @@ async def delete_storage_config(config_id: str):
             raise HTTPException(status_code=404, detail="Storage configuration not found")
             
         # Simulasi penghapusan
+        await reload_storage_connection(request, config_id)
         logger.info(f"Deleted storage configuration: {config_id}")
         
         return {
@@ -20,10 +20,13 @@ router = APIRouter(prefix="/transformation", tags=["transformation"])
 async def get_data_transformer(request: Request) -> DataTransformer:
     """
     Dependency untuk mendapatkan instance DataTransformer.
+    Instance dibuat sekali saat startup agar plan cache pipeline dipakai ulang.
     """
-    # Dalam implementasi produksi, Anda bisa mendapatkan ini dari app state
-    # atau menggunakan dependency injection yang lebih kompleks
-    return DataTransformer()
+    transformer = getattr(request.app.state, 'data_transformer', None)
+    if transformer is None:
+        transformer = DataTransformer()
+        request.app.state.data_transformer = transformer
+    return transformer
 
 # Placeholder untuk penyimpanan fungsi (di produksi gunakan database)
 # Catatan: Dalam produksi, ini akan diambil dari database
@@ -50,6 +53,11 @@ async def list_transform_functions():
         logger.error(f"Failed to list transform functions: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Failed to list transform functions: {str(e)}")
 
+@router.get("/plans/stats")
+async def get_plan_cache_stats(transformer: DataTransformer = Depends(get_data_transformer)):
+    """Get compiled transform pipeline cache statistics."""
+    return transformer.plan_cache.stats()
+
 @router.post("/apply", response_model=ProcessedDataBatchResponse)
 async def apply_transformations(
     data_batch: ProcessedDataBatchCreate,
@@ -75,8 +83,8 @@ async def apply_transformations(
         # Anda mungkin perlu menyesuaikan ini tergantung pada implementasi DataTransformer
         data_points_dict = [point.dict() for point in data_batch.data_points]
         
-        # Terapkan transformasi
-        transformed_points_dict = transformer.apply_transformations(data_points_dict, transforms)
+        # Terapkan transformasi (mode kolumnar: batch diproses sebagai array NumPy)
+        transformed_points_dict = transformer.apply_transformations(data_points_dict, transforms, columnar_mode=True)
         
         # Konversi kembali ke Pydantic models
         transformed_points = [DataPointResponse(**point) for point in transformed_points_dict]
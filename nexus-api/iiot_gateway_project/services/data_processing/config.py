@@ -12,21 +12,135 @@ class Config:
     
     DATABASE_URL: str = f"postgresql://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_HOST}:{POSTGRES_PORT}/{POSTGRES_DB}"
     DATABASE_URL_ASYN: str = f"postgresql+asyncpg://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_HOST}:{POSTGRES_PORT}/{POSTGRES_DB}"
+    POSTGRES_POOL_MIN_SIZE: int = int(os.getenv("POSTGRES_POOL_MIN_SIZE", 2))
+    POSTGRES_POOL_MAX_SIZE: int = int(os.getenv("POSTGRES_POOL_MAX_SIZE", 10))
+    # Tabel tujuan write time-series (bisa dioverride per StorageConfig lewat "table")
+    POSTGRES_WRITE_TABLE: str = os.getenv("POSTGRES_WRITE_TABLE", "ts_data")
+    # COPY biner: baris per chunk dan jumlah chunk yang ditulis paralel (koneksi pool)
+    POSTGRES_COPY_CHUNK_SIZE: int = int(os.getenv("POSTGRES_COPY_CHUNK_SIZE", 50000))
+    POSTGRES_COPY_PARALLELISM: int = int(os.getenv("POSTGRES_COPY_PARALLELISM", 4))
     
     # --- Konfigurasi Redis ---
     REDIS_HOST: str = os.getenv("REDIS_HOST", "localhost")
     REDIS_PORT: int = int(os.getenv("REDIS_PORT", 6379))
     REDIS_DB_BUFFER: int = int(os.getenv("REDIS_DB_BUFFER", 1))
     REDIS_DB_CACHE: int = int(os.getenv("REDIS_DB_CACHE", 0))
+
+    # --- Konfigurasi Buffer (Redis Streams) ---
+    # Ukuran connection pool redis.asyncio yang dipakai bersama oleh BufferManager
+    BUFFER_REDIS_POOL_SIZE: int = int(os.getenv("BUFFER_REDIS_POOL_SIZE", 50))
+    BUFFER_CONSUMER_GROUP: str = os.getenv("BUFFER_CONSUMER_GROUP", "forwarders")
+    # Kosong = <hostname>-<pid>
+    BUFFER_CONSUMER_NAME: str = os.getenv("BUFFER_CONSUMER_NAME", "")
+    BUFFER_CLAIM_IDLE_MS: int = int(os.getenv("BUFFER_CLAIM_IDLE_MS", 60000))
+    # Backoff retry: base * 2^(retry - 1), maks BUFFER_RETRY_MAX_DELAY_MS, lalu dikurangi jitter acak (fraksi BUFFER_RETRY_JITTER)
+    BUFFER_RETRY_BASE_DELAY_MS: int = int(os.getenv("BUFFER_RETRY_BASE_DELAY_MS", 1000))
+    BUFFER_RETRY_MAX_DELAY_MS: int = int(os.getenv("BUFFER_RETRY_MAX_DELAY_MS", 300000))
+    BUFFER_RETRY_JITTER: float = float(os.getenv("BUFFER_RETRY_JITTER", 0.5))
+    # Jumlah entry per pipeline (satu round trip) pada enqueue_many
+    BUFFER_ENQUEUE_CHUNK_SIZE: int = int(os.getenv("BUFFER_ENQUEUE_CHUNK_SIZE", 1000))
+    # Codec entry buffer: json (format lama), msgpack, atau columnar
+    BUFFER_CODEC: str = os.getenv("BUFFER_CODEC", "columnar")
+    # Kosong = tanpa kompresi; "zstd" membutuhkan paket zstandard
+    BUFFER_CODEC_COMPRESSION: str = os.getenv("BUFFER_CODEC_COMPRESSION", "")
+    BUFFER_CODEC_ZSTD_LEVEL: int = int(os.getenv("BUFFER_CODEC_ZSTD_LEVEL", 3))
+    BUFFER_CODEC_ZSTD_DICT_DIR: str = os.getenv("BUFFER_CODEC_ZSTD_DICT_DIR", "./data/buffer_zstd_dicts")
+    # Spool disk lokal (tier di bawah Redis) saat Redis tidak tersedia
+    BUFFER_SPOOL_ENABLED: bool = os.getenv("BUFFER_SPOOL_ENABLED", "true").lower() == "true"
+    BUFFER_SPOOL_DIR: str = os.getenv("BUFFER_SPOOL_DIR", "./data/buffer_spool")
+    BUFFER_SPOOL_SEGMENT_BYTES: int = int(os.getenv("BUFFER_SPOOL_SEGMENT_BYTES", 64 * 1024 * 1024))
+    BUFFER_SPOOL_FSYNC_INTERVAL_MS: int = int(os.getenv("BUFFER_SPOOL_FSYNC_INTERVAL_MS", 100))
+    BUFFER_SPOOL_FSYNC_BATCH: int = int(os.getenv("BUFFER_SPOOL_FSYNC_BATCH", 256))
+    BUFFER_SPOOL_DRAIN_INTERVAL: float = float(os.getenv("BUFFER_SPOOL_DRAIN_INTERVAL", 1.0))
+    # Budget buffer per tujuan (0 = tidak dibatasi); kebijakan: drop_oldest, drop_newest, downsample, block
+    BUFFER_QUOTA_MAX_ENTRIES: int = int(os.getenv("BUFFER_QUOTA_MAX_ENTRIES", 0))
+    BUFFER_QUOTA_MAX_BYTES: int = int(os.getenv("BUFFER_QUOTA_MAX_BYTES", 0))
+    BUFFER_QUOTA_MAX_AGE_SECONDS: float = float(os.getenv("BUFFER_QUOTA_MAX_AGE_SECONDS", 0))
+    BUFFER_QUOTA_POLICY: str = os.getenv("BUFFER_QUOTA_POLICY", "drop_oldest")
+    BUFFER_QUOTA_BLOCK_TIMEOUT: float = float(os.getenv("BUFFER_QUOTA_BLOCK_TIMEOUT", 5.0))
+    BUFFER_QUOTA_BLOCK_POLL_INTERVAL: float = float(os.getenv("BUFFER_QUOTA_BLOCK_POLL_INTERVAL", 0.1))
+    # Override per tujuan, JSON: {"<storage_config_id>": {"max_entries": 100000, "policy": "downsample"}}
+    BUFFER_QUOTA_OVERRIDES: str = os.getenv("BUFFER_QUOTA_OVERRIDES", "")
+    # Umur cache metrik /buffering/status (detik), agar polling dashboard tidak membebani Redis
+    BUFFER_METRICS_CACHE_TTL: float = float(os.getenv("BUFFER_METRICS_CACHE_TTL", 2.0))
+
+    # --- Konfigurasi Forwarder (drain buffer ke storage) ---
+    FORWARDER_ENABLED: bool = os.getenv("FORWARDER_ENABLED", "true").lower() == "true"
+    # Jumlah bulk write yang boleh berjalan bersamaan (semua tujuan)
+    FORWARDER_MAX_CONCURRENCY: int = int(os.getenv("FORWARDER_MAX_CONCURRENCY", 4))
+    FORWARDER_INITIAL_BATCH: int = int(os.getenv("FORWARDER_INITIAL_BATCH", 100))
+    FORWARDER_MIN_BATCH: int = int(os.getenv("FORWARDER_MIN_BATCH", 10))
+    FORWARDER_MAX_BATCH: int = int(os.getenv("FORWARDER_MAX_BATCH", 5000))
+    FORWARDER_TARGET_LATENCY_MS: int = int(os.getenv("FORWARDER_TARGET_LATENCY_MS", 500))
+    FORWARDER_IDLE_INTERVAL: float = float(os.getenv("FORWARDER_IDLE_INTERVAL", 1.0))
+    FORWARDER_DISCOVERY_INTERVAL: float = float(os.getenv("FORWARDER_DISCOVERY_INTERVAL", 10.0))
+
+    # --- Konfigurasi Fan-out Write (satu batch ke semua storage aktif) ---
+    # Timeout per storage (bisa dioverride per StorageConfig lewat "timeout")
+    FANOUT_SINK_TIMEOUT_SECONDS: float = float(os.getenv("FANOUT_SINK_TIMEOUT_SECONDS", 5.0))
+    # Circuit breaker: terbuka setelah N kegagalan berturut-turut, dicoba lagi setelah reset
+    FANOUT_BREAKER_FAILURE_THRESHOLD: int = int(os.getenv("FANOUT_BREAKER_FAILURE_THRESHOLD", 5))
+    FANOUT_BREAKER_RESET_SECONDS: float = float(os.getenv("FANOUT_BREAKER_RESET_SECONDS", 30.0))
+
+    # --- Konfigurasi Registry Koneksi Storage (satu klien/pool per StorageConfig) ---
+    STORAGE_REGISTRY_ENABLED: bool = os.getenv("STORAGE_REGISTRY_ENABLED", "true").lower() == "true"
+    # Jumlah StorageConfig yang koneksinya di-cache; yang paling lama tidak dipakai dikeluarkan
+    STORAGE_REGISTRY_MAX_CONNECTIONS: int = int(os.getenv("STORAGE_REGISTRY_MAX_CONNECTIONS", 32))
+    STORAGE_REGISTRY_IDLE_SECONDS: float = float(os.getenv("STORAGE_REGISTRY_IDLE_SECONDS", 600.0))
+    STORAGE_REGISTRY_HEALTH_INTERVAL: float = float(os.getenv("STORAGE_REGISTRY_HEALTH_INTERVAL", 30.0))
+    STORAGE_REGISTRY_HEALTH_TIMEOUT: float = float(os.getenv("STORAGE_REGISTRY_HEALTH_TIMEOUT", 5.0))
+
+    # --- Konfigurasi Streaming Ingest (NDJSON ke /storage/write/stream) ---
+    STORAGE_STREAM_BATCH_SIZE: int = int(os.getenv("STORAGE_STREAM_BATCH_SIZE", 10000))
+    # Batch yang boleh menunggu write; lebih dari itu pembacaan body ditahan (backpressure)
+    STORAGE_STREAM_MAX_PENDING_BATCHES: int = int(os.getenv("STORAGE_STREAM_MAX_PENDING_BATCHES", 4))
+    STORAGE_STREAM_MAX_LINE_BYTES: int = int(os.getenv("STORAGE_STREAM_MAX_LINE_BYTES", 1048576))
+    STORAGE_STREAM_MAX_REPORTED_ERRORS: int = int(os.getenv("STORAGE_STREAM_MAX_REPORTED_ERRORS", 10))
     
     # --- Konfigurasi InfluxDB ---
     INFLUXDB_URL: str = os.getenv("INFLUXDB_URL", "http://localhost:8086")
     INFLUXDB_TOKEN: str = os.getenv("INFLUXDB_TOKEN", "my-token")
     INFLUXDB_ORG: str = os.getenv("INFLUXDB_ORG", "my-org")
     INFLUXDB_BUCKET: str = os.getenv("INFLUXDB_BUCKET", "my-bucket")
+    INFLUXDB_MEASUREMENT: str = os.getenv("INFLUXDB_MEASUREMENT", "measurement")
+    # Writer batching per bucket: flush per INFLUXDB_BATCH_SIZE baris atau INFLUXDB_FLUSH_INTERVAL_MS
+    INFLUXDB_BATCH_SIZE: int = int(os.getenv("INFLUXDB_BATCH_SIZE", 5000))
+    INFLUXDB_FLUSH_INTERVAL_MS: int = int(os.getenv("INFLUXDB_FLUSH_INTERVAL_MS", 100))
+    # Jumlah batch yang boleh antre per writer sebelum pemanggil menunggu
+    INFLUXDB_WRITER_QUEUE_SIZE: int = int(os.getenv("INFLUXDB_WRITER_QUEUE_SIZE", 100))
     
     # --- Konfigurasi MongoDB ---
     MONGODB_URL: str = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
     MONGODB_DB_NAME: str = os.getenv("MONGODB_DB_NAME", "iiot_ts")
+    MONGODB_MAX_POOL_SIZE: int = int(os.getenv("MONGODB_MAX_POOL_SIZE", 50))
+    MONGODB_COLLECTION: str = os.getenv("MONGODB_COLLECTION", "ts_data")
+    # Mode write: timeseries (koleksi time-series), document (satu dokumen per point), bucket (per tag per interval)
+    MONGODB_WRITE_MODE: str = os.getenv("MONGODB_WRITE_MODE", "timeseries")
+    MONGODB_TIMESERIES_GRANULARITY: str = os.getenv("MONGODB_TIMESERIES_GRANULARITY", "seconds")
+    MONGODB_BUCKET_COLLECTION: str = os.getenv("MONGODB_BUCKET_COLLECTION", "ts_buckets")
+    MONGODB_BUCKET_INTERVAL_SECONDS: int = int(os.getenv("MONGODB_BUCKET_INTERVAL_SECONDS", 3600))
+    # Write concern: w = angka atau "majority"; j = tunggu journal
+    MONGODB_WRITE_CONCERN_W: str = os.getenv("MONGODB_WRITE_CONCERN_W", "1")
+    MONGODB_WRITE_CONCERN_J: bool = os.getenv("MONGODB_WRITE_CONCERN_J", "false").lower() == "true"
+
+    # --- Konfigurasi Transformasi ---
+    TRANSFORM_PLAN_CACHE_SIZE: int = int(os.getenv("TRANSFORM_PLAN_CACHE_SIZE", 128))
+    # Operator streaming dan state per tag yang tidak dipakai selama ini dibuang (0 = tidak pernah)
+    STREAM_STATE_IDLE_SECONDS: float = float(os.getenv("STREAM_STATE_IDLE_SECONDS", 3600))
+
+    # --- Konfigurasi Rule Engine ---
+    # Jumlah teks kondisi berbeda yang hasil kompilasinya di-cache
+    RULE_CONDITION_CACHE_SIZE: int = int(os.getenv("RULE_CONDITION_CACHE_SIZE", 4096))
+    # Sinkronisasi rule antar worker lewat Redis pub/sub (create/update/delete/toggle)
+    RULE_SYNC_ENABLED: bool = os.getenv("RULE_SYNC_ENABLED", "true").lower() == "true"
+    RULE_SYNC_CHANNEL: str = os.getenv("RULE_SYNC_CHANNEL", "alarm_rules:changes")
+    # Muat ulang semua rule dari database secara berkala (jaga-jaga pesan pub/sub terlewat)
+    RULE_SYNC_RESYNC_SECONDS: float = float(os.getenv("RULE_SYNC_RESYNC_SECONDS", 300))
+    RULE_SYNC_RECONNECT_MAX_SECONDS: float = float(os.getenv("RULE_SYNC_RECONNECT_MAX_SECONDS", 30))
+
+    # --- Konfigurasi Ingest Pipeline (decode -> transform -> rules -> alarms -> storage) ---
+    INGEST_BATCH_SIZE: int = int(os.getenv("INGEST_BATCH_SIZE", 5000))
+    # Jumlah batch yang boleh menunggu di antrean antar stage
+    INGEST_QUEUE_SIZE: int = int(os.getenv("INGEST_QUEUE_SIZE", 2))
 
 config = Config()
\ No newline at end of file
@@ -0,0 +1,178 @@
+# core/aggregation.py
+import re
+import logging
+from functools import lru_cache
+from typing import List, Dict, Any, Optional, Tuple
+from datetime import datetime
+
+import numpy as np
+
+from .columnar import ColumnarBatch, from_epoch_ns, parse_time_window
+
+logger = logging.getLogger(__name__)
+
+AGGREGATION_TYPES = ('average', 'sum', 'min', 'max', 'count', 'first', 'last', 'stddev')
+_AGGREGATION_ALIASES = {'avg': 'average', 'mean': 'average', 'std': 'stddev', 'median': 'p50'}
+
+
+def parse_aggregation_type(aggregation_type: str, params: Optional[Dict[str, Any]] = None) -> Tuple[str, Optional[float]]:
+    """
+    Normalisasi aggregation_type. Mengembalikan (nama, persentil).
+    Persentil ditulis sebagai 'p95', 'p99.9', 'median', atau 'percentile' + parameter 'percentile'.
+    """
+    name = _AGGREGATION_ALIASES.get(aggregation_type, aggregation_type)
+    if name == 'percentile':
+        q = float((params or {}).get('percentile', 50))
+    else:
+        match = re.fullmatch(r"p(\d+(?:\.\d+)?)", str(name))
+        if not match:
+            if name not in AGGREGATION_TYPES:
+                raise ValueError(f"Unknown aggregation type: {aggregation_type}")
+            return name, None
+        q = float(match.group(1))
+    if not 0.0 <= q <= 100.0:
+        raise ValueError(f"Percentile must be between 0 and 100: {q}")
+    return 'percentile', q
+
+
+@lru_cache(maxsize=4096)
+def _bucket_iso(bucket: int, window_ns: int) -> str:
+    # Banyak tag berbagi bucket yang sama; format ISO cukup dihitung sekali per bucket
+    return from_epoch_ns(bucket * window_ns).isoformat()
+
+
+def window_point(tag: str, bucket: int, window_ns: int, value: float, count: int,
+                 aggregation_type: str, time_window: Any) -> Dict:
+    """Membuat point hasil agregasi untuk satu (tag, window), dengan timestamp awal window."""
+    window_start = _bucket_iso(bucket, window_ns)
+    return {
+        'id': f"aggregated_{tag}_{window_start}",
+        'timestamp': window_start,
+        'tag_id': tag,
+        'value': value,
+        'data_metadata': {
+            'aggregation_type': aggregation_type,
+            'original_count': count,
+            'time_window': time_window,
+            'window_end': _bucket_iso(bucket + 1, window_ns)
+        }
+    }
+
+
+def bucket_aggregate(batch: ColumnarBatch, time_window: Any = '1m', aggregation_type: str = 'average',
+                     params: Optional[Dict[str, Any]] = None) -> ColumnarBatch:
+    """
+    Agregasi group-by (tag_id, time bucket) dalam satu pass vektor.
+    Bucket disejajarkan ke epoch UTC. Menghasilkan satu point per tag per bucket,
+    diurutkan berdasarkan waktu lalu tag.
+    """
+    if not len(batch):
+        return batch
+
+    name, q = parse_aggregation_type(aggregation_type, params)
+    window_ns = parse_time_window(time_window)
+
+    timestamps = batch.timestamps_ns
+    buckets = timestamps // window_ns
+    codes = batch.tag_codes
+
+    # Urutkan per (bucket, tag); untuk persentil nilai diurutkan di dalam grup,
+    # untuk agregasi lain berdasarkan timestamp (agar first/last benar).
+    inner_key = batch.values if name == 'percentile' else timestamps
+    order = np.lexsort((inner_key, codes, buckets))
+    sorted_buckets = buckets[order]
+    sorted_codes = codes[order]
+    values = batch.values[order]
+
+    n = len(values)
+    boundary = np.empty(n, dtype=bool)
+    boundary[0] = True
+    boundary[1:] = (sorted_buckets[1:] != sorted_buckets[:-1]) | (sorted_codes[1:] != sorted_codes[:-1])
+    starts = np.flatnonzero(boundary)
+    ends = np.append(starts[1:], n)
+    counts = ends - starts
+
+    if name == 'average':
+        result = np.add.reduceat(values, starts) / counts
+    elif name == 'sum':
+        result = np.add.reduceat(values, starts)
+    elif name == 'min':
+        result = np.minimum.reduceat(values, starts)
+    elif name == 'max':
+        result = np.maximum.reduceat(values, starts)
+    elif name == 'count':
+        result = counts.astype(np.float64)
+    elif name == 'first':
+        result = values[starts]
+    elif name == 'last':
+        result = values[ends - 1]
+    elif name == 'stddev':
+        # Dua pass vektor (mean lalu deviasi kuadrat) agar stabil secara numerik
+        ddof = int((params or {}).get('ddof', 0))
+        means = np.add.reduceat(values, starts) / counts
+        deviations = values - np.repeat(means, counts)
+        divisor = np.maximum(counts - ddof, 1)
+        result = np.sqrt(np.add.reduceat(deviations * deviations, starts) / divisor)
+    else:
+        # Persentil dengan interpolasi linier (sama seperti np.percentile default)
+        position = (q / 100.0) * (counts - 1)
+        lower = np.floor(position).astype(np.int64)
+        upper = np.ceil(position).astype(np.int64)
+        low_values = values[starts + lower]
+        result = low_values + (values[starts + upper] - low_values) * (position - lower)
+
+    points = [
+        window_point(batch.tag_names[code], bucket, window_ns, value, count, aggregation_type, time_window)
+        for code, bucket, value, count in zip(
+            sorted_codes[starts].tolist(),
+            sorted_buckets[starts].tolist(),
+            result.tolist(),
+            counts.tolist(),
+        )
+    ]
+
+    logger.debug(f"Aggregated {n} points into {len(points)} (tag, {time_window}) buckets using {aggregation_type}.")
+    return ColumnarBatch.from_dicts(points)
+
+
+def aggregate(batch: ColumnarBatch, params: Dict[str, Any]) -> ColumnarBatch:
+    """
+    Kernel agregasi untuk transformasi AGGREGATE.
+    Default: group-by (tag_id, time_window). window_type='batch' mempertahankan
+    perilaku lama (seluruh batch menjadi satu point).
+    """
+    aggregation_type = params.get('aggregation_type', 'average')
+
+    if params.get('window_type', 'bucket') != 'batch':
+        return bucket_aggregate(batch, params.get('time_window', '1m'), aggregation_type, params)
+
+    if not len(batch):
+        return batch
+
+    values = batch.values
+    if aggregation_type == 'average':
+        result_value = float(values.mean())
+    elif aggregation_type == 'sum':
+        result_value = float(values.sum())
+    elif aggregation_type == 'min':
+        result_value = float(values.min())
+    elif aggregation_type == 'max':
+        result_value = float(values.max())
+    else:
+        logger.warning(f"Unknown aggregation type: {aggregation_type}")
+        return batch
+
+    # Buat satu point hasil agregasi
+    aggregated_point = {
+        'id': f"aggregated_{datetime.now().isoformat()}",
+        'timestamp': datetime.now().isoformat(),
+        'tag_id': batch.records[0].get('tag_id', 'aggregated'),
+        'value': result_value,
+        'data_metadata': {
+            'aggregation_type': aggregation_type,
+            'original_count': len(batch)
+        }
+    }
+
+    logger.debug(f"Aggregated {len(batch)} points to single value: {result_value}")
+    return ColumnarBatch.from_dicts([aggregated_point])
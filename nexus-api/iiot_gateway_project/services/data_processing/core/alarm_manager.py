@@ -10,6 +10,7 @@ import asyncio
 # Import dari schemas dan config
 from ..models.event_alarm import AlarmResponse, AlarmState, AlarmSeverity
 from ..config import config
+from .alarm_states import AlarmTransition, TRANSITION_RAISED, TRANSITION_RETURNED
 
 logger = logging.getLogger(__name__)
 
@@ -156,6 +157,60 @@ class AlarmManager:
             logger.error(f"CRITICAL: Failed to add alarms to database: {e}", exc_info=True)
             raise
 
+    async def apply_transitions(self, transitions: List[AlarmTransition]) -> Dict[str, int]:
+        """
+        Menyimpan transisi dari RuleEngine dalam satu transaksi: alarm baru di-INSERT,
+        alarm yang kembali normal di-clear (cleared_by 'system'). Cache di-invalidate
+        sekali per panggilan, bukan per alarm.
+        """
+        if not transitions:
+            return {"raised": 0, "returned": 0}
+        if not self.db_pool:
+            error_msg = "Database pool not initialized in AlarmManager."
+            logger.error(error_msg)
+            raise Exception(error_msg)
+
+        insert_query = """
+        INSERT INTO alarms (
+            id, rule_id, name, description, tag_id, severity,
+            timestamp_triggered, state, value_at_trigger
+        ) VALUES ($1, $2, $3, $4, $5, $6, $7, 'active', $8)
+        ON CONFLICT (id) DO NOTHING
+        """
+        return_query = """
+        UPDATE alarms
+        SET state = 'cleared',
+            timestamp_cleared = $2,
+            cleared_by = 'system',
+            cleared_at = NOW(),
+            updated_at = NOW()
+        WHERE id = $1 AND state IN ('active', 'acknowledged')
+        """
+        raised, returned = [], []
+        for transition in transitions:
+            if transition.kind == TRANSITION_RAISED:
+                alarm = transition.to_alarm_dict()
+                raised.append((
+                    alarm["id"], alarm["rule_id"], alarm["name"], alarm["description"], alarm["tag_id"],
+                    str(alarm["severity"]), alarm["timestamp_triggered"], alarm["value_at_trigger"]
+                ))
+            elif transition.kind == TRANSITION_RETURNED:
+                returned.append((transition.alarm_id, transition.timestamp))
+
+        try:
+            async with self.db_pool.acquire() as conn:
+                async with conn.transaction():
+                    if raised:
+                        await conn.executemany(insert_query, raised)
+                    if returned:
+                        await conn.executemany(return_query, returned)
+            logger.info(f"Applied alarm transitions: {len(raised)} raised, {len(returned)} returned.")
+            await self._invalidate_cache()
+            return {"raised": len(raised), "returned": len(returned)}
+        except Exception as e:
+            logger.error(f"CRITICAL: Failed to apply alarm transitions: {e}", exc_info=True)
+            raise
+
     async def get_active_alarms(self) -> List[Dict]:
         """Mendapatkan semua alarm yang aktif (belum di-ack/di-clear), dengan caching."""
         cache_key = "alarms:active"
@@ -0,0 +1,221 @@
+# core/alarm_states.py
+import uuid
+import logging
+from typing import List, Dict, Any, Optional, Callable
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# State alarm per rule (int8 di tabel)
+STATE_NORMAL = 0      # belum pernah aktif
+STATE_ACTIVE = 1      # kondisi terpenuhi (setelah on_delay)
+STATE_RETURNED = 2    # kembali normal (setelah off_delay), alarm di-clear otomatis
+STATE_LATCHED = 3     # kondisi sudah normal tapi alarm latch menunggu clear operator
+STATE_NAMES = {STATE_NORMAL: "normal", STATE_ACTIVE: "active", STATE_RETURNED: "returned", STATE_LATCHED: "latched"}
+
+# Jenis transisi yang perlu disimpan ke database
+TRANSITION_RAISED = "raised"        # alarm baru -> INSERT
+TRANSITION_RETURNED = "returned"    # kembali normal -> UPDATE state cleared
+
+_NO_PENDING = -1
+
+
+class AlarmTransition:
+    """Perubahan state alarm yang perlu dipersist (alarm baru atau kembali normal)."""
+    __slots__ = ("kind", "alarm_id", "rule", "timestamp", "value")
+
+    def __init__(self, kind: str, alarm_id: str, rule: Any, timestamp: Any, value: float):
+        self.kind = kind
+        self.alarm_id = alarm_id
+        self.rule = rule
+        self.timestamp = timestamp
+        self.value = value
+
+    def to_alarm_dict(self) -> Dict[str, Any]:
+        """Data alarm untuk AlarmManager (format AlarmResponse)."""
+        return {
+            "id": self.alarm_id,
+            "rule_id": str(self.rule.id),
+            "name": self.rule.name,
+            "description": self.rule.description,
+            "tag_id": self.rule.tag_id,
+            "severity": getattr(self.rule.severity, "value", self.rule.severity),
+            "timestamp_triggered": self.timestamp,
+            "value_at_trigger": self.value,
+        }
+
+
+class AlarmStateTable:
+    """
+    Tabel state alarm in-memory: satu slot per rule (rule terikat ke satu tag),
+    disimpan sebagai array NumPy (state int8, awal timer pending int64 nanodetik)
+    plus ID alarm yang sedang terbuka. Hanya transisi yang dilaporkan, jadi tag yang
+    terus berada di atas threshold tidak menghasilkan alarm baru per sampel.
+    """
+
+    def __init__(self, capacity: int = 1024):
+        self.state = np.zeros(capacity, dtype=np.int8)
+        self.pending_since = np.full(capacity, _NO_PENDING, dtype=np.int64)
+        self.alarm_ids: List[Optional[str]] = [None] * capacity
+        self.slots: Dict[str, int] = {}
+        self._free: List[int] = []
+        self._by_alarm_id: Dict[str, str] = {}
+
+    def __len__(self) -> int:
+        return len(self.slots)
+
+    def slot(self, key: str) -> int:
+        slot = self.slots.get(key)
+        if slot is not None:
+            return slot
+        if self._free:
+            slot = self._free.pop()
+        else:
+            slot = len(self.slots)
+            if slot >= len(self.state):
+                self._grow()
+        self.state[slot] = STATE_NORMAL
+        self.pending_since[slot] = _NO_PENDING
+        self.alarm_ids[slot] = None
+        self.slots[key] = slot
+        return slot
+
+    def _grow(self):
+        capacity = len(self.state) * 2
+        self.state = np.resize(self.state, capacity)
+        self.pending_since = np.resize(self.pending_since, capacity)
+        self.alarm_ids.extend([None] * (capacity - len(self.alarm_ids)))
+
+    def remove(self, key: str) -> Optional[str]:
+        """Melepas slot rule (rule dihapus); mengembalikan ID alarm yang masih terbuka."""
+        slot = self.slots.pop(key, None)
+        if slot is None:
+            return None
+        alarm_id = self.alarm_ids[slot]
+        if alarm_id:
+            self._by_alarm_id.pop(alarm_id, None)
+        self.alarm_ids[slot] = None
+        self._free.append(slot)
+        return alarm_id
+
+    def state_of(self, key: str) -> str:
+        slot = self.slots.get(key)
+        return STATE_NAMES[int(self.state[slot])] if slot is not None else STATE_NAMES[STATE_NORMAL]
+
+    def restore(self, key: str, alarm_id: str):
+        """Menandai rule aktif dengan alarm yang sudah ada di database (setelah restart)."""
+        slot = self.slot(key)
+        self.state[slot] = STATE_ACTIVE
+        self.pending_since[slot] = _NO_PENDING
+        self.alarm_ids[slot] = alarm_id
+        self._by_alarm_id[alarm_id] = key
+
+    def release(self, alarm_id: str) -> bool:
+        """Alarm di-clear operator: alarm latch kembali normal, alarm lain tetap mengikuti kondisi."""
+        key = self._by_alarm_id.get(alarm_id)
+        if key is None:
+            return False
+        slot = self.slots[key]
+        if self.state[slot] != STATE_LATCHED:
+            return False
+        self.state[slot] = STATE_RETURNED
+        self.alarm_ids[slot] = None
+        del self._by_alarm_id[alarm_id]
+        return True
+
+    def advance(self, key: str, mask: np.ndarray, timestamps_ns: Callable[[], np.ndarray],
+                on_delay_ns: int, off_delay_ns: int, latch: bool) -> List[tuple]:
+        """
+        Menjalankan state machine rule atas hasil kondisi satu grup point (urut waktu).
+        Mengembalikan (jenis transisi, ID alarm, indeks baris dalam grup). Point diproses
+        per run (deretan hasil kondisi yang sama), bukan per point.
+        """
+        slot = self.slot(key)
+        state = int(self.state[slot])
+        # Jalur cepat: tidak ada perubahan yang mungkin, timestamp tidak perlu dihitung
+        if state == STATE_ACTIVE and mask.all():
+            self.pending_since[slot] = _NO_PENDING
+            return []
+        if state != STATE_ACTIVE and not mask.any():
+            self.pending_since[slot] = _NO_PENDING
+            return []
+
+        timestamps = timestamps_ns()
+        pending = int(self.pending_since[slot])
+        transitions = []
+        changes = (np.flatnonzero(mask[1:] != mask[:-1]) + 1).tolist()
+        for start, end in zip([0] + changes, changes + [len(mask)]):
+            if mask[start]:
+                if state == STATE_LATCHED:
+                    # Kondisi muncul lagi sebelum di-clear: alarm yang sama aktif kembali
+                    state, pending = STATE_ACTIVE, _NO_PENDING
+                if state == STATE_ACTIVE:
+                    pending = _NO_PENDING
+                    continue
+                delay = on_delay_ns
+            else:
+                if state != STATE_ACTIVE:
+                    pending = _NO_PENDING
+                    continue
+                delay = off_delay_ns
+
+            since = pending if pending != _NO_PENDING else int(timestamps[start])
+            row = start + int(np.searchsorted(timestamps[start:end], since + delay, side='left'))
+            if row >= end:
+                # Timer belum habis, berlanjut ke run/batch berikutnya
+                pending = since
+                continue
+            pending = _NO_PENDING
+            if mask[start]:
+                state = STATE_ACTIVE
+                alarm_id = str(uuid.uuid4())
+                self.alarm_ids[slot] = alarm_id
+                self._by_alarm_id[alarm_id] = key
+                transitions.append((TRANSITION_RAISED, alarm_id, row))
+            elif latch:
+                state = STATE_LATCHED
+            else:
+                state = STATE_RETURNED
+                alarm_id = self.alarm_ids[slot]
+                self.alarm_ids[slot] = None
+                if alarm_id:
+                    self._by_alarm_id.pop(alarm_id, None)
+                    transitions.append((TRANSITION_RETURNED, alarm_id, row))
+
+        self.state[slot] = state
+        self.pending_since[slot] = pending
+        return transitions
+
+    def rollback(self, key: str, kind: str, alarm_id: str, pending_since: int) -> bool:
+        """
+        Membatalkan satu transisi yang gagal dipersist, jika slot belum berpindah ke alarm lain.
+        Alarm baru dibuang dan state kembali normal; alarm yang kembali normal dibuka lagi.
+        pending_since mengatur timer agar point berikutnya yang masih memenuhi (atau sudah
+        tidak memenuhi) kondisi langsung memicu transisi yang sama lagi.
+        """
+        slot = self.slots.get(key)
+        if slot is None:
+            return False
+        if kind == TRANSITION_RAISED:
+            if self.alarm_ids[slot] != alarm_id:
+                return False
+            self.state[slot] = STATE_NORMAL
+            self.alarm_ids[slot] = None
+            self._by_alarm_id.pop(alarm_id, None)
+        elif kind == TRANSITION_RETURNED:
+            if self.state[slot] != STATE_RETURNED or self.alarm_ids[slot] is not None:
+                return False
+            self.state[slot] = STATE_ACTIVE
+            self.alarm_ids[slot] = alarm_id
+            self._by_alarm_id[alarm_id] = key
+        else:
+            return False
+        self.pending_since[slot] = pending_since
+        return True
+
+    def summary(self) -> Dict[str, int]:
+        """Jumlah rule per state."""
+        used = np.fromiter(self.slots.values(), dtype=np.int64, count=len(self.slots))
+        counts = np.bincount(self.state[used], minlength=len(STATE_NAMES)) if len(used) else np.zeros(len(STATE_NAMES), dtype=np.int64)
+        return {name: int(counts[state]) for state, name in STATE_NAMES.items()}
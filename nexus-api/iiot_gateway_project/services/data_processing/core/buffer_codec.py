@@ -0,0 +1,277 @@
+# core/buffer_codec.py
+import os
+import re
+import json
+import logging
+from typing import List, Dict, Any, Optional
+
+import msgpack
+import numpy as np
+
+try:
+    import zstandard
+except ImportError:  # zstd opsional
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+# Field stream untuk entry yang di-encode: tag format + data biner.
+# Entry tanpa field "f" adalah format lama (field payload/timestamp_queued/max_retries apa adanya).
+FORMAT_FIELD = "f"
+DATA_FIELD = "d"
+
+FORMAT_MSGPACK = "m"
+FORMAT_MSGPACK_ZSTD = "mz"
+
+# Jenis body payload di dalam envelope msgpack
+PAYLOAD_RAW = "r"        # string apa adanya (bukan JSON)
+PAYLOAD_OBJECT = "o"     # JSON di-parse lalu di-pack sebagai msgpack
+PAYLOAD_COLUMNAR = "c"   # list data point dalam bentuk kolom
+
+_ISO_TIMESTAMP = re.compile(r"\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d(\.\d{6})?(Z|[+-]\d\d:\d\d)?")
+
+
+class MissingDictionaryError(ValueError):
+    """Entry dikompres dengan dictionary zstd yang belum dimuat worker ini (bukan entry rusak)."""
+
+    def __init__(self, dict_id: int):
+        super().__init__(f"zstd dictionary {dict_id} is not loaded")
+        self.dict_id = dict_id
+
+
+def _as_str(value: Any) -> Any:
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def _encode_timestamps(values: List[str]) -> Optional[List[Any]]:
+    """
+    Timestamp ISO dengan panjang dan suffix zona waktu yang sama -> epoch µs int64,
+    delta-encoded. None jika tidak memenuhi syarat.
+    """
+    length = len(values[0])
+    if any(len(v) != length for v in values):
+        return None
+    if not all(_ISO_TIMESTAMP.fullmatch(v) for v in values):
+        return None
+    fractional = len(values[0]) >= 26 and values[0][19] == "."
+    naive_length = 26 if fractional else 19
+    suffix = values[0][naive_length:]
+    if any(v[naive_length:] != suffix for v in values):
+        return None
+    micros = np.array([v[:naive_length] for v in values], dtype="datetime64[us]").astype(np.int64)
+    return ["t", int(micros[0]), np.diff(micros).tolist(), "us" if fractional else "s", suffix]
+
+
+def _encode_column(values: List[Any]) -> Optional[List[Any]]:
+    first = values[0]
+    if all(v is None for v in values):
+        return ["n"]
+    if all(type(v) is int for v in values):
+        ints = np.array(values, dtype=np.int64)
+        return ["i", int(ints[0]), np.diff(ints).tolist()]
+    if all(type(v) is float for v in values):
+        return ["f", np.array(values, dtype="<f8").tobytes()]
+    if all(type(v) is str for v in values):
+        if isinstance(first, str) and _ISO_TIMESTAMP.fullmatch(first):
+            encoded = _encode_timestamps(values)
+            if encoded is not None:
+                return encoded
+        uniques = list(dict.fromkeys(values))
+        if len(uniques) * 2 <= len(values):
+            index = {value: i for i, value in enumerate(uniques)}
+            return ["d", uniques, [index[v] for v in values]]
+        return ["s", values]
+    return ["g", values]
+
+
+def _decode_column(column: List[Any], n: int) -> List[Any]:
+    kind = column[0]
+    if kind == "n":
+        return [None] * n
+    if kind == "i":
+        return np.cumsum([column[1]] + column[2], dtype=np.int64).tolist()
+    if kind == "f":
+        return np.frombuffer(column[1], dtype="<f8").tolist()
+    if kind == "t":
+        micros = np.cumsum([column[1]] + column[2], dtype=np.int64).astype("datetime64[us]")
+        suffix = column[4]
+        return [s + suffix for s in np.datetime_as_string(micros, unit=column[3]).tolist()]
+    if kind == "d":
+        uniques = column[1]
+        return [uniques[i] for i in column[2]]
+    return column[1]
+
+
+def encode_columnar(points: Any) -> Optional[Dict[str, Any]]:
+    """
+    Mengubah list data point (dict dengan key yang sama dan urutan sama) menjadi kolom:
+    integer dan timestamp ISO di-delta-encode, float sebagai float64 biner, string
+    berulang memakai dictionary. None jika payload tidak cocok untuk format kolom.
+    """
+    if not isinstance(points, list) or not points or not all(isinstance(p, dict) for p in points):
+        return None
+    keys = list(points[0])
+    if any(list(p) != keys for p in points):
+        return None
+    columns = [_encode_column([p[key] for p in points]) for key in keys]
+    return {"n": len(points), "k": keys, "c": columns}
+
+
+def decode_columnar(body: Dict[str, Any]) -> List[Dict[str, Any]]:
+    n = body["n"]
+    columns = [_decode_column(column, n) for column in body["c"]]
+    return [dict(zip(body["k"], row)) for row in zip(*columns)]
+
+
+class BufferCodec:
+    """
+    Codec entry buffer yang bisa dipilih lewat konfigurasi:
+      - 'json'     : format lama, field stream teks apa adanya
+      - 'msgpack'  : envelope msgpack [jenis payload, payload, timestamp_queued, max_retries]
+      - 'columnar' : seperti msgpack, tetapi list data point numerik disimpan per kolom
+    Opsional zstd (dengan dictionary terlatih) di atas envelope msgpack. Dictionary juga
+    dibagikan lewat Redis oleh BufferManager (add_dictionary), karena worker lain harus
+    bisa men-decode entry yang dikompres dengannya.
+    Setiap entry membawa tag format, sehingga entry lama tetap bisa dibaca.
+    Payload hasil decode setara secara JSON dengan aslinya (tidak harus identik per byte);
+    format kolom hanya dipakai jika round-trip-nya menghasilkan data yang sama persis.
+    """
+
+    def __init__(self, name: str = "columnar", compression: Optional[str] = None, zstd_level: int = 3,
+                 dictionary_dir: Optional[str] = None, min_compress_bytes: int = 128):
+        if name not in ("json", "msgpack", "columnar"):
+            raise ValueError(f"Unknown buffer codec: {name}")
+        self.name = name
+        self.zstd_level = zstd_level
+        self.min_compress_bytes = min_compress_bytes
+        self.dictionary_dir = dictionary_dir
+        self._dictionaries: Dict[int, Any] = {}
+        self._latest_dictionary = None
+        self._compressor = None
+        self._decompressors: Dict[int, Any] = {}
+
+        if compression == "zstd":
+            if zstandard is None:
+                logger.warning("BUFFER_CODEC_COMPRESSION=zstd but the zstandard package is not installed; compression disabled.")
+            else:
+                self._load_dictionaries()
+                self._compressor = zstandard.ZstdCompressor(level=zstd_level, dict_data=self._latest_dictionary)
+
+    def _load_dictionaries(self):
+        """
+        Memuat semua dictionary (<dict_id>.zdict). Yang terbaru (mtime) dipakai untuk encode;
+        dictionary lama tetap dibutuhkan untuk decode entry yang sudah ada.
+        """
+        if not self.dictionary_dir or not os.path.isdir(self.dictionary_dir):
+            return
+        paths = sorted(
+            (os.path.join(self.dictionary_dir, name) for name in os.listdir(self.dictionary_dir) if name.endswith(".zdict")),
+            key=os.path.getmtime
+        )
+        for path in paths:
+            with open(path, "rb") as f:
+                dictionary = zstandard.ZstdCompressionDict(f.read())
+            self._dictionaries[dictionary.dict_id()] = dictionary
+            self._latest_dictionary = dictionary
+
+    def _decompressor(self, data: bytes):
+        dict_id = zstandard.get_frame_parameters(data).dict_id
+        if dict_id not in self._decompressors:
+            if dict_id and dict_id not in self._dictionaries:
+                self._load_dictionaries()
+                if dict_id not in self._dictionaries:
+                    raise MissingDictionaryError(dict_id)
+            self._decompressors[dict_id] = zstandard.ZstdDecompressor(
+                dict_data=self._dictionaries.get(dict_id) if dict_id else None
+            )
+        return self._decompressors[dict_id]
+
+    @property
+    def compression_enabled(self) -> bool:
+        return self._compressor is not None
+
+    def add_dictionary(self, data: bytes, latest: bool = False) -> int:
+        """Mendaftarkan dictionary dari bytes (mis. dari Redis); latest=True juga dipakai untuk encode."""
+        dictionary = zstandard.ZstdCompressionDict(data)
+        dict_id = dictionary.dict_id()
+        self._dictionaries[dict_id] = dictionary
+        self._decompressors.pop(dict_id, None)
+        if latest:
+            self._latest_dictionary = dictionary
+            self._compressor = zstandard.ZstdCompressor(level=self.zstd_level, dict_data=dictionary)
+        return dict_id
+
+    def dictionary_bytes(self, dict_id: int) -> bytes:
+        return self._dictionaries[dict_id].as_bytes()
+
+    def _pack(self, fields: Dict[str, Any]) -> bytes:
+        payload = fields["payload"]
+        kind, body = PAYLOAD_RAW, payload
+        try:
+            parsed = json.loads(payload)
+        except (TypeError, ValueError):
+            parsed = None
+        else:
+            kind, body = PAYLOAD_OBJECT, parsed
+            if self.name == "columnar":
+                try:
+                    columnar_body = encode_columnar(parsed)
+                except (ValueError, OverflowError):
+                    columnar_body = None
+                # Hanya dipakai jika round-trip menghasilkan data yang sama persis
+                if columnar_body is not None and decode_columnar(columnar_body) == parsed:
+                    kind, body = PAYLOAD_COLUMNAR, columnar_body
+        return msgpack.packb([kind, body, fields["timestamp_queued"], int(fields["max_retries"])], use_bin_type=True)
+
+    def encode(self, fields: Dict[str, Any]) -> Dict[str, Any]:
+        """Field entry (payload, timestamp_queued, max_retries) -> field stream."""
+        if self.name == "json":
+            return fields
+        packed = self._pack(fields)
+        # Dengan dictionary, entry kecil pun mengecil; tanpa dictionary hanya entry besar yang dikompres
+        if self._compressor is not None and (self._latest_dictionary is not None or len(packed) >= self.min_compress_bytes):
+            return {FORMAT_FIELD: FORMAT_MSGPACK_ZSTD, DATA_FIELD: self._compressor.compress(packed)}
+        return {FORMAT_FIELD: FORMAT_MSGPACK, DATA_FIELD: packed}
+
+    def decode(self, fields: Dict[Any, Any]) -> Dict[str, Any]:
+        """Field stream (format apa pun, key str atau bytes) -> field entry."""
+        fields = {_as_str(k): v for k, v in fields.items()}
+        tag = _as_str(fields.get(FORMAT_FIELD))
+        if tag is None:
+            return {k: _as_str(v) for k, v in fields.items()}
+
+        data = fields[DATA_FIELD]
+        if tag == FORMAT_MSGPACK_ZSTD:
+            if zstandard is None:
+                raise ValueError("Entry is zstd-compressed but the zstandard package is not installed")
+            data = self._decompressor(data).decompress(data)
+        elif tag != FORMAT_MSGPACK:
+            raise ValueError(f"Unknown buffer entry format: {tag}")
+
+        kind, body, timestamp_queued, max_retries = msgpack.unpackb(data, raw=False)
+        if kind == PAYLOAD_RAW:
+            payload = body
+        elif kind == PAYLOAD_COLUMNAR:
+            payload = json.dumps(decode_columnar(body))
+        else:
+            payload = json.dumps(body)
+        return {"payload": payload, "timestamp_queued": timestamp_queued, "max_retries": max_retries}
+
+    def train_dictionary(self, samples: List[Dict[str, Any]], dict_size: int = 64 * 1024) -> int:
+        """
+        Melatih dictionary zstd dari contoh entry, menyimpannya sebagai <dict_id>.zdict
+        dan memakainya untuk entry baru. Mengembalikan dict_id.
+        """
+        if zstandard is None:
+            raise RuntimeError("zstandard package is not installed")
+        if not self.dictionary_dir:
+            raise RuntimeError("BUFFER_CODEC_ZSTD_DICT_DIR is not configured")
+        dictionary = zstandard.train_dictionary(dict_size, [self._pack(fields) for fields in samples])
+        os.makedirs(self.dictionary_dir, exist_ok=True)
+        with open(os.path.join(self.dictionary_dir, f"{dictionary.dict_id()}.zdict"), "wb") as f:
+            f.write(dictionary.as_bytes())
+        self._dictionaries[dictionary.dict_id()] = dictionary
+        self._latest_dictionary = dictionary
+        self._compressor = zstandard.ZstdCompressor(level=self.zstd_level, dict_data=dictionary)
+        logger.info(f"Trained zstd dictionary {dictionary.dict_id()} from {len(samples)} buffer entries.")
+        return dictionary.dict_id()
@@ -1,259 +1,1133 @@
 # core/buffer_manager.py
-import redis
+import redis.asyncio as redis
 import json
+import base64
 import logging
-import uuid
-from typing import List, Optional
+import os
+import time
+import random
+import socket
+from typing import List, Optional, Dict, Any, Awaitable, Callable
 from datetime import datetime
 import asyncio
 
 # Import dari schemas, bukan models
 from ..models.data_processing import BufferedDataEntryResponse, BufferedDataEntryCreate
 from ..config import config
+from .disk_spool import DiskSpool
+from .buffer_codec import BufferCodec, MissingDictionaryError
+from .buffer_quota import (
+    BufferQuota, BufferQuotaExceeded, load_quotas, downsample_payloads,
+    POLICY_DROP_NEWEST, POLICY_DOWNSAMPLE, POLICY_BLOCK
+)
 logger = logging.getLogger(__name__)
 
+# Mengambil retry yang sudah jatuh tempo dan sekaligus memberi lease (score dimundurkan),
+# secara atomik, agar dua forwarder tidak mengambil entry yang sama.
+LEASE_DUE_RETRIES_LUA = """
+local ids = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2])
+for _, id in ipairs(ids) do
+    redis.call('ZADD', KEYS[1], ARGV[3], id)
+end
+return ids
+"""
+
+# Menghapus hingga ARGV[2] entry tertua dengan ID <= ARGV[1] beserta state, jadwal retry,
+# dan status pending-nya di consumer group, secara atomik. Mengembalikan jumlah yang dihapus.
+DROP_OLDEST_LUA = """
+local entries = redis.call('XRANGE', KEYS[1], '-', ARGV[1], 'COUNT', ARGV[2])
+for _, entry in ipairs(entries) do
+    local id = entry[1]
+    redis.call('XACK', KEYS[1], ARGV[3], id)
+    redis.call('XDEL', KEYS[1], id)
+    redis.call('HDEL', KEYS[2], id)
+    redis.call('ZREM', KEYS[3], id)
+end
+return #entries
+"""
+
+# Memperbarui state JSON beberapa entry secara atomik (tidak ada update yang saling menimpa
+# antar forwarder/API): ARGV[1] = field yang ditimpa (JSON), ARGV[2] = tambahan retry_count,
+# ARGV[3..] = ID entry. KEYS[1] = hash state; jika KEYS[2] (stream) diberikan, entry yang
+# sudah tidak ada di stream dilewati (-1). Mengembalikan retry_count baru per entry.
+UPDATE_STATE_LUA = """
+local changes = cjson.decode(ARGV[1])
+local increment = tonumber(ARGV[2])
+local counts = {}
+for i = 3, #ARGV do
+    local id = ARGV[i]
+    if KEYS[2] and #redis.call('XRANGE', KEYS[2], id, id, 'COUNT', 1) == 0 then
+        counts[#counts + 1] = -1
+    else
+        local raw = redis.call('HGET', KEYS[1], id)
+        local state = raw and cjson.decode(raw) or {}
+        for field, value in pairs(changes) do
+            state[field] = value
+        end
+        if increment > 0 then
+            state['retry_count'] = (tonumber(state['retry_count']) or 0) + increment
+        end
+        redis.call('HSET', KEYS[1], id, cjson.encode(state))
+        counts[#counts + 1] = tonumber(state['retry_count']) or 0
+    end
+end
+return counts
+"""
+
+
+def retry_delay_ms(retry_count: int) -> int:
+    """
+    Backoff eksponensial dengan jitter: base * 2^(retry_count - 1), dibatasi max,
+    lalu diacak di rentang [delay * (1 - jitter), delay] agar retry tidak serentak.
+    """
+    delay = min(config.BUFFER_RETRY_MAX_DELAY_MS, config.BUFFER_RETRY_BASE_DELAY_MS * (2 ** max(retry_count - 1, 0)))
+    return int(delay * (1 - config.BUFFER_RETRY_JITTER * random.random()))
+
+
 class BufferManager:
     """
-    Mengelola buffering data menggunakan Redis.
-    Implementasi Store-and-Forward.
+    Mengelola buffering data menggunakan Redis Streams.
+    Implementasi Store-and-Forward: setiap tujuan punya satu stream
+    (buffer_queue:<destination>) dengan consumer group untuk forwarder.
+    ID entry adalah ID stream, sehingga ack, retry, dan update status
+    dilakukan langsung per entry (O(1)) tanpa menulis ulang antrian.
+    Jika Redis tidak tersedia, entry ditulis ke DiskSpool lokal dan dipindahkan
+    ke Redis oleh task drain setelah Redis pulih.
+    Isi entry di-encode dengan BufferCodec (msgpack/kolom/zstd, lihat core/buffer_codec.py);
+    entry dibaca lewat client biner terpisah karena datanya tidak selalu UTF-8.
     """
     BUFFER_KEY_PREFIX = "buffer_queue:"
+    # State yang berubah (retry_count, status, error) disimpan di hash per tujuan
+    STATE_KEY_PREFIX = "buffer_state:"
+    # List lama (sebelum Streams) dipindahkan ke sini selama migrasi
+    LEGACY_KEY_PREFIX = "buffer_legacy:"
+    # Jadwal retry per tujuan: sorted set entry ID -> waktu percobaan berikutnya (epoch ms)
+    RETRY_KEY_PREFIX = "buffer_retry:"
+    # Entry yang retry-nya habis atau payload-nya rusak dipindah ke stream dead-letter
+    DEAD_LETTER_KEY_PREFIX = "buffer_dead:"
+    # Hash counter entry yang sudah di-ack per tujuan (untuk laju drain di metrik status)
+    ACKED_COUNTER_KEY = "buffer_stats:acked"
+    # Dictionary zstd codec (dict_id -> bytes) dan dict_id terbaru, dibagikan ke semua worker
+    CODEC_DICT_KEY = "buffer_codec:zstd_dicts"
+    CODEC_LATEST_DICT_KEY = "buffer_codec:zstd_latest"
 
     def __init__(self):
+        self.group_name = config.BUFFER_CONSUMER_GROUP
+        self.consumer_name = config.BUFFER_CONSUMER_NAME or f"{socket.gethostname()}-{os.getpid()}"
+        self._ready_destinations = set()
+        self._ensure_lock = asyncio.Lock()
+        self.pool: Optional[redis.ConnectionPool] = None
+        self.redis_client: Optional[redis.Redis] = None
+        # Client tanpa decode_responses untuk membaca isi entry (biner)
+        self.data_pool: Optional[redis.ConnectionPool] = None
+        self.data_client: Optional[redis.Redis] = None
+        self.codec = BufferCodec(
+            config.BUFFER_CODEC,
+            config.BUFFER_CODEC_COMPRESSION or None,
+            config.BUFFER_CODEC_ZSTD_LEVEL,
+            config.BUFFER_CODEC_ZSTD_DICT_DIR or None
+        )
+        self.spool: Optional[DiskSpool] = None
+        self._drain_lock = asyncio.Lock()
+        self._spool_task: Optional[asyncio.Task] = None
+        self._lease_script = None
+        self._drop_script = None
+        self._state_script = None
+        # Budget per tujuan (key None = default), perkiraan ukuran entry ter-encode, dan counter kebijakan
+        self.quotas: Dict[Optional[str], BufferQuota] = load_quotas()
+        self._entry_bytes: Dict[str, float] = {}
+        self._quota_counters: Dict[str, Dict[str, int]] = {}
+        # Cache metrik status: (waktu monotonic, hasil) dan snapshot sebelumnya untuk laju drain
+        self._metrics_cache: Optional[tuple] = None
+        self._metrics_previous: Dict[str, tuple] = {}
+        self._metrics_lock = asyncio.Lock()
+
+    async def initialize(self):
+        """
+        Membuat connection pool Redis bersama (sekali saat startup).
+        Semua request dan forwarder memakai pool ini, bukan koneksi baru per request.
+        Dengan spool disk aktif, Redis yang belum bisa dihubungi tidak menggagalkan startup.
+        """
+        if config.BUFFER_SPOOL_ENABLED and self.spool is None:
+            self.spool = await asyncio.to_thread(
+                DiskSpool,
+                config.BUFFER_SPOOL_DIR,
+                config.BUFFER_SPOOL_SEGMENT_BYTES,
+                config.BUFFER_SPOOL_FSYNC_INTERVAL_MS,
+                config.BUFFER_SPOOL_FSYNC_BATCH
+            )
+            self._spool_task = asyncio.create_task(self._spool_drain_loop())
+            logger.info(f"Disk spool enabled at {config.BUFFER_SPOOL_DIR}.")
+
         try:
-            self.redis_client = redis.Redis(
-                host=config.REDIS_HOST, 
-                port=config.REDIS_PORT, 
-                db=config.REDIS_DB_BUFFER, 
+            self.pool = redis.ConnectionPool(
+                host=config.REDIS_HOST,
+                port=config.REDIS_PORT,
+                db=config.REDIS_DB_BUFFER,
                 decode_responses=True,
+                max_connections=config.BUFFER_REDIS_POOL_SIZE,
+                socket_connect_timeout=5,
+                socket_timeout=5,
+                retry_on_timeout=True
+            )
+            self.redis_client = redis.Redis(connection_pool=self.pool)
+            self.data_pool = redis.ConnectionPool(
+                host=config.REDIS_HOST,
+                port=config.REDIS_PORT,
+                db=config.REDIS_DB_BUFFER,
+                decode_responses=False,
+                max_connections=config.BUFFER_REDIS_POOL_SIZE,
                 socket_connect_timeout=5,
                 socket_timeout=5,
                 retry_on_timeout=True
             )
+            self.data_client = redis.Redis(connection_pool=self.data_pool)
             # Test koneksi
-            self.redis_client.ping()
-            logger.info("BufferManager initialized with Redis successfully.")
+            await self.redis_client.ping()
+            await self._load_codec_dictionaries()
+            logger.info(f"BufferManager initialized with Redis successfully (pool size {config.BUFFER_REDIS_POOL_SIZE}).")
+        except (redis.ConnectionError, redis.TimeoutError) as e:
+            if self.spool is None:
+                logger.error(f"Failed to initialize Redis connection: {e}")
+                raise
+            logger.warning(f"Redis unavailable at startup ({e}); buffering to disk spool until it recovers.")
         except Exception as e:
             logger.error(f"Failed to initialize Redis connection: {e}")
             raise
 
-    def enqueue_data(self, destination: str, payload: str) -> str:
+    async def _load_codec_dictionaries(self):
+        """Memuat dictionary zstd yang dibagikan lewat Redis; yang terbaru dipakai untuk encode."""
+        if not self.codec.compression_enabled:
+            return
+        dictionaries = await self.data_client.hgetall(self.CODEC_DICT_KEY)
+        latest = await self.data_client.get(self.CODEC_LATEST_DICT_KEY)
+        for dict_id, data in dictionaries.items():
+            self.codec.add_dictionary(data, latest=dict_id == latest)
+        if dictionaries:
+            logger.info(f"Loaded {len(dictionaries)} shared zstd dictionaries from Redis.")
+
+    async def _decode(self, fields: Dict[Any, Any]) -> Dict[str, Any]:
+        """Decode satu entry; dictionary zstd yang belum dimuat diambil dari Redis lebih dulu."""
+        try:
+            return self.codec.decode(fields)
+        except MissingDictionaryError as e:
+            data = await self.data_client.hget(self.CODEC_DICT_KEY, str(e.dict_id))
+            if data is None:
+                raise
+            self.codec.add_dictionary(data)
+            return self.codec.decode(fields)
+
+    def _key(self, destination: str) -> str:
+        return f"{self.BUFFER_KEY_PREFIX}{destination}"
+
+    def _state_key(self, destination: str) -> str:
+        return f"{self.STATE_KEY_PREFIX}{destination}"
+
+    def _retry_key(self, destination: str) -> str:
+        return f"{self.RETRY_KEY_PREFIX}{destination}"
+
+    def _dead_letter_key(self, destination: str) -> str:
+        return f"{self.DEAD_LETTER_KEY_PREFIX}{destination}"
+
+    async def _ensure_stream(self, destination: str) -> str:
+        """
+        Memastikan stream dan consumer group untuk tujuan sudah ada.
+        Jika key masih berupa list lama, isinya dimigrasi ke stream terlebih dahulu.
+        Hanya dijalankan sekali per tujuan per proses; jika group hilang (NOGROUP),
+        _group_call menjalankannya lagi.
         """
-        Memasukkan data ke dalam buffer (queue Redis).
+        key = self._key(destination)
+        if destination in self._ready_destinations:
+            return key
+
+        async with self._ensure_lock:
+            if destination in self._ready_destinations:
+                return key
+            if await self.redis_client.exists(self._legacy_key(destination)):
+                # Migrasi sebelumnya terhenti di tengah jalan (mis. proses mati), lanjutkan
+                await self._migrate_legacy_list(destination, resume=True)
+            if await self.redis_client.type(key) == "list":
+                await self._migrate_legacy_list(destination)
+
+            try:
+                await self.redis_client.xgroup_create(key, self.group_name, id="0", mkstream=True)
+            except redis.ResponseError as e:
+                if "BUSYGROUP" not in str(e):
+                    raise
+            self._ready_destinations.add(destination)
+        return key
+
+    async def _group_call(self, destination: str, operation: Callable[[str], Awaitable[Any]]) -> Any:
         """
+        Menjalankan operasi consumer group atas stream tujuan. Jika Redis di-restart tanpa
+        persistensi, XADD berikutnya membuat stream baru tanpa group dan operasi gagal
+        dengan NOGROUP: group dibuat ulang lalu operasi diulang sekali.
+        """
+        key = await self._ensure_stream(destination)
         try:
-            entry_id = str(uuid.uuid4())
-            current_timestamp = datetime.now().isoformat()
-            
-            # Buat data entry sebagai dictionary
-            entry_data = {
-                "id": entry_id,
-                "destination": destination,
+            return await operation(key)
+        except redis.ResponseError as e:
+            if "NOGROUP" not in str(e):
+                raise
+            logger.warning(f"Consumer group for {destination} is missing (Redis restarted?), recreating it.")
+            self._ready_destinations.discard(destination)
+            key = await self._ensure_stream(destination)
+            return await operation(key)
+
+    def _legacy_key(self, destination: str) -> str:
+        return f"{self.LEGACY_KEY_PREFIX}{destination}"
+
+    async def _migrate_legacy_list(self, destination: str, chunk_size: int = 1000, resume: bool = False):
+        """
+        Memindahkan entry dari queue list lama ke stream, dari yang tertua.
+        Setiap potongan di-XADD dan dipotong dari list lama dalam satu transaksi, jadi
+        migrasi yang terhenti bisa dilanjutkan (resume=True) tanpa entry ganda atau hilang.
+        """
+        key = self._key(destination)
+        legacy_key = self._legacy_key(destination)
+        if not resume:
+            # RENAME atomik: producer baru langsung menulis ke stream yang kosong
+            await self.redis_client.rename(key, legacy_key)
+
+        migrated = 0
+        while True:
+            # LPUSH menaruh entry terbaru di head: potongan tertua ada di ekor list
+            entries_raw = await self.redis_client.lrange(legacy_key, -chunk_size, -1)
+            if not entries_raw:
+                break
+            pipe = self.redis_client.pipeline(transaction=True)
+            for entry_str in reversed(entries_raw):
+                try:
+                    entry_dict = json.loads(entry_str)
+                except json.JSONDecodeError as e:
+                    logger.warning(f"Skipping undecodable legacy entry for {destination}: {e}")
+                    continue
+                pipe.xadd(key, self.codec.encode({
+                    "payload": entry_dict.get("payload", ""),
+                    "timestamp_queued": entry_dict.get("timestamp_queued") or datetime.now().isoformat(),
+                    "max_retries": entry_dict.get("max_retries", 3),
+                }))
+                migrated += 1
+            pipe.ltrim(legacy_key, 0, -len(entries_raw) - 1)
+            await pipe.execute()
+
+        await self.redis_client.delete(legacy_key)
+        logger.info(f"Migrated {migrated} legacy list entries to stream for {destination}"
+                    f"{' (resumed)' if resume else ''}.")
+
+    def _to_entry(self, destination: str, entry_id: str, fields: Dict[str, Any], state_raw: Optional[str]) -> dict:
+        """Menyusun dictionary entry (bentuk BufferedDataEntryResponse) dari field stream dan state."""
+        queued = fields.get("timestamp_queued")
+        entry = {
+            "id": entry_id,
+            "destination": destination,
+            "payload": fields.get("payload", ""),
+            "timestamp_queued": queued,
+            "retry_count": 0,
+            "max_retries": int(fields.get("max_retries", 3)),
+            "status": "pending",
+            "created_at": queued,
+            "updated_at": queued
+        }
+        if state_raw:
+            try:
+                entry.update(json.loads(state_raw))
+            except json.JSONDecodeError as e:
+                logger.warning(f"Failed to decode state for entry {entry_id}: {e}")
+        return entry
+
+    async def _hydrate(self, destination: str, messages: List, dead_letter_undecodable: bool = True) -> List[dict]:
+        """
+        Men-decode pesan stream (dari data_client) dan menggabungkannya dengan state-nya
+        (satu HMGET untuk semua entry). Entry yang tidak bisa di-decode langsung dipindah
+        ke dead-letter dengan field mentahnya (kecuali dead_letter_undecodable=False, untuk
+        pembacaan yang hanya inspeksi); jika hanya dilewati, entry itu tidak pernah di-ack
+        dan terus diklaim ulang oleh claim_stale_entries. Entry dengan dictionary zstd yang
+        tidak ditemukan bukan entry rusak: dilewati dan dicoba lagi saat diklaim ulang.
+        """
+        decoded = []
+        undecodable = []
+        for entry_id, fields in messages:
+            if not fields:
+                continue
+            entry_id = entry_id.decode() if isinstance(entry_id, bytes) else entry_id
+            try:
+                decoded.append((entry_id, await self._decode(fields)))
+            except MissingDictionaryError as e:
+                logger.warning(f"Cannot decode buffer entry {entry_id} for {destination} yet: {e}")
+            except Exception as e:
+                logger.error(f"Failed to decode buffer entry {entry_id} for {destination}: {e}")
+                undecodable.append({
+                    "id": entry_id,
+                    "raw_fields": json.dumps({
+                        (k.decode(errors="replace") if isinstance(k, bytes) else k):
+                            base64.b64encode(v if isinstance(v, bytes) else str(v).encode()).decode()
+                        for k, v in fields.items()
+                    }),
+                    "error_message": f"Undecodable entry: {e}",
+                })
+        if undecodable and dead_letter_undecodable:
+            try:
+                await self.dead_letter(destination, undecodable)
+            except Exception as e:
+                logger.error(f"Failed to dead-letter undecodable entries for {destination}: {e}")
+        messages = decoded
+        if not messages:
+            return []
+        states = await self.redis_client.hmget(self._state_key(destination), [entry_id for entry_id, _ in messages])
+        return [
+            self._to_entry(destination, entry_id, fields, state_raw)
+            for (entry_id, fields), state_raw in zip(messages, states)
+        ]
+
+    async def _xadd_many(self, destination: str, entries: List[Dict[str, Any]]) -> List[str]:
+        """XADD beberapa entry (di-encode dengan codec) ke stream tujuan dalam satu pipeline."""
+        key = await self._ensure_stream(destination)
+        pipe = self.redis_client.pipeline(transaction=False)
+        sizes = []
+        for fields in entries:
+            encoded = self.codec.encode(fields)
+            sizes.append(sum(len(k) + len(v) for k, v in encoded.items() if isinstance(v, (str, bytes))))
+            pipe.xadd(key, encoded)
+        entry_ids = await pipe.execute()
+        if sizes:
+            # Rata-rata bergerak ukuran entry, untuk perkiraan byte per tujuan tanpa MEMORY USAGE
+            average = sum(sizes) / len(sizes)
+            previous = self._entry_bytes.get(destination)
+            self._entry_bytes[destination] = average if previous is None else 0.8 * previous + 0.2 * average
+        return entry_ids
+
+    def quota_for(self, destination: str) -> BufferQuota:
+        return self.quotas.get(destination) or self.quotas[None]
+
+    def _count(self, destination: str, counter: str, amount: int = 1):
+        counters = self._quota_counters.setdefault(destination, {
+            "dropped_oldest": 0, "dropped_newest": 0, "expired": 0,
+            "downsampled": 0, "blocked": 0, "block_timeouts": 0,
+        })
+        counters[counter] += amount
+
+    async def _usage(self, destination: str) -> Dict[str, Any]:
+        """Jumlah entry, perkiraan byte, dan umur entry tertua stream tujuan (satu round trip)."""
+        key = self._key(destination)
+        pipe = self.data_client.pipeline(transaction=False)
+        pipe.xlen(key)
+        pipe.xrange(key, "-", "+", count=1)
+        entries, oldest = await pipe.execute()
+        if entries and destination not in self._entry_bytes:
+            # Setelah restart: perkirakan ukuran entry dari sampel entry terbaru
+            sample = await self.data_client.xrevrange(key, "+", "-", count=16)
+            sizes = [sum(len(k) + len(v) for k, v in fields.items()) for _, fields in sample]
+            if sizes:
+                self._entry_bytes[destination] = sum(sizes) / len(sizes)
+        oldest_age = None
+        if oldest:
+            oldest_id = oldest[0][0].decode() if isinstance(oldest[0][0], bytes) else oldest[0][0]
+            oldest_age = max(0.0, time.time() - int(oldest_id.split("-")[0]) / 1000.0)
+        return {
+            "entries": entries,
+            "bytes": int(entries * self._entry_bytes.get(destination, 0)),
+            "oldest_age_seconds": round(oldest_age, 3) if oldest_age is not None else None,
+        }
+
+    async def _drop_oldest(self, destination: str, count: int, max_id: str = "+") -> int:
+        """Menghapus hingga count entry tertua (ID <= max_id), per potongan 1000 entry."""
+        if self._drop_script is None:
+            self._drop_script = self.redis_client.register_script(DROP_OLDEST_LUA)
+        keys = [self._key(destination), self._state_key(destination), self._retry_key(destination)]
+        dropped = 0
+        while dropped < count:
+            batch = min(count - dropped, 1000)
+            removed = await self._drop_script(keys=keys, args=[max_id, batch, self.group_name])
+            dropped += removed
+            if removed < batch:
+                break
+        return dropped
+
+    async def _downsample(self, destination: str, count: int) -> int:
+        """
+        Menggabungkan pasangan entry tertua yang belum dikirim ke forwarder
+        (resolusi per tag jadi separuh, lihat downsample_payloads) hingga count entry terbebas.
+        Entry stream tidak bisa diubah, jadi payload gabungan disimpan di state entry yang
+        lebih tua (menimpa payload aslinya saat dibaca, lihat _to_entry) dan entry yang lebih
+        baru dihapus; posisi dan urutan entry di stream tetap.
+        """
+        key = self._key(destination)
+        start = "-"
+        for group in await self.redis_client.xinfo_groups(key):
+            if group["name"] == self.group_name:
+                start = f"({group['last-delivered-id']}"
+        messages = await self.data_client.xrange(key, start, "+", count=count * 2)
+        entries = await self._hydrate(destination, messages)
+
+        pipe = self.redis_client.pipeline(transaction=True)
+        merged_count = 0
+        for older, newer in zip(entries[0::2], entries[1::2]):
+            payload = downsample_payloads(older["payload"], newer["payload"])
+            if payload is None:
+                continue
+            pipe.xdel(key, newer["id"])
+            pipe.hdel(self._state_key(destination), newer["id"])
+            # Entry yang belum dikirim hanya punya state dari penggabungan sebelumnya
+            pipe.hset(self._state_key(destination), older["id"], json.dumps({
                 "payload": payload,
-                "timestamp_queued": current_timestamp,
-                "retry_count": 0,
-                "max_retries": 3,
-                "status": "pending",
-                "created_at": current_timestamp,
-                "updated_at": current_timestamp
-            }
-            
-            key = f"{self.BUFFER_KEY_PREFIX}{destination}"
-            serialized_entry = json.dumps(entry_data)
-            
-            # LPUSH untuk menambahkan ke head queue (FIFO)
-            self.redis_client.lpush(key, serialized_entry)
-            logger.info(f"Enqueued data (ID: {entry_id}) for destination: {destination}")
-            return entry_id
-            
+                "max_retries": max(older["max_retries"], newer["max_retries"]),
+            }))
+            merged_count += 1
+        if merged_count:
+            await pipe.execute()
+        return merged_count
+
+    async def _enforce_quota(self, destination: str, entries: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Menegakkan budget tujuan sebelum entry ditulis ke Redis. Entry yang melewati
+        batas umur dihapus; jika jumlah/byte akan melebihi budget, kebijakan tujuan
+        diterapkan. Mengembalikan entry yang boleh ditulis (drop_newest bisa membuang sebagian).
+        """
+        quota = self.quota_for(destination)
+        if not quota.is_limited:
+            return entries
+        await self._ensure_stream(destination)
+        usage = await self._usage(destination)
+
+        if quota.max_age_seconds and usage["oldest_age_seconds"] is not None \
+                and usage["oldest_age_seconds"] > quota.max_age_seconds:
+            cutoff_ms = int((time.time() - quota.max_age_seconds) * 1000)
+            expired = await self._drop_oldest(destination, usage["entries"], str(cutoff_ms))
+            self._count(destination, "expired", expired)
+            logger.warning(f"Expired {expired} buffered entries older than {quota.max_age_seconds}s for {destination}.")
+            usage = await self._usage(destination)
+
+        average = self._entry_bytes.get(destination, 0)
+        total = usage["entries"] + len(entries)
+        excess = quota.overflow(total, int(total * average))
+        if not excess:
+            return entries
+
+        if quota.policy == POLICY_BLOCK:
+            self._count(destination, "blocked")
+            deadline = time.monotonic() + quota.block_timeout
+            while excess:
+                if time.monotonic() >= deadline:
+                    self._count(destination, "block_timeouts")
+                    raise BufferQuotaExceeded(
+                        f"Buffer for {destination} is full ({usage['entries']} entries); "
+                        f"waited {quota.block_timeout}s for the forwarder to drain it"
+                    )
+                await asyncio.sleep(config.BUFFER_QUOTA_BLOCK_POLL_INTERVAL)
+                usage = await self._usage(destination)
+                total = usage["entries"] + len(entries)
+                excess = quota.overflow(total, int(total * self._entry_bytes.get(destination, 0)))
+            return entries
+
+        if quota.policy == POLICY_DROP_NEWEST:
+            keep = max(0, len(entries) - excess)
+            self._count(destination, "dropped_newest", len(entries) - keep)
+            logger.warning(f"Buffer quota for {destination} exceeded, dropped {len(entries) - keep} new entries.")
+            return entries[:keep]
+
+        if quota.policy == POLICY_DOWNSAMPLE:
+            merged = await self._downsample(destination, excess)
+            self._count(destination, "downsampled", merged)
+            excess -= merged
+        if excess > 0:
+            dropped = await self._drop_oldest(destination, excess)
+            self._count(destination, "dropped_oldest", dropped)
+            excess -= dropped
+            logger.warning(f"Buffer quota for {destination} exceeded, dropped {dropped} oldest entries.")
+        if excess > 0:
+            # Batch baru sendiri lebih besar dari budget: yang tertua dari batch ikut dibuang
+            self._count(destination, "dropped_oldest", min(excess, len(entries)))
+            entries = entries[excess:]
+        return entries
+
+    async def get_quota_usage(self, destination: str) -> Dict[str, Any]:
+        """Pemakaian budget tujuan: entry, byte (perkiraan), umur tertua, budget, dan counter kebijakan."""
+        quota = self.quota_for(destination)
+        usage = await self._usage(destination)
+        return {
+            **usage,
+            "quota": quota.as_dict(),
+            "entries_used_pct": round(100.0 * usage["entries"] / quota.max_entries, 1) if quota.max_entries else None,
+            "bytes_used_pct": round(100.0 * usage["bytes"] / quota.max_bytes, 1) if quota.max_bytes else None,
+            "counters": dict(self._quota_counters.get(destination, {})),
+        }
+
+    async def _spool_entries(self, destination: str, entries: List[Dict[str, Any]]) -> List[str]:
+        records = [{"destination": destination, **fields} for fields in entries]
+        positions = await asyncio.to_thread(self.spool.append_many, records)
+        return [f"spool:{seq}:{offset}" for seq, offset in positions]
+
+    async def _store(self, destination: str, entries: List[Dict[str, Any]], chunk_size: int) -> List[str]:
+        """
+        Menyimpan entry per chunk (satu round trip per chunk), setelah budget tujuan
+        ditegakkan (entry yang dibuang kebijakan tidak punya ID). Selama spool disk masih
+        berisi backlog, entry baru juga ditulis ke spool agar urutan FIFO terjaga;
+        jika Redis tidak bisa dihubungi, chunk yang gagal dialihkan ke spool.
+        """
+        entry_ids: List[str] = []
+        for start in range(0, len(entries), chunk_size):
+            chunk = entries[start:start + chunk_size]
+            if self.spool is not None and not self.spool.is_empty():
+                entry_ids.extend(await self._spool_entries(destination, chunk))
+                continue
+            try:
+                chunk = await self._enforce_quota(destination, chunk)
+                if chunk:
+                    entry_ids.extend(await self._xadd_many(destination, chunk))
+            except (redis.ConnectionError, redis.TimeoutError) as e:
+                if self.spool is None:
+                    raise
+                logger.warning(f"Redis unavailable ({e}), spooling {len(chunk)} entries for {destination} to disk.")
+                entry_ids.extend(await self._spool_entries(destination, chunk))
+        return entry_ids
+
+    async def enqueue_data(self, destination: str, payload: str, max_retries: int = 3) -> Optional[str]:
+        """
+        Memasukkan data ke dalam buffer (XADD ke stream tujuan, atau spool disk).
+        Mengembalikan ID entry (ID stream, atau "spool:<segment>:<offset>"),
+        atau None jika entry dibuang oleh kebijakan drop_newest.
+        """
+        try:
+            entry_ids = await self._store(destination, [{
+                "payload": payload,
+                "timestamp_queued": datetime.now().isoformat(),
+                "max_retries": max_retries,
+            }], 1)
+            if not entry_ids:
+                logger.warning(f"Entry for destination {destination} dropped by buffer quota.")
+                return None
+            logger.info(f"Enqueued data (ID: {entry_ids[0]}) for destination: {destination}")
+            return entry_ids[0]
+
         except Exception as e:
             logger.error(f"Failed to enqueue data for destination {destination}: {e}")
             raise
 
-    def get_pending_entries(self, destination: str, limit: int = 10) -> List[dict]:
+    async def enqueue_many(self, destination: str, payloads: List[str], max_retries: int = 3,
+                           chunk_size: Optional[int] = None) -> List[str]:
         """
-        Mengambil entry dari buffer untuk sebuah tujuan, tanpa menghapusnya.
-        Mengembalikan list of dictionaries untuk kompatibilitas dengan FastAPI.
+        Memasukkan banyak payload sekaligus. XADD dikirim lewat pipeline per chunk
+        (satu round trip per chunk, bukan per entry); timestamp dibuat sekali per panggilan.
+        Mengembalikan ID entry yang tersimpan, sesuai urutan payload.
         """
+        chunk_size = chunk_size or config.BUFFER_ENQUEUE_CHUNK_SIZE
         try:
-            key = f"{self.BUFFER_KEY_PREFIX}{destination}"
-            # LRANGE untuk mendapatkan elemen dari list
-            entries_raw = self.redis_client.lrange(key, 0, limit - 1)
-            
-            entries = []
-            for entry_str in entries_raw:
-                try:
-                    entry_dict = json.loads(entry_str)
-                    # Validasi dengan Pydantic model (opsional)
-                    # BufferedDataEntryResponse(**entry_dict)  # Untuk validasi
-                    entries.append(entry_dict)
-                except json.JSONDecodeError as e:
-                    logger.warning(f"Failed to decode entry: {e}")
-                    continue
-                except Exception as e:
-                    logger.warning(f"Failed to validate entry: {e}")
-                    continue
-                    
+            current_timestamp = datetime.now().isoformat()
+            entry_ids = await self._store(destination, [
+                {"payload": payload, "timestamp_queued": current_timestamp, "max_retries": max_retries}
+                for payload in payloads
+            ], chunk_size)
+            logger.info(f"Enqueued {len(entry_ids)} entries for destination: {destination}")
+            return entry_ids
+
+        except Exception as e:
+            logger.error(f"Failed to enqueue batch for destination {destination}: {e}")
+            raise
+
+    async def drain_spool(self, batch_size: Optional[int] = None) -> int:
+        """
+        Memindahkan record dari spool disk ke stream Redis, dari yang tertua.
+        Cursor spool baru dimajukan setelah XADD berhasil (at-least-once:
+        crash di tengah batch bisa menghasilkan duplikat, bukan kehilangan data).
+        Budget tujuan ditegakkan per tujuan sebelum XADD, sama seperti _store.
+        """
+        if self.spool is None:
+            return 0
+        batch_size = batch_size or config.BUFFER_ENQUEUE_CHUNK_SIZE
+        drained = 0
+        async with self._drain_lock:
+            while True:
+                records, position = await asyncio.to_thread(self.spool.read_batch, batch_size)
+                by_destination: Dict[str, List[Dict[str, Any]]] = {}
+                for record in records:
+                    by_destination.setdefault(record.pop("destination"), []).append(record)
+                for destination, entries in by_destination.items():
+                    entries = await self._enforce_quota(destination, entries)
+                    if entries:
+                        await self._xadd_many(destination, entries)
+                await asyncio.to_thread(self.spool.commit, position)
+                drained += len(records)
+                if len(records) < batch_size:
+                    break
+        if drained:
+            logger.info(f"Drained {drained} entries from disk spool into Redis.")
+        return drained
+
+    async def _spool_drain_loop(self):
+        """Task latar: fsync berkala dan drain spool begitu Redis tersedia kembali."""
+        while True:
+            try:
+                await asyncio.to_thread(self.spool.sync)
+                if self.redis_client is not None and not self.spool.is_empty():
+                    await self.drain_spool()
+            except asyncio.CancelledError:
+                raise
+            except (redis.ConnectionError, redis.TimeoutError) as e:
+                logger.debug(f"Redis still unavailable, spool drain deferred: {e}")
+            except Exception as e:
+                logger.error(f"Error draining disk spool: {e}", exc_info=True)
+            await asyncio.sleep(config.BUFFER_SPOOL_DRAIN_INTERVAL)
+
+    async def get_pending_entries(self, destination: str, limit: int = 10) -> List[dict]:
+        """
+        Mengambil entry tertua dari buffer untuk sebuah tujuan, tanpa menghapus
+        atau mengklaimnya (XRANGE). Mengembalikan list of dictionaries untuk kompatibilitas dengan FastAPI.
+        """
+        try:
+            key = await self._ensure_stream(destination)
+            messages = await self.data_client.xrange(key, "-", "+", count=limit)
+            # Hanya inspeksi: entry rusak tidak dipindah ke dead-letter dari sini
+            entries = await self._hydrate(destination, messages, dead_letter_undecodable=False)
             logger.debug(f"Retrieved {len(entries)} pending entries for {destination}.")
             return entries
-            
+
         except Exception as e:
             logger.error(f"Failed to get pending entries for destination {destination}: {e}")
             return []
 
-    def acknowledge_and_remove(self, destination: str, entry_ids: List[str]) -> int:
+    async def read_entries(self, destination: str, count: int = 10, block_ms: Optional[int] = None,
+                     consumer: Optional[str] = None) -> List[dict]:
         """
-        Menghapus entry yang telah berhasil dikirim dari buffer.
-        Karena Redis List tidak mendukung penghapusan elemen tengah secara efisien,
-        kita perlu pendekatan khusus. Untuk kesederhanaan, kita asumsikan
-        entry diproses dari yang tertua (head) dan dihapus secara batch.
+        Mengklaim entry baru untuk dikirim (XREADGROUP). Entry masuk ke daftar pending
+        consumer group sampai di-ack, sehingga tidak diberikan ke forwarder lain.
         """
         try:
-            # Pendekatan sederhana: hapus N entry teratas jika entry_ids adalah N entry teratas.
-            # Ini bekerja jika konsumen memproses dalam urutan FIFO.
-            key = f"{self.BUFFER_KEY_PREFIX}{destination}"
-            
-            # Dapatkan semua entry untuk memastikan kita hanya menghapus yang benar
-            all_entries = self.redis_client.lrange(key, 0, -1)
-            if not all_entries:
-                return 0
-                
-            # Hitung berapa banyak entry yang harus dihapus (berdasarkan entry_ids yang diberikan)
-            # Asumsikan entry_ids adalah entry teratas yang akan dihapus
-            num_to_remove = min(len(entry_ids), len(all_entries))
-            
-            # Hapus entry teratas
-            removed_count = 0
-            for _ in range(num_to_remove):
-                result = self.redis_client.rpop(key)  # Hapus dari tail (FIFO)
-                if result:
-                    removed_count += 1
-                else:
-                    break
-                    
+            response = await self._group_call(destination, lambda key: self.data_client.xreadgroup(
+                self.group_name, consumer or self.consumer_name, {key: ">"}, count=count, block=block_ms
+            ))
+            messages = response[0][1] if response else []
+            return await self._hydrate(destination, messages)
+        except Exception as e:
+            logger.error(f"Failed to read entries for destination {destination}: {e}")
+            return []
+
+    async def claim_stale_entries(self, destination: str, min_idle_ms: Optional[int] = None, count: int = 10,
+                            consumer: Optional[str] = None) -> List[dict]:
+        """
+        Mengambil alih entry yang sudah dibaca tetapi tidak di-ack lebih dari min_idle_ms
+        (misal forwarder mati di tengah pengiriman) dengan XPENDING + XCLAIM.
+        Setiap entry membawa 'delivery_count' dari daftar pending.
+        """
+        min_idle_ms = min_idle_ms if min_idle_ms is not None else config.BUFFER_CLAIM_IDLE_MS
+        try:
+            key = await self._ensure_stream(destination)
+            pending = await self._group_call(destination, lambda key: self.redis_client.xpending_range(
+                key, self.group_name, min="-", max="+", count=count, idle=min_idle_ms
+            ))
+            if not pending:
+                return []
+            deliveries = {p["message_id"]: p["times_delivered"] for p in pending}
+            messages = await self.data_client.xclaim(
+                key, self.group_name, consumer or self.consumer_name, min_idle_ms, list(deliveries)
+            )
+            entries = await self._hydrate(destination, messages)
+            for entry in entries:
+                entry["delivery_count"] = deliveries.get(entry["id"], 1)
+            if entries:
+                logger.info(f"Claimed {len(entries)} stale entries for {destination}.")
+            return entries
+        except Exception as e:
+            logger.error(f"Failed to claim stale entries for destination {destination}: {e}")
+            return []
+
+    async def get_pending_summary(self, destination: str) -> Dict[str, Any]:
+        """Ringkasan entry yang sedang dikirim (belum di-ack) per consumer (XPENDING)."""
+        try:
+            def summarize(key: str) -> Awaitable[List[Any]]:
+                pipe = self.redis_client.pipeline(transaction=False)
+                pipe.xpending(key, self.group_name)
+                pipe.zcard(self._retry_key(destination))
+                pipe.zrange(self._retry_key(destination), 0, 0, withscores=True)
+                pipe.xlen(self._dead_letter_key(destination))
+                return pipe.execute()
+
+            summary, scheduled, next_retry, dead_lettered = await self._group_call(destination, summarize)
+            return {
+                "destination": destination,
+                "in_flight": summary["pending"],
+                "oldest_id": summary["min"],
+                "newest_id": summary["max"],
+                "consumers": {c["name"]: c["pending"] for c in summary["consumers"]},
+                "scheduled_retries": scheduled,
+                "next_retry_at_ms": int(next_retry[0][1]) if next_retry else None,
+                "dead_lettered": dead_lettered,
+            }
+        except Exception as e:
+            logger.error(f"Failed to get pending summary for destination {destination}: {e}")
+            return {"destination": destination, "in_flight": 0, "oldest_id": None, "newest_id": None, "consumers": {},
+                    "scheduled_retries": 0, "next_retry_at_ms": None, "dead_lettered": 0}
+
+    async def get_buffer_metrics(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Metrik semua tujuan: SCAN buffer_queue:* lalu satu pipeline untuk seluruh tujuan
+        (kedalaman, perkiraan byte, umur entry tertua, in-flight, histogram retry,
+        dead-letter, laju drain). Hasil di-cache BUFFER_METRICS_CACHE_TTL detik dan
+        permintaan yang bersamaan menunggu satu perhitungan yang sama.
+        """
+        async with self._metrics_lock:
+            now = time.monotonic()
+            if self._metrics_cache and now - self._metrics_cache[0] < config.BUFFER_METRICS_CACHE_TTL:
+                return self._metrics_cache[1]
+
+            destinations = await self.list_destinations()
+            pipe = self.data_client.pipeline(transaction=False)
+            for destination in destinations:
+                key = self._key(destination)
+                pipe.xlen(key)
+                pipe.xrange(key, "-", "+", count=1)
+                pipe.xpending(key, self.group_name)
+                pipe.zcard(self._retry_key(destination))
+                pipe.hvals(self._state_key(destination))
+                pipe.xlen(self._dead_letter_key(destination))
+                pipe.hget(self.ACKED_COUNTER_KEY, destination)
+                if destination not in self._entry_bytes:
+                    pipe.xrevrange(key, "+", "-", count=16)
+            results = iter(await pipe.execute(raise_on_error=False))
+
+            now = time.monotonic()
+            now_ms = time.time() * 1000
+            metrics: Dict[str, Dict[str, Any]] = {}
+            for destination in destinations:
+                depth, oldest, pending, scheduled, states, dead_lettered, acked = (next(results) for _ in range(7))
+                if destination not in self._entry_bytes:
+                    sample = next(results)
+                    if isinstance(sample, list) and sample:
+                        sizes = [sum(len(k) + len(v) for k, v in fields.items()) for _, fields in sample]
+                        self._entry_bytes[destination] = sum(sizes) / len(sizes)
+                depth = depth if isinstance(depth, int) else 0
+
+                histogram: Dict[str, int] = {}
+                retried = 0
+                for raw in states if isinstance(states, list) else []:
+                    retry_count = json.loads(raw).get("retry_count", 0)
+                    if retry_count:
+                        histogram[str(retry_count)] = histogram.get(str(retry_count), 0) + 1
+                        retried += 1
+                histogram["0"] = max(depth - retried, 0)
+
+                oldest_age = None
+                if isinstance(oldest, list) and oldest:
+                    oldest_ms = int(oldest[0][0].decode().split("-")[0])
+                    oldest_age = round(max(0.0, now_ms - oldest_ms) / 1000.0, 3)
+
+                acked = int(acked or 0)
+                drain_rate = net_rate = None
+                previous = self._metrics_previous.get(destination)
+                if previous and now > previous[0]:
+                    elapsed = now - previous[0]
+                    drain_rate = round((acked - previous[1]) / elapsed, 1)
+                    net_rate = round((depth - previous[2]) / elapsed, 1)
+                self._metrics_previous[destination] = (now, acked, depth)
+
+                quota = self.quota_for(destination)
+                entry_bytes = int(depth * self._entry_bytes.get(destination, 0))
+                metrics[destination] = {
+                    "depth": depth,
+                    "bytes": entry_bytes,
+                    "oldest_age_seconds": oldest_age,
+                    "in_flight": pending["pending"] if isinstance(pending, dict) else 0,
+                    "scheduled_retries": scheduled if isinstance(scheduled, int) else 0,
+                    "retry_histogram": dict(sorted(histogram.items(), key=lambda item: int(item[0]))),
+                    "dead_lettered": dead_lettered if isinstance(dead_lettered, int) else 0,
+                    "acked_total": acked,
+                    "drain_rate": drain_rate,
+                    "net_rate": net_rate,
+                    "quota": quota.as_dict(),
+                    "entries_used_pct": round(100.0 * depth / quota.max_entries, 1) if quota.max_entries else None,
+                    "bytes_used_pct": round(100.0 * entry_bytes / quota.max_bytes, 1) if quota.max_bytes else None,
+                    "quota_counters": dict(self._quota_counters.get(destination, {})),
+                }
+
+            self._metrics_cache = (now, metrics)
+            return metrics
+
+    async def acknowledge_and_remove(self, destination: str, entry_ids: List[str]) -> int:
+        """
+        Menghapus entry yang telah berhasil dikirim dari buffer berdasarkan ID-nya
+        (XACK + XDEL + HDEL state + ZREM jadwal retry), dalam satu pipeline.
+        """
+        if not entry_ids:
+            return 0
+        try:
+            key = await self._ensure_stream(destination)
+            pipe = self.redis_client.pipeline()
+            pipe.xack(key, self.group_name, *entry_ids)
+            pipe.xdel(key, *entry_ids)
+            pipe.hdel(self._state_key(destination), *entry_ids)
+            pipe.zrem(self._retry_key(destination), *entry_ids)
+            _, removed_count, _, _ = await pipe.execute()
+            if removed_count:
+                # Hanya entry yang benar-benar terhapus dihitung; ack duplikat/basi tidak menaikkan drain rate
+                await self.redis_client.hincrby(self.ACKED_COUNTER_KEY, destination, removed_count)
             logger.info(f"Acknowledged and removed {removed_count} entries for {destination}.")
             return removed_count
-            
+
         except Exception as e:
             logger.error(f"Failed to acknowledge and remove entries for destination {destination}: {e}")
             return 0
 
-    def increment_retry_count(self, destination: str, entry_id: str) -> bool:
+    async def _apply_state(self, destination: str, entry_ids: List[str], changes: Dict[str, Any],
+                           retry_increment: int = 0, stream_key: Optional[str] = None) -> List[int]:
+        """Update state entry secara atomik di Redis (UPDATE_STATE_LUA); retry_count baru per entry."""
+        if self._state_script is None:
+            self._state_script = self.redis_client.register_script(UPDATE_STATE_LUA)
+        keys = [self._state_key(destination)] + ([stream_key] if stream_key else [])
+        counts = await self._state_script(keys=keys, args=[json.dumps(changes), retry_increment, *entry_ids])
+        return [int(count) for count in counts]
+
+    async def _update_state(self, destination: str, entry_id: str, changes: Dict[str, Any]) -> bool:
+        """
+        Update state satu entry (satu field hash, ukuran konstan) secara atomik.
+        'retry_count' pada changes ditambahkan ke nilai lama, bukan ditimpa.
+        """
+        key = await self._ensure_stream(destination)
+        changes = dict(changes)
+        retry_increment = int(changes.pop("retry_count", 0))
+        changes["updated_at"] = datetime.now().isoformat()
+        counts = await self._apply_state(destination, [entry_id], changes, retry_increment, stream_key=key)
+        return counts[0] >= 0
+
+    async def increment_retry_count(self, destination: str, entry_id: str) -> bool:
         """
         Meningkatkan jumlah retry untuk sebuah entry.
-        Karena keterbatasan LPUSH/LTRIM, ini kompleks.
-        Sebagai alternatif, bisa menyimpan retry count di hash terpisah.
+        Hanya field state entry tersebut yang ditulis, bukan seluruh antrian.
         """
         try:
-            key = f"{self.BUFFER_KEY_PREFIX}{destination}"
-            
-            # Dapatkan semua entry
-            all_entries = self.redis_client.lrange(key, 0, -1)
-            if not all_entries:
-                return False
-                
-            updated_entries = []
-            entry_found = False
-            
-            # Cari dan update entry yang sesuai
-            for entry_str in all_entries:
-                try:
-                    entry_dict = json.loads(entry_str)
-                    if entry_dict.get('id') == entry_id:
-                        entry_dict['retry_count'] = entry_dict.get('retry_count', 0) + 1
-                        entry_dict['updated_at'] = datetime.now().isoformat()
-                        entry_found = True
-                    updated_entries.append(json.dumps(entry_dict))
-                except json.JSONDecodeError:
-                    updated_entries.append(entry_str)  # Pertahankan entry yang tidak valid
-            
-            if entry_found:
-                # Hapus semua entry dan tambahkan yang sudah diupdate
-                self.redis_client.delete(key)
-                if updated_entries:
-                    self.redis_client.lpush(key, *updated_entries)
+            if await self._update_state(destination, entry_id, {
+                "retry_count": 1,
+                "last_attempt_at": datetime.now().isoformat()
+            }):
                 logger.info(f"Incremented retry count for entry {entry_id}")
                 return True
-            else:
-                logger.warning(f"Entry {entry_id} not found for retry increment")
-                return False
-                
+            logger.warning(f"Entry {entry_id} not found for retry increment")
+            return False
+
         except Exception as e:
             logger.error(f"Failed to increment retry count for entry {entry_id}: {e}")
             return False
 
-    def update_entry_status(self, destination: str, entry_id: str, status: str, error_message: Optional[str] = None) -> bool:
+    async def update_entry_status(self, destination: str, entry_id: str, status: str, error_message: Optional[str] = None) -> bool:
         """
         Update status entry dalam buffer.
         """
         try:
-            key = f"{self.BUFFER_KEY_PREFIX}{destination}"
-            
-            # Dapatkan semua entry
-            all_entries = self.redis_client.lrange(key, 0, -1)
-            if not all_entries:
-                return False
-                
-            updated_entries = []
-            entry_found = False
-            
-            # Cari dan update entry yang sesuai
-            for entry_str in all_entries:
-                try:
-                    entry_dict = json.loads(entry_str)
-                    if entry_dict.get('id') == entry_id:
-                        entry_dict['status'] = status
-                        entry_dict['updated_at'] = datetime.now().isoformat()
-                        if error_message:
-                            entry_dict['error_message'] = error_message
-                        if status == 'completed':
-                            entry_dict['completed_at'] = datetime.now().isoformat()
-                        entry_found = True
-                    updated_entries.append(json.dumps(entry_dict))
-                except json.JSONDecodeError:
-                    updated_entries.append(entry_str)
-            
-            if entry_found:
-                # Hapus semua entry dan tambahkan yang sudah diupdate
-                self.redis_client.delete(key)
-                if updated_entries:
-                    self.redis_client.lpush(key, *updated_entries)
+            changes = {"status": status}
+            if error_message:
+                changes["error_message"] = error_message
+            if status == 'completed':
+                changes["completed_at"] = datetime.now().isoformat()
+
+            if await self._update_state(destination, entry_id, changes):
                 logger.info(f"Updated status for entry {entry_id} to {status}")
                 return True
-            else:
-                logger.warning(f"Entry {entry_id} not found for status update")
-                return False
-                
+            logger.warning(f"Entry {entry_id} not found for status update")
+            return False
+
         except Exception as e:
             logger.error(f"Failed to update entry status for {entry_id}: {e}")
             return False
 
-    def is_destination_buffer_empty(self, destination: str) -> bool:
+    async def increment_retry_counts(self, destination: str, entry_ids: List[str],
+                                     error_message: Optional[str] = None) -> Dict[str, int]:
+        """
+        Versi batch increment_retry_count untuk entry yang sedang dipegang forwarder:
+        satu panggilan script atomik untuk semua entry. Mengembalikan retry_count baru per entry.
+        """
+        if not entry_ids:
+            return {}
+        now = datetime.now().isoformat()
+        changes = {"last_attempt_at": now, "updated_at": now}
+        if error_message:
+            changes["error_message"] = error_message
+        counts = await self._apply_state(destination, entry_ids, changes, retry_increment=1)
+        return dict(zip(entry_ids, counts))
+
+    async def schedule_retries(self, destination: str, entries: List[dict],
+                               error_message: Optional[str] = None) -> Dict[str, int]:
+        """
+        Mencatat percobaan gagal untuk entry yang dipegang forwarder. Entry yang retry-nya
+        belum habis dijadwalkan ulang di sorted set dengan backoff eksponensial + jitter
+        dan dilepas dari daftar pending consumer group (XACK, tetap ada di stream);
+        entry yang melebihi max_retries dipindah ke dead-letter.
+        """
+        if not entries:
+            return {"scheduled": 0, "dead_lettered": 0}
+        key = await self._ensure_stream(destination)
+        retry_counts = await self.increment_retry_counts(destination, [e["id"] for e in entries], error_message)
+
+        now_ms = int(time.time() * 1000)
+        schedule: Dict[str, int] = {}
+        exhausted: List[dict] = []
+        for entry in entries:
+            entry["retry_count"] = retry_counts[entry["id"]]
+            if entry["retry_count"] > int(entry.get("max_retries", 3)):
+                exhausted.append(entry)
+            else:
+                schedule[entry["id"]] = now_ms + retry_delay_ms(entry["retry_count"])
+
+        if schedule:
+            pipe = self.redis_client.pipeline()
+            pipe.zadd(self._retry_key(destination), schedule)
+            pipe.xack(key, self.group_name, *schedule)
+            await pipe.execute()
+        if exhausted:
+            await self.dead_letter(destination, exhausted, error_message)
+        return {"scheduled": len(schedule), "dead_lettered": len(exhausted)}
+
+    async def lease_due_retries(self, destination: str, count: int = 10,
+                                lease_ms: Optional[int] = None) -> List[dict]:
+        """
+        Mengambil entry yang jadwal retry-nya sudah jatuh tempo. Jadwalnya dimundurkan
+        sebesar lease_ms (default BUFFER_CLAIM_IDLE_MS), sehingga jika forwarder mati
+        sebelum ack, entry akan dicoba lagi setelah lease habis.
+        """
+        lease_ms = lease_ms if lease_ms is not None else config.BUFFER_CLAIM_IDLE_MS
+        key = await self._ensure_stream(destination)
+        if self._lease_script is None:
+            self._lease_script = self.redis_client.register_script(LEASE_DUE_RETRIES_LUA)
+
+        now_ms = int(time.time() * 1000)
+        entry_ids = await self._lease_script(keys=[self._retry_key(destination)], args=[now_ms, count, now_ms + lease_ms])
+        if not entry_ids:
+            return []
+
+        pipe = self.data_client.pipeline(transaction=False)
+        for entry_id in entry_ids:
+            pipe.xrange(key, entry_id, entry_id, count=1)
+        results = await pipe.execute()
+        messages = [result[0] for result in results if result]
+        missing = [entry_id for entry_id, result in zip(entry_ids, results) if not result]
+        if missing:
+            # Sudah di-ack atau dihapus di tempat lain
+            await self.redis_client.zrem(self._retry_key(destination), *missing)
+        return await self._hydrate(destination, messages)
+
+    async def dead_letter(self, destination: str, entries: List[dict], error_message: Optional[str] = None) -> int:
+        """
+        Memindahkan entry ke stream dead-letter buffer_dead:<destination> secara atomik
+        (MULTI): XADD ke dead-letter, lalu XACK/XDEL dari stream utama beserta state dan jadwal retry-nya.
+        Entry yang tidak bisa di-decode membawa raw_fields (field stream asli, base64 dalam JSON).
+        """
+        if not entries:
+            return 0
+        key = await self._ensure_stream(destination)
+        entry_ids = [entry["id"] for entry in entries]
+        now = datetime.now().isoformat()
+        pipe = self.redis_client.pipeline(transaction=True)
+        for entry in entries:
+            pipe.xadd(self._dead_letter_key(destination), {
+                "original_id": entry["id"],
+                "payload": entry.get("payload", ""),
+                "timestamp_queued": entry.get("timestamp_queued") or now,
+                "max_retries": entry.get("max_retries", 3),
+                "retry_count": entry.get("retry_count", 0),
+                "error_message": error_message or entry.get("error_message") or "",
+                "dead_lettered_at": now,
+                **({"raw_fields": entry["raw_fields"]} if "raw_fields" in entry else {}),
+            })
+        pipe.xack(key, self.group_name, *entry_ids)
+        pipe.xdel(key, *entry_ids)
+        pipe.hdel(self._state_key(destination), *entry_ids)
+        pipe.zrem(self._retry_key(destination), *entry_ids)
+        await pipe.execute()
+        logger.warning(f"Moved {len(entries)} entries for {destination} to dead-letter: {error_message or entries[0].get('error_message')}")
+        return len(entries)
+
+    async def get_dead_letters(self, destination: str, limit: int = 10) -> List[dict]:
+        """Mengambil entry dead-letter tertua untuk sebuah tujuan."""
+        messages = await self.redis_client.xrange(self._dead_letter_key(destination), "-", "+", count=limit)
+        return [{"id": entry_id, "destination": destination, **fields} for entry_id, fields in messages]
+
+    async def replay_dead_letters(self, destination: str, entry_ids: Optional[List[str]] = None,
+                                  limit: int = 100) -> int:
+        """
+        Mengembalikan entry dead-letter ke stream utama sebagai entry baru (retry_count
+        kembali 0). Tanpa entry_ids, entry tertua sebanyak limit yang diputar ulang.
+        """
+        dead_key = self._dead_letter_key(destination)
+        if entry_ids:
+            pipe = self.redis_client.pipeline(transaction=False)
+            for entry_id in entry_ids:
+                pipe.xrange(dead_key, entry_id, entry_id, count=1)
+            messages = [result[0] for result in await pipe.execute() if result]
+        else:
+            messages = await self.redis_client.xrange(dead_key, "-", "+", count=limit)
+        # Entry yang tidak bisa di-decode tidak punya payload untuk diputar ulang
+        skipped = [entry_id for entry_id, fields in messages if "raw_fields" in fields]
+        if skipped:
+            logger.warning(f"Not replaying {len(skipped)} undecodable dead-letter entries for {destination}.")
+            messages = [(entry_id, fields) for entry_id, fields in messages if "raw_fields" not in fields]
+        if not messages:
+            return 0
+
+        key = await self._ensure_stream(destination)
+        pipe = self.redis_client.pipeline(transaction=True)
+        for _, fields in messages:
+            pipe.xadd(key, self.codec.encode({
+                "payload": fields.get("payload", ""),
+                "timestamp_queued": fields.get("timestamp_queued"),
+                "max_retries": fields.get("max_retries", 3),
+            }))
+        pipe.xdel(dead_key, *[entry_id for entry_id, _ in messages])
+        await pipe.execute()
+        logger.info(f"Replayed {len(messages)} dead-letter entries for {destination}.")
+        return len(messages)
+
+    async def train_codec_dictionary(self, destination: str, sample_size: int = 1000) -> Dict[str, Any]:
+        """Melatih dictionary zstd dari entry yang sedang ada di buffer sebuah tujuan."""
+        entries = await self.get_pending_entries(destination, sample_size)
+        if not entries:
+            raise ValueError(f"No buffered entries to sample for destination {destination}")
+        dict_id = await asyncio.to_thread(self.codec.train_dictionary, entries)
+        # Dibagikan lewat Redis: worker lain harus bisa men-decode entry yang dikompres dengannya
+        pipe = self.data_client.pipeline(transaction=True)
+        pipe.hset(self.CODEC_DICT_KEY, str(dict_id), self.codec.dictionary_bytes(dict_id))
+        pipe.set(self.CODEC_LATEST_DICT_KEY, str(dict_id))
+        await pipe.execute()
+        return {"destination": destination, "dict_id": dict_id, "sample_count": len(entries)}
+
+    async def list_destinations(self) -> List[str]:
+        """Daftar tujuan yang memiliki stream buffer (SCAN, bukan KEYS)."""
+        destinations = []
+        async for key in self.redis_client.scan_iter(match=f"{self.BUFFER_KEY_PREFIX}*", count=500, _type="stream"):
+            destinations.append(key[len(self.BUFFER_KEY_PREFIX):])
+        return destinations
+
+    async def is_destination_buffer_empty(self, destination: str) -> bool:
         """Memeriksa apakah buffer untuk tujuan tertentu kosong."""
         try:
-            key = f"{self.BUFFER_KEY_PREFIX}{destination}"
-            length = self.redis_client.llen(key)
-            return length == 0
+            return await self.redis_client.xlen(await self._ensure_stream(destination)) == 0
         except Exception as e:
             logger.error(f"Failed to check buffer empty status for destination {destination}: {e}")
             return True
 
-    def get_buffer_size(self, destination: str) -> int:
-        """Mendapatkan jumlah entry dalam buffer untuk tujuan tertentu."""
+    async def get_buffer_size(self, destination: str) -> int:
+        """Mendapatkan jumlah entry dalam buffer (termasuk yang sedang dikirim) untuk tujuan tertentu."""
         try:
-            key = f"{self.BUFFER_KEY_PREFIX}{destination}"
-            return self.redis_client.llen(key)
+            return await self.redis_client.xlen(await self._ensure_stream(destination))
         except Exception as e:
             logger.error(f"Failed to get buffer size for destination {destination}: {e}")
             return 0
 
     async def close(self):
-        """Menutup koneksi Redis."""
+        """Menghentikan drain spool, menutup spool disk dan koneksi Redis."""
         try:
-            if hasattr(self, 'redis_client'):
-                await asyncio.get_event_loop().run_in_executor(
-                    None, self.redis_client.close
-                )
+            if self._spool_task:
+                self._spool_task.cancel()
+                try:
+                    await self._spool_task
+                except asyncio.CancelledError:
+                    pass
+            if self.spool:
+                await asyncio.to_thread(self.spool.close)
+            if self.redis_client:
+                await self.redis_client.aclose()
+            if self.data_client:
+                await self.data_client.aclose()
+            for pool in (self.pool, self.data_pool):
+                if pool:
+                    await pool.disconnect()
             logger.info("BufferManager Redis connection closed.")
         except Exception as e:
-            logger.error(f"Error closing Redis connection: {e}")
\ No newline at end of file
+            logger.error(f"Error closing Redis connection: {e}")
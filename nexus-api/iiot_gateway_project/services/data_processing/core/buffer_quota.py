@@ -0,0 +1,121 @@
+# core/buffer_quota.py
+import json
+import logging
+from typing import List, Dict, Any, Optional
+
+from ..config import config
+
+logger = logging.getLogger(__name__)
+
+# Kebijakan saat budget tujuan terlampaui
+POLICY_DROP_OLDEST = "drop_oldest"      # entry tertua (belum dikirim) dihapus
+POLICY_DROP_NEWEST = "drop_newest"      # entry baru yang tidak muat dibuang
+POLICY_DOWNSAMPLE = "downsample"        # pasangan entry tertua digabung (resolusi per tag jadi separuh)
+POLICY_BLOCK = "block"                  # producer menunggu forwarder, maks block_timeout
+POLICIES = (POLICY_DROP_OLDEST, POLICY_DROP_NEWEST, POLICY_DOWNSAMPLE, POLICY_BLOCK)
+
+
+class BufferQuotaExceeded(Exception):
+    """Producer dengan kebijakan block menunggu lebih lama dari block_timeout."""
+
+
+class BufferQuota:
+    """
+    Budget buffer satu tujuan: jumlah entry, byte (perkiraan ukuran stream), dan umur
+    entry tertua. Nilai 0 berarti tidak dibatasi. Kebijakan berlaku untuk budget entry
+    dan byte; entry yang melewati batas umur selalu dihapus (kedaluwarsa).
+    """
+
+    def __init__(self, max_entries: int = 0, max_bytes: int = 0, max_age_seconds: float = 0,
+                 policy: str = POLICY_DROP_OLDEST, block_timeout: float = 5.0):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown buffer quota policy: {policy}")
+        self.max_entries = int(max_entries)
+        self.max_bytes = int(max_bytes)
+        self.max_age_seconds = float(max_age_seconds)
+        self.policy = policy
+        self.block_timeout = float(block_timeout)
+
+    @property
+    def is_limited(self) -> bool:
+        return bool(self.max_entries or self.max_bytes or self.max_age_seconds)
+
+    def overflow(self, entries: int, entry_bytes: int) -> int:
+        """Jumlah entry yang harus dibebaskan agar entries/entry_bytes masuk budget."""
+        excess = 0
+        if self.max_entries and entries > self.max_entries:
+            excess = entries - self.max_entries
+        if self.max_bytes and entries and entry_bytes > self.max_bytes:
+            average = entry_bytes / entries
+            excess = max(excess, int((entry_bytes - self.max_bytes + average - 1) // average))
+        return excess
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "max_age_seconds": self.max_age_seconds,
+            "policy": self.policy,
+            "block_timeout": self.block_timeout,
+        }
+
+
+def load_quotas() -> Dict[Optional[str], BufferQuota]:
+    """
+    Membaca budget default (BUFFER_QUOTA_*) dan override per tujuan dari
+    BUFFER_QUOTA_OVERRIDES (JSON: {"<destination>": {"max_entries": ..., "policy": ...}}).
+    Key None adalah budget default.
+    """
+    default = {
+        "max_entries": config.BUFFER_QUOTA_MAX_ENTRIES,
+        "max_bytes": config.BUFFER_QUOTA_MAX_BYTES,
+        "max_age_seconds": config.BUFFER_QUOTA_MAX_AGE_SECONDS,
+        "policy": config.BUFFER_QUOTA_POLICY,
+        "block_timeout": config.BUFFER_QUOTA_BLOCK_TIMEOUT,
+    }
+    quotas: Dict[Optional[str], BufferQuota] = {None: BufferQuota(**default)}
+    if config.BUFFER_QUOTA_OVERRIDES:
+        try:
+            overrides = json.loads(config.BUFFER_QUOTA_OVERRIDES)
+            for destination, values in overrides.items():
+                quotas[destination] = BufferQuota(**{**default, **values})
+        except (TypeError, ValueError) as e:
+            logger.error(f"Invalid BUFFER_QUOTA_OVERRIDES, using default quota only: {e}")
+    return quotas
+
+
+def _points(payload: str) -> Optional[List[Dict[str, Any]]]:
+    try:
+        parsed = json.loads(payload)
+    except (TypeError, ValueError):
+        return None
+    points = [parsed] if isinstance(parsed, dict) else parsed
+    if not isinstance(points, list) or not points:
+        return None
+    for point in points:
+        if not isinstance(point, dict) or type(point.get("value")) not in (int, float):
+            return None
+    return points
+
+
+def downsample_payloads(older: str, newer: str) -> Optional[str]:
+    """
+    Menggabungkan dua payload data point menjadi satu dengan resolusi separuh: per tag_id,
+    data point yang bersebelahan (urutan asli, older lalu newer) digabung berpasangan
+    menjadi rata-ratanya, dengan field lain (termasuk timestamp) dari point yang lebih baru.
+    Point terakhir tag yang tidak punya pasangan disimpan apa adanya.
+    None jika salah satu payload bukan data point numerik.
+    """
+    older_points, newer_points = _points(older), _points(newer)
+    if older_points is None or newer_points is None:
+        return None
+    by_tag: Dict[Any, List[Dict[str, Any]]] = {}
+    for point in older_points + newer_points:
+        by_tag.setdefault(point.get("tag_id"), []).append(point)
+    merged: List[Dict[str, Any]] = []
+    for points in by_tag.values():
+        for first, second in zip(points[0::2], points[1::2]):
+            merged.append({**second, "value": (first["value"] + second["value"]) / 2})
+        if len(points) % 2:
+            merged.append(points[-1])
+    return json.dumps(merged)
@@ -0,0 +1,321 @@
+# core/columnar.py
+import re
+import time
+import logging
+import warnings
+from typing import List, Dict, Any, Optional, Tuple, Callable
+from datetime import datetime, timezone, timedelta
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Penanda untuk point yang tidak memiliki key 'id' sama sekali
+# (berbeda dengan id=None, karena jalur dict memperlakukannya berbeda).
+_MISSING = object()
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_EPOCH_NAIVE = datetime(1970, 1, 1)
+_ONE_MICROSECOND = timedelta(microseconds=1)
+
+
+def to_epoch_ns(ts: Any) -> int:
+    """Konversi timestamp (datetime, string ISO, atau angka epoch detik) ke int64 nanodetik UTC."""
+    if isinstance(ts, str):
+        ts = datetime.fromisoformat(ts)
+    if isinstance(ts, datetime):
+        if ts.tzinfo is None:
+            # Timestamp naive dianggap UTC
+            ts = ts.replace(tzinfo=timezone.utc)
+        delta = ts - _EPOCH
+        return (delta.days * 86_400 + delta.seconds) * 1_000_000_000 + delta.microseconds * 1_000
+    if isinstance(ts, (int, float)):
+        return int(ts * 1_000_000_000)
+    raise ValueError(f"Unsupported timestamp type: {type(ts)}")
+
+
+_TIME_UNITS_NS = {
+    'ms': 1_000_000,
+    's': 1_000_000_000,
+    'm': 60 * 1_000_000_000,
+    'h': 3_600 * 1_000_000_000,
+    'd': 86_400 * 1_000_000_000,
+}
+
+
+def parse_time_window(time_window: Any) -> int:
+    """Parse time_window ('500ms', '30s', '1m', '1h', '1d' atau angka detik) ke nanodetik."""
+    if isinstance(time_window, (int, float)):
+        window_ns = int(time_window * 1_000_000_000)
+    else:
+        match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*(ms|s|m|h|d)\s*", str(time_window))
+        if not match:
+            raise ValueError(f"Invalid time_window: {time_window}")
+        window_ns = int(float(match.group(1)) * _TIME_UNITS_NS[match.group(2)])
+    if window_ns <= 0:
+        raise ValueError(f"time_window must be positive: {time_window}")
+    return window_ns
+
+
+def timestamps_to_ns(timestamps: List[Any]) -> np.ndarray:
+    """
+    Konversi list timestamp ke array int64 nanodetik UTC.
+    Jalur cepat: string ISO tanpa offset di-parse oleh NumPy secara vektor, dan
+    datetime dengan timezone seragam dihitung tanpa pemeriksaan per point.
+    Selain itu (campuran tipe, string dengan offset) memakai to_epoch_ns per point.
+    """
+    n = len(timestamps)
+    if not n:
+        return np.empty(0, dtype=np.int64)
+    first = timestamps[0]
+    try:
+        if isinstance(first, str) and all(isinstance(ts, str) for ts in timestamps):
+            # Hanya jika semuanya string: NumPy membaca int di list campuran sebagai nanodetik
+            with warnings.catch_warnings():
+                # NumPy hanya memberi warning untuk offset timezone; anggap gagal dan pakai jalur lambat
+                warnings.simplefilter('error')
+                return np.array(timestamps, dtype='datetime64[ns]').astype(np.int64)
+        if isinstance(first, datetime):
+            epoch = _EPOCH if first.tzinfo is not None else _EPOCH_NAIVE
+            micros = np.fromiter(((ts - epoch) // _ONE_MICROSECOND for ts in timestamps), dtype=np.int64, count=n)
+            return micros * 1_000
+    except (TypeError, ValueError, UserWarning):
+        pass
+    return np.fromiter((to_epoch_ns(ts) for ts in timestamps), dtype=np.int64, count=n)
+
+
+def from_epoch_ns(ns: int) -> datetime:
+    """Konversi int64 nanodetik UTC kembali ke datetime (timezone-aware, presisi mikrodetik)."""
+    return _EPOCH + timedelta(microseconds=int(ns) // 1_000)
+
+
+def ns_to_datetimes(ns: np.ndarray) -> List[datetime]:
+    """Versi array dari from_epoch_ns: int64 nanodetik UTC -> list datetime timezone-aware."""
+    return [_EPOCH + timedelta(microseconds=us) for us in (ns // 1_000).tolist()]
+
+
+def iter_tag_groups(tag_codes: np.ndarray):
+    """
+    Mengelompokkan baris berdasarkan tag dalam satu pass (argsort stabil).
+    Menghasilkan (tag_code, row_indices) dengan urutan kedatangan dalam tiap tag tetap terjaga.
+    """
+    if not len(tag_codes):
+        return
+    order = np.argsort(tag_codes, kind='stable')
+    splits = np.flatnonzero(np.diff(tag_codes[order])) + 1
+    for rows in np.split(order, splits):
+        yield int(tag_codes[rows[0]]), rows
+
+
+class TagActivity:
+    """Waktu terakhir setiap tag terlihat, untuk membuang state per tag yang sudah idle."""
+
+    def __init__(self):
+        self.last_seen: Dict[str, float] = {}
+
+    def touch(self, tag_names: List[str]):
+        now = time.monotonic()
+        for tag in tag_names:
+            self.last_seen[tag] = now
+
+    def expire(self, cutoff: float) -> List[str]:
+        """Menghapus dan mengembalikan tag yang terakhir terlihat sebelum cutoff (monotonic)."""
+        expired = [tag for tag, seen in self.last_seen.items() if seen < cutoff]
+        for tag in expired:
+            del self.last_seen[tag]
+        return expired
+
+
+class ColumnarBatch:
+    """
+    Representasi kolumnar dari batch data point.
+
+    Batch dikonversi dari list of dict satu kali: value menjadi float64,
+    tag_id menjadi indeks kategorikal (int32 + daftar nama tag), dan
+    timestamp menjadi int64 nanodetik (dihitung saat pertama kali dibutuhkan).
+    Record asli disimpan agar field lain (timestamp, data_metadata, dll.)
+    dikembalikan apa adanya saat konversi balik ke dict.
+    """
+
+    def __init__(
+        self,
+        records: List[Dict],
+        values: np.ndarray,
+        ids: np.ndarray,
+        tag_codes: np.ndarray,
+        tag_names: List[str],
+        dirty: Optional[np.ndarray] = None,
+    ):
+        self.records = records
+        self.values = values
+        self.ids = ids
+        self.tag_codes = tag_codes
+        self.tag_names = tag_names
+        # Menandai baris yang value/id-nya sudah diubah oleh kernel
+        self.dirty = dirty if dirty is not None else np.zeros(len(records), dtype=bool)
+        self._timestamps_ns: Optional[np.ndarray] = None
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    @classmethod
+    def from_dicts(cls, data_points: List[Dict]) -> "ColumnarBatch":
+        """Membangun batch kolumnar dari list of data point dictionaries."""
+        n = len(data_points)
+        values = np.fromiter((dp.get('value', 0) for dp in data_points), dtype=np.float64, count=n)
+
+        ids = np.empty(n, dtype=object)
+        ids[:] = [dp.get('id', _MISSING) for dp in data_points]
+
+        tag_index: Dict[str, int] = {}
+        tag_codes = np.fromiter(
+            (tag_index.setdefault(dp.get('tag_id'), len(tag_index)) for dp in data_points),
+            dtype=np.int32,
+            count=n,
+        )
+        tag_names = list(tag_index)
+
+        return cls(list(data_points), values, ids, tag_codes, tag_names)
+
+    @property
+    def timestamps_ns(self) -> np.ndarray:
+        """Timestamp dalam int64 nanodetik UTC, di-parse sekali lalu disimpan."""
+        if self._timestamps_ns is None:
+            self._timestamps_ns = timestamps_to_ns([dp.get('timestamp') for dp in self.records])
+        return self._timestamps_ns
+
+    def to_dicts(self) -> List[Dict]:
+        """Mengonversi kembali ke list of dict. Hanya dipanggil di batas API."""
+        values = self.values.tolist()
+        result = []
+        for i, record in enumerate(self.records):
+            new_point_dict = record.copy()
+            if self.dirty[i]:
+                new_point_dict['value'] = values[i]
+                point_id = self.ids[i]
+                if point_id is not _MISSING:
+                    new_point_dict['id'] = point_id
+            result.append(new_point_dict)
+        return result
+
+
+# --- Kernel vektor ---
+# Setiap kernel menerima dan mengembalikan ColumnarBatch, dengan semantik yang
+# sama seperti method _scale/_normalize/... pada DataTransformer (jalur dict).
+
+def suffix_id(point_id: Any, suffix: str) -> str:
+    """Menambahkan suffix ke id, mengikuti perilaku `point_dict.get('id', 'point')`."""
+    return f"{'point' if point_id is _MISSING else point_id}_{suffix}"
+
+
+def scaled_id(point_id: Any) -> Optional[str]:
+    """Id hasil scaling, mengikuti perilaku `f"{point.id}_scaled" if point.id else None`."""
+    return f"{point_id}_scaled" if (point_id is not _MISSING and point_id) else None
+
+
+def _suffix_ids(ids: np.ndarray, suffix: str) -> np.ndarray:
+    out = np.empty(len(ids), dtype=object)
+    out[:] = [suffix_id(i, suffix) for i in ids]
+    return out
+
+
+def scale_coefficients(params: Dict[str, Any]) -> Optional[Tuple[float, float]]:
+    """
+    Koefisien affine (a, b) untuk scaling linier, sehingga y = a * x + b.
+    Mengembalikan None jika scaling tidak bisa dilakukan (transformasi dilewati).
+    """
+    in_min = params.get('input_min')
+    in_max = params.get('input_max')
+    out_min = params.get('output_min')
+    out_max = params.get('output_max')
+
+    if None in [in_min, in_max, out_min, out_max]:
+        logger.error("Missing parameters for scaling.")
+        return None
+
+    if in_max == in_min:
+        logger.warning("input_max equals input_min, scaling not possible.")
+        return None
+
+    scale_factor = (out_max - out_min) / (in_max - in_min)
+    return scale_factor, out_min - in_min * scale_factor
+
+
+def unit_convert_coefficients(params: Dict[str, Any]) -> Tuple[float, float]:
+    """Koefisien affine (a, b) untuk konversi unit. Tipe yang tidak dikenal menjadi identitas."""
+    conversion_type = params.get('conversion_type', 'celsius_to_fahrenheit')
+
+    if conversion_type == 'celsius_to_fahrenheit':
+        return 9 / 5, 32.0
+    elif conversion_type == 'fahrenheit_to_celsius':
+        return 5 / 9, -32 * 5 / 9
+    # Tambahkan konversi lainnya sesuai kebutuhan
+    return 1.0, 0.0
+
+
+def affine(batch: ColumnarBatch, a: float, b: float, id_steps: List[Callable[[Any], Any]]) -> ColumnarBatch:
+    """
+    Kernel affine vektor: y = a * x + b.
+    Dipakai untuk scale, unit_convert, dan gabungan keduanya; id_steps adalah
+    urutan fungsi penamaan id dari setiap transformasi yang digabung.
+    """
+    batch.values = batch.values * a + b
+
+    ids = np.empty(len(batch), dtype=object)
+    if len(id_steps) == 1:
+        step = id_steps[0]
+        ids[:] = [step(i) for i in batch.ids]
+    else:
+        ids[:] = [_apply_steps(i, id_steps) for i in batch.ids]
+    batch.ids = ids
+    batch.dirty[:] = True
+
+    logger.debug(f"Applied affine transform (a={a}, b={b}) to {len(batch)} points.")
+    return batch
+
+
+def _apply_steps(point_id: Any, id_steps: List[Callable[[Any], Any]]) -> Any:
+    for step in id_steps:
+        point_id = step(point_id)
+    return point_id
+
+
+def moving_average(batch: ColumnarBatch, window_size: int) -> ColumnarBatch:
+    """
+    Moving average vektor.
+    Jumlah window dihitung dengan penjumlahan berurutan per kolom window
+    (bukan cumsum) agar hasilnya identik dengan jalur dict dan tidak
+    menumpuk error pembulatan pada batch besar.
+    """
+    n = len(batch)
+    if n < window_size:
+        logger.warning("Not enough data points for moving average.")
+        return batch
+
+    values = batch.values
+    window_sum = values[:n - window_size + 1].copy()
+    for k in range(1, window_size):
+        window_sum += values[k:n - window_size + 1 + k]
+
+    new_values = values.copy()
+    new_values[window_size - 1:] = window_sum / window_size
+    batch.values = new_values
+
+    ids = batch.ids.copy()
+    ids[window_size - 1:] = _suffix_ids(batch.ids[window_size - 1:], "filtered")
+    batch.ids = ids
+    batch.dirty[window_size - 1:] = True
+
+    logger.debug(f"Applied moving average filter with window size {window_size}.")
+    return batch
+
+
+def filter_values(batch: ColumnarBatch, params: Dict[str, Any]) -> ColumnarBatch:
+    """Dispatch filter vektor berdasarkan filter_type."""
+    filter_type = params.get('filter_type', 'moving_average')
+    window_size = params.get('window_size', 3)
+
+    if filter_type == 'moving_average':
+        return moving_average(batch, window_size)
+    logger.warning(f"Unknown filter type: {filter_type}")
+    return batch
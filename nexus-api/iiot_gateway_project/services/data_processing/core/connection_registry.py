@@ -0,0 +1,300 @@
+# core/connection_registry.py
+import json
+import time
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import Dict, Any, Optional
+
+import asyncpg
+from influxdb_client import InfluxDBClient
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from ..models.data_processing import StorageType
+from ..config import config
+from .influx_writer import InfluxBatchWriter
+from .mongo_writer import MongoWriter
+
+logger = logging.getLogger(__name__)
+
+
+def parse_connection_string(connection_string: str) -> Dict[str, str]:
+    """Parse connection string menjadi dictionary parameter."""
+    try:
+        params = {}
+        if ';' in connection_string:
+            # Format: key1=value1;key2=value2
+            pairs = connection_string.split(';')
+            for pair in pairs:
+                if '=' in pair:
+                    key, value = pair.split('=', 1)
+                    params[key.strip()] = value.strip()
+        elif '://' in connection_string:
+            # Format URL
+            params['url'] = connection_string
+        return params
+    except Exception as e:
+        logger.error(f"Error parsing connection string: {e}")
+        return {}
+
+
+def storage_params(storage_config: Dict[str, Any]) -> Dict[str, Any]:
+    """Parameter koneksi: hasil parse connection_string, ditimpa opsi JSON di config_data."""
+    params: Dict[str, Any] = parse_connection_string(storage_config.get("connection_string") or "")
+    if storage_config.get("config_data"):
+        try:
+            params.update(json.loads(storage_config["config_data"]))
+        except (TypeError, ValueError) as e:
+            logger.warning(f"Ignoring invalid config_data for storage {storage_config.get('id')}: {e}")
+    return params
+
+
+def fingerprint(storage_config: Dict[str, Any]) -> str:
+    """Bagian StorageConfig yang menentukan koneksi; berubah -> koneksi dibuat ulang."""
+    storage_type = storage_config.get("type")
+    return json.dumps([
+        getattr(storage_type, "value", storage_type),
+        storage_config.get("connection_string"),
+        storage_config.get("config_data"),
+    ])
+
+
+class StorageConnection:
+    """Klien/pool untuk satu storage (satu StorageConfig, atau default dari env)."""
+
+    def __init__(self, name: str, storage_type: Optional[str] = None, params: Optional[Dict[str, Any]] = None,
+                 fingerprint: Optional[str] = None):
+        self.name = name
+        self.storage_type = storage_type
+        self.params = params or {}
+        self.fingerprint = fingerprint
+        self.postgres_pool = None
+        self.influxdb_client = None
+        # Satu writer batching berumur panjang per (bucket, org)
+        self.influx_writers: Dict[tuple, InfluxBatchWriter] = {}
+        self.mongodb_client = None
+        self.mongo_writer: Optional[MongoWriter] = None
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.in_use = 0
+        self.retired = False
+        self.healthy = True
+        self.last_error: Optional[str] = None
+
+    def influx_writer(self, bucket: str, org: str) -> InfluxBatchWriter:
+        writer = self.influx_writers.get((bucket, org))
+        if writer is None:
+            writer = InfluxBatchWriter(
+                self.influxdb_client, bucket, org,
+                batch_size=config.INFLUXDB_BATCH_SIZE,
+                flush_interval=config.INFLUXDB_FLUSH_INTERVAL_MS / 1000.0,
+                max_queue=config.INFLUXDB_WRITER_QUEUE_SIZE
+            )
+            self.influx_writers[(bucket, org)] = writer
+        return writer
+
+    async def ping(self):
+        """Health check ringan sesuai tipe storage; exception jika tidak sehat."""
+        if self.postgres_pool:
+            await self.postgres_pool.fetchval("SELECT 1")
+        if self.influxdb_client and not await asyncio.to_thread(self.influxdb_client.ping):
+            raise ConnectionError("InfluxDB ping failed")
+        if self.mongodb_client:
+            await self.mongodb_client.admin.command("ping")
+
+    async def close(self):
+        """Flush writer InfluxDB lalu tutup semua klien/pool."""
+        try:
+            if self.postgres_pool:
+                await self.postgres_pool.close()
+            for writer in self.influx_writers.values():
+                await writer.close()
+            self.influx_writers.clear()
+            if self.influxdb_client:
+                self.influxdb_client.close()
+            if self.mongodb_client:
+                self.mongodb_client.close()
+            logger.info(f"Closed storage connection {self.name}.")
+        except Exception as e:
+            logger.error(f"Error closing storage connection {self.name}: {e}")
+
+
+async def open_connection(config_id: str, storage_config: Dict[str, Any]) -> StorageConnection:
+    """Membuat klien/pool untuk satu StorageConfig sesuai tipenya."""
+    storage_type = StorageType(storage_config["type"])
+    params = storage_params(storage_config)
+    connection = StorageConnection(f"storage:{config_id}", storage_type.value, params, fingerprint(storage_config))
+
+    if storage_type == StorageType.POSTGRES:
+        connection.postgres_pool = await asyncpg.create_pool(
+            params.get("url") or storage_config["connection_string"],
+            min_size=int(params.get("pool_min_size", config.POSTGRES_POOL_MIN_SIZE)),
+            max_size=int(params.get("pool_max_size", config.POSTGRES_POOL_MAX_SIZE)),
+            max_inactive_connection_lifetime=config.STORAGE_REGISTRY_IDLE_SECONDS
+        )
+    elif storage_type == StorageType.INFLUXDB:
+        connection.influxdb_client = InfluxDBClient(
+            url=params.get("url") or config.INFLUXDB_URL,
+            token=params.get("token") or config.INFLUXDB_TOKEN,
+            org=params.get("org") or config.INFLUXDB_ORG
+        )
+    elif storage_type == StorageType.MONGODB:
+        connection.mongodb_client = AsyncIOMotorClient(
+            params.get("url") or config.MONGODB_URL,
+            maxPoolSize=int(params.get("max_pool_size", config.MONGODB_MAX_POOL_SIZE)),
+            serverSelectionTimeoutMS=5000
+        )
+        connection.mongo_writer = MongoWriter(
+            connection.mongodb_client,
+            params.get("database") or config.MONGODB_DB_NAME,
+            granularity=params.get("granularity") or config.MONGODB_TIMESERIES_GRANULARITY,
+            bucket_interval_seconds=int(params.get("bucket_interval_seconds", config.MONGODB_BUCKET_INTERVAL_SECONDS)),
+            w=str(params.get("write_concern", config.MONGODB_WRITE_CONCERN_W)),
+            j=bool(params.get("journal", config.MONGODB_WRITE_CONCERN_J))
+        )
+
+    try:
+        await connection.ping()
+    except Exception:
+        await connection.close()
+        raise
+    logger.info(f"Opened {storage_type.value} connection for storage config {config_id}.")
+    return connection
+
+
+class ConnectionRegistry:
+    """
+    Registry klien/pool per ID StorageConfig. Koneksi dibuat saat pertama dipakai
+    lalu di-cache; jumlahnya dibatasi (LRU yang sedang tidak dipakai dikeluarkan),
+    koneksi idle ditutup, health check berkala membuang koneksi yang rusak, dan
+    perubahan connection_string/config_data membuat koneksi baru (hot reload).
+    Koneksi lama yang masih dipakai write baru ditutup setelah write-nya selesai.
+    """
+
+    def __init__(self, max_connections: int, idle_timeout: float, health_interval: float):
+        self.max_connections = max_connections
+        self.idle_timeout = idle_timeout
+        self.health_interval = health_interval
+        self._connections: Dict[str, StorageConnection] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._maintenance_loop())
+
+    async def _get(self, storage_config: Dict[str, Any]) -> StorageConnection:
+        config_id = storage_config["id"]
+        current = fingerprint(storage_config)
+        connection = self._connections.get(config_id)
+        if connection is not None and connection.fingerprint == current and connection.healthy:
+            return connection
+
+        async with self._locks.setdefault(config_id, asyncio.Lock()):
+            connection = self._connections.get(config_id)
+            if connection is not None and connection.fingerprint == current and connection.healthy:
+                return connection
+            if connection is not None:
+                logger.info(f"Storage config {config_id} changed or unhealthy, reconnecting.")
+                await self._retire(config_id)
+            await self._make_room()
+            connection = await open_connection(config_id, storage_config)
+            self._connections[config_id] = connection
+            return connection
+
+    @asynccontextmanager
+    async def lease(self, storage_config: Dict[str, Any]):
+        """Meminjam koneksi StorageConfig selama satu write (mencegah ditutup di tengah jalan)."""
+        connection = await self._get(storage_config)
+        connection.in_use += 1
+        try:
+            yield connection
+        finally:
+            connection.in_use -= 1
+            connection.last_used = time.monotonic()
+            if connection.retired and connection.in_use == 0:
+                await connection.close()
+
+    async def _retire(self, config_id: str, expected: Optional[StorageConnection] = None):
+        """
+        Mengeluarkan koneksi dari registry dan menutupnya setelah tidak dipinjam lagi.
+        Dengan expected, hanya jika koneksi itu masih yang terdaftar (bukan pengganti
+        yang dibuka selama pemanggil menunggu).
+        """
+        if expected is not None and self._connections.get(config_id) is not expected:
+            return
+        connection = self._connections.pop(config_id, None)
+        if connection is None:
+            return
+        connection.retired = True
+        if connection.in_use == 0:
+            await connection.close()
+
+    async def _make_room(self):
+        """Mengeluarkan koneksi yang paling lama tidak dipakai jika registry penuh."""
+        while len(self._connections) >= self.max_connections:
+            idle = [(c.last_used, config_id) for config_id, c in self._connections.items() if c.in_use == 0]
+            candidates = idle or [(c.last_used, config_id) for config_id, c in self._connections.items()]
+            _, config_id = min(candidates)
+            logger.info(f"Connection registry full, evicting storage config {config_id}.")
+            await self._retire(config_id)
+
+    async def reload(self, config_id: str):
+        """Menutup koneksi StorageConfig (config diubah/dihapus); dibuat ulang saat dipakai lagi."""
+        await self._retire(config_id)
+
+    async def _maintenance_loop(self):
+        while True:
+            await asyncio.sleep(self.health_interval)
+            try:
+                await self.run_maintenance()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Connection registry maintenance failed: {e}", exc_info=True)
+
+    async def run_maintenance(self):
+        """Menutup koneksi idle dan memeriksa kesehatan koneksi lainnya (bersamaan)."""
+        now = time.monotonic()
+        for config_id, connection in list(self._connections.items()):
+            if connection.in_use == 0 and now - connection.last_used > self.idle_timeout:
+                logger.info(f"Closing idle connection for storage config {config_id}.")
+                await self._retire(config_id, connection)
+
+        async def check(config_id: str, connection: StorageConnection):
+            try:
+                await asyncio.wait_for(connection.ping(), config.STORAGE_REGISTRY_HEALTH_TIMEOUT)
+                connection.healthy = True
+                connection.last_error = None
+            except Exception as e:
+                logger.warning(f"Health check failed for storage config {config_id}: {e}")
+                connection.healthy = False
+                connection.last_error = str(e)
+                await self._retire(config_id, connection)
+
+        await asyncio.gather(*(check(config_id, c) for config_id, c in list(self._connections.items())))
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        now = time.monotonic()
+        return {
+            config_id: {
+                "type": connection.storage_type,
+                "in_use": connection.in_use,
+                "healthy": connection.healthy,
+                "last_error": connection.last_error,
+                "age_seconds": round(now - connection.created_at, 1),
+                "idle_seconds": round(now - connection.last_used, 1),
+            }
+            for config_id, connection in self._connections.items()
+        }
+
+    async def close(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for config_id in list(self._connections):
+            await self._retire(config_id)
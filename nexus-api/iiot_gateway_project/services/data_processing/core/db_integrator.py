@@ -1,44 +1,60 @@
 # core/db_integrator.py
 import logging
 import asyncio
-from typing import List, Dict, Any
-from datetime import datetime
+from contextlib import asynccontextmanager
+from typing import List, Dict, Any, Optional
+
+import numpy as np
 
 import asyncpg
-from influxdb_client import InfluxDBClient, Point, WriteOptions
-from influxdb_client.client.write_api import SYNCHRONOUS
-from pymongo import MongoClient
+from influxdb_client import InfluxDBClient
+from motor.motor_asyncio import AsyncIOMotorClient
 
 # Import dari schemas dan config
-from ..models.data_processing import DataPointResponse, StorageConfigResponse, StorageType
+from ..models.data_processing import StorageConfigResponse, StorageType
 from ..config import config
+from .columnar import ColumnarBatch, ns_to_datetimes
+from .influx_writer import to_line_protocol
+from .mongo_writer import MongoWriter
+from .connection_registry import ConnectionRegistry, StorageConnection, parse_connection_string
 
 logger = logging.getLogger(__name__)
 
 class DatabaseIntegrator:
     """
     Menangani integrasi dengan berbagai database time-series.
+    Koneksi default dibuat dari env; StorageConfig yang punya connection_string
+    memakai koneksi sendiri dari ConnectionRegistry (dibuat saat pertama dipakai).
     """
     def __init__(self):
-        self.postgres_pool = None
-        self.influxdb_client = None
-        self.mongodb_client = None
+        self.default_connection = StorageConnection("default")
+        self.registry = ConnectionRegistry(
+            config.STORAGE_REGISTRY_MAX_CONNECTIONS,
+            config.STORAGE_REGISTRY_IDLE_SECONDS,
+            config.STORAGE_REGISTRY_HEALTH_INTERVAL
+        )
         # Konfigurasi aktif bisa disimpan di memori atau DB
         self.active_configs = {}  # Dict[StorageType, StorageConfigResponse]
 
     async def initialize(self):
-        """Inisialisasi koneksi ke database."""
+        """Inisialisasi koneksi default ke database (dari env) dan maintenance registry."""
+        self.registry.start()
+        connection = self.default_connection
         try:
             # Inisialisasi PostgreSQL Pool
             if config.DATABASE_URL:
-                self.postgres_pool = await asyncpg.create_pool(config.DATABASE_URL)
+                connection.postgres_pool = await asyncpg.create_pool(
+                    config.DATABASE_URL,
+                    min_size=config.POSTGRES_POOL_MIN_SIZE,
+                    max_size=config.POSTGRES_POOL_MAX_SIZE
+                )
                 logger.info("PostgreSQL pool created.")
             else:
                 logger.warning("PostgreSQL DATABASE_URL not configured.")
 
             # Inisialisasi InfluxDB Client
             if config.INFLUXDB_URL and config.INFLUXDB_TOKEN and config.INFLUXDB_ORG:
-                self.influxdb_client = InfluxDBClient(
+                connection.influxdb_client = InfluxDBClient(
                     url=config.INFLUXDB_URL, 
                     token=config.INFLUXDB_TOKEN, 
                     org=config.INFLUXDB_ORG
@@ -49,9 +65,17 @@ class DatabaseIntegrator:
 
             # Inisialisasi MongoDB Client
             if config.MONGODB_URL:
-                self.mongodb_client = MongoClient(config.MONGODB_URL)
+                connection.mongodb_client = AsyncIOMotorClient(config.MONGODB_URL, maxPoolSize=config.MONGODB_MAX_POOL_SIZE)
                 # Test connection
-                self.mongodb_client.admin.command('ismaster')
+                await connection.mongodb_client.admin.command('ping')
+                connection.mongo_writer = MongoWriter(
+                    connection.mongodb_client,
+                    config.MONGODB_DB_NAME,
+                    granularity=config.MONGODB_TIMESERIES_GRANULARITY,
+                    bucket_interval_seconds=config.MONGODB_BUCKET_INTERVAL_SECONDS,
+                    w=config.MONGODB_WRITE_CONCERN_W,
+                    j=config.MONGODB_WRITE_CONCERN_J
+                )
                 logger.info("MongoDB client initialized.")
             else:
                 logger.warning("MongoDB MONGODB_URL not configured.")
@@ -61,152 +85,173 @@ class DatabaseIntegrator:
             raise
 
     async def write_to_postgres(self, data_points: List[Dict], config_data: Dict):
-        """Menulis data points ke PostgreSQL."""
-        if not self.postgres_pool:
+        """Menulis data points ke PostgreSQL (COPY biner, lihat write_columnar_to_postgres)."""
+        await self.write_columnar_to_postgres(ColumnarBatch.from_dicts(data_points), config_data)
+
+    async def write_columnar_to_postgres(self, batch: ColumnarBatch, config_data: Dict,
+                                         connection: Optional[StorageConnection] = None):
+        """
+        Menulis batch kolumnar ke PostgreSQL/TimescaleDB dengan COPY biner
+        (asyncpg copy_records_to_table), tanpa model Pydantic per point.
+        Batch besar dipecah per POSTGRES_COPY_CHUNK_SIZE baris dan ditulis paralel
+        lewat beberapa koneksi pool (maks POSTGRES_COPY_PARALLELISM). Setiap chunk
+        adalah transaksi sendiri, jadi kegagalan di tengah bisa menyisakan chunk
+        yang sudah masuk (at-least-once, sama seperti buffer).
+        """
+        connection = connection or self.default_connection
+        if not connection.postgres_pool:
             logger.error("PostgreSQL pool not initialized.")
             raise Exception("PostgreSQL pool not initialized.")
 
         # Asumsi tabel `ts_data` sudah dibuat:
         # CREATE TABLE ts_data (id SERIAL PRIMARY KEY, timestamp TIMESTAMPTZ NOT NULL, tag_id VARCHAR(255) NOT NULL, value DOUBLE PRECISION NOT NULL);
-        insert_query = """
-            INSERT INTO ts_data (timestamp, tag_id, value) SELECT * FROM unnest($1::timestamptz[], $2::text[], $3::double precision[])
-        """
+        table = self._option(config_data, connection, 'table') or config.POSTGRES_WRITE_TABLE
+        if not len(batch):
+            return
         try:
-            # Konversi dictionary ke DataPointResponse untuk validasi
-            validated_points = [DataPointResponse(**dp) for dp in data_points]
-            
-            timestamps = [dp.timestamp for dp in validated_points]
-            tag_ids = [dp.tag_id for dp in validated_points]
-            values = [dp.value for dp in validated_points]
-
-            async with self.postgres_pool.acquire() as conn:
-                await conn.execute(insert_query, timestamps, tag_ids, values)
-            logger.info(f"Wrote {len(data_points)} points to PostgreSQL.")
+            if None in batch.tag_names:
+                raise ValueError("Every data point needs a tag_id")
+            records = self._copy_records(batch)
+            chunk_size = config.POSTGRES_COPY_CHUNK_SIZE
+            chunks = [records[start:start + chunk_size] for start in range(0, len(records), chunk_size)]
+            semaphore = asyncio.Semaphore(config.POSTGRES_COPY_PARALLELISM)
+
+            async def copy_chunk(chunk):
+                async with semaphore, connection.postgres_pool.acquire() as conn:
+                    await conn.copy_records_to_table(table, records=chunk, columns=["timestamp", "tag_id", "value"])
+
+            await asyncio.gather(*(copy_chunk(chunk) for chunk in chunks))
+            logger.info(f"Wrote {len(records)} points to PostgreSQL in {len(chunks)} COPY chunks.")
         except Exception as e:
             logger.error(f"Error writing to PostgreSQL: {e}")
             raise
 
-    def write_to_influxdb(self, data_points: List[Dict], config_data: Dict):
-        """Menulis data points ke InfluxDB."""
-        if not self.influxdb_client:
+    @staticmethod
+    def _copy_records(batch: ColumnarBatch) -> List[tuple]:
+        """Record (timestamp, tag_id, value) untuk COPY, dibangun langsung dari kolom batch."""
+        timestamps = ns_to_datetimes(batch.timestamps_ns)
+        tag_ids = np.array(batch.tag_names, dtype=object)[batch.tag_codes].tolist()
+        return list(zip(timestamps, tag_ids, batch.values.tolist()))
+
+    async def write_to_influxdb(self, data_points: List[Dict], config_data: Dict):
+        """Menulis data points ke InfluxDB (line protocol, lihat write_columnar_to_influxdb)."""
+        await self.write_columnar_to_influxdb(ColumnarBatch.from_dicts(data_points), config_data)
+
+    async def write_columnar_to_influxdb(self, batch: ColumnarBatch, config_data: Dict,
+                                         connection: Optional[StorageConnection] = None):
+        """
+        Menulis batch kolumnar ke InfluxDB: line protocol dibangun langsung dari kolom
+        (timestamp int64 nanodetik) lalu diserahkan ke writer batching per bucket.
+        Kembali setelah flush yang memuat batch ini selesai; jika gagal, exception-nya
+        diteruskan ke pemanggil (forwarder menjadwalkan retry entry buffer).
+        """
+        connection = connection or self.default_connection
+        if not connection.influxdb_client:
             logger.error("InfluxDB client not initialized.")
             raise Exception("InfluxDB client not initialized.")
 
         try:
-            # Konversi dictionary ke DataPointResponse untuk validasi
-            validated_points = [DataPointResponse(**dp) for dp in data_points]
-            
-            write_api = self.influxdb_client.write_api(write_options=SYNCHRONOUS)
-            points = []
-            
-            for dp in validated_points:
-                point = Point("measurement")\
-                    .tag("tag_id", dp.tag_id)\
-                    .field("value", dp.value)\
-                    .time(dp.timestamp)
-                points.append(point)
-            
+            measurement = self._option(config_data, connection, 'measurement') or config.INFLUXDB_MEASUREMENT
+            lines = to_line_protocol(batch, measurement)
+
             # Ekstrak bucket dan org dari config_data atau gunakan default
-            bucket = config_data.get('bucket') or config.INFLUXDB_BUCKET
-            org = config_data.get('org') or config.INFLUXDB_ORG
-            
-            write_api.write(bucket=bucket, org=org, record=points)
-            logger.info(f"Wrote {len(points)} points to InfluxDB.")
+            bucket = self._option(config_data, connection, 'bucket') or config.INFLUXDB_BUCKET
+            org = self._option(config_data, connection, 'org') or config.INFLUXDB_ORG
+
+            await connection.influx_writer(bucket, org).write(lines)
+            logger.info(f"Wrote {len(lines)} points to InfluxDB.")
         except Exception as e:
             logger.error(f"Error writing to InfluxDB: {e}")
             raise
 
-    def write_to_mongodb(self, data_points: List[Dict], config_data: Dict):
-        """Menulis data points ke MongoDB."""
-        if not self.mongodb_client:
+    async def write_to_mongodb(self, data_points: List[Dict], config_data: Dict):
+        """Menulis data points ke MongoDB (Motor, lihat write_columnar_to_mongodb)."""
+        await self.write_columnar_to_mongodb(ColumnarBatch.from_dicts(data_points), config_data)
+
+    async def write_columnar_to_mongodb(self, batch: ColumnarBatch, config_data: Dict,
+                                        connection: Optional[StorageConnection] = None):
+        """
+        Menulis batch kolumnar ke MongoDB secara async. Mode (config_data 'mode' atau
+        MONGODB_WRITE_MODE): 'timeseries' (koleksi time-series), 'document' (koleksi biasa),
+        atau 'bucket' (satu dokumen per tag per interval). Write concern bisa dioverride
+        per storage config lewat 'write_concern' dan 'journal'.
+        """
+        connection = connection or self.default_connection
+        if not connection.mongo_writer:
             logger.error("MongoDB client not initialized.")
             raise Exception("MongoDB client not initialized.")
 
         try:
-            # Konversi dictionary ke DataPointResponse untuk validasi
-            validated_points = [DataPointResponse(**dp) for dp in data_points]
-            
-            db = self.mongodb_client[config.MONGODB_DB_NAME]
-            collection = db["ts_data"]
-            docs = [
-                {
-                    "timestamp": dp.timestamp,
-                    "tag_id": dp.tag_id,
-                    "value": dp.value,
-                    "created_at": datetime.now()
-                } 
-                for dp in validated_points
-            ]
-            result = collection.insert_many(docs)
-            logger.info(f"Wrote {len(result.inserted_ids)} points to MongoDB.")
+            mode = self._option(config_data, connection, 'mode') or config.MONGODB_WRITE_MODE
+            default_collection = config.MONGODB_BUCKET_COLLECTION if mode == "bucket" else config.MONGODB_COLLECTION
+            written = await connection.mongo_writer.write(
+                batch,
+                self._option(config_data, connection, 'collection') or default_collection,
+                mode,
+                w=config_data.get('write_concern'),
+                j=config_data.get('journal')
+            )
+            logger.info(f"Wrote {len(batch)} points to MongoDB as {written} {mode} documents.")
         except Exception as e:
             logger.error(f"Error writing to MongoDB: {e}")
             raise
 
+    @staticmethod
+    def _option(config_data: Dict, connection: StorageConnection, key: str) -> Any:
+        """Opsi write: dari storage config, lalu dari parameter koneksi (connection_string/config_data)."""
+        return config_data.get(key) or connection.params.get(key)
+
+    @asynccontextmanager
+    async def _connection(self, storage_config: Dict):
+        """
+        Koneksi untuk satu write: dari registry jika StorageConfig punya connection_string
+        sendiri (dan registry aktif), selain itu koneksi default dari env.
+        """
+        if config.STORAGE_REGISTRY_ENABLED and storage_config.get('id') and storage_config.get('connection_string'):
+            async with self.registry.lease(storage_config) as connection:
+                yield connection
+        else:
+            yield self.default_connection
+
     async def write_data(self, data_points: List[Dict], storage_config: Dict):
         """Routing tulis data berdasarkan tipe storage."""
+        await self.write_batch(ColumnarBatch.from_dicts(data_points), storage_config)
+
+    async def write_batch(self, batch: ColumnarBatch, storage_config: Dict):
+        """
+        Routing tulis batch kolumnar berdasarkan tipe storage. Batch yang sama bisa
+        ditulis ke beberapa storage tanpa konversi ulang (lihat WriteRouter).
+        """
         try:
             # Validasi storage config
             config_obj = StorageConfigResponse(**storage_config)
-            
-            if config_obj.type == StorageType.POSTGRES:
-                await self.write_to_postgres(data_points, storage_config)
-            elif config_obj.type == StorageType.INFLUXDB:
-                # InfluxDB write adalah synchronous
-                await asyncio.get_event_loop().run_in_executor(
-                    None, self.write_to_influxdb, data_points, storage_config
-                )
-            elif config_obj.type == StorageType.MONGODB:
-                # MongoDB write adalah synchronous
-                await asyncio.get_event_loop().run_in_executor(
-                    None, self.write_to_mongodb, data_points, storage_config
-                )
-            else:
-                error_msg = f"Unsupported storage type: {config_obj.type}"
-                logger.warning(error_msg)
-                raise ValueError(error_msg)
+
+            async with self._connection(storage_config) as connection:
+                if config_obj.type == StorageType.POSTGRES:
+                    await self.write_columnar_to_postgres(batch, storage_config, connection)
+                elif config_obj.type == StorageType.INFLUXDB:
+                    await self.write_columnar_to_influxdb(batch, storage_config, connection)
+                elif config_obj.type == StorageType.MONGODB:
+                    await self.write_columnar_to_mongodb(batch, storage_config, connection)
+                else:
+                    error_msg = f"Unsupported storage type: {config_obj.type}"
+                    logger.warning(error_msg)
+                    raise ValueError(error_msg)
                 
         except Exception as e:
             logger.error(f"Failed to write data to {storage_config.get('type', 'unknown')}: {e}")
-            # Di sini Anda bisa memicu buffering jika penulisan gagal
+            # Kegagalan diteruskan ke pemanggil (forwarder / WriteRouter mengalihkannya ke buffer)
             raise
 
     async def close(self):
-        """Menutup semua koneksi database."""
+        """Menutup semua koneksi database (default dan registry)."""
         try:
-            # Tutup PostgreSQL pool
-            if self.postgres_pool:
-                await self.postgres_pool.close()
-                logger.info("PostgreSQL pool closed.")
-
-            # Tutup InfluxDB client
-            if self.influxdb_client:
-                self.influxdb_client.close()
-                logger.info("InfluxDB client closed.")
-
-            # Tutup MongoDB client
-            if self.mongodb_client:
-                self.mongodb_client.close()
-                logger.info("MongoDB client closed.")
-                
+            await self.registry.close()
+            await self.default_connection.close()
+            logger.info("Database connections closed.")
         except Exception as e:
             logger.error(f"Error closing database connections: {e}")
 
     def parse_connection_string(self, connection_string: str) -> Dict[str, str]:
         """Parse connection string menjadi dictionary parameter."""
-        try:
-            params = {}
-            if ';' in connection_string:
-                # Format: key1=value1;key2=value2
-                pairs = connection_string.split(';')
-                for pair in pairs:
-                    if '=' in pair:
-                        key, value = pair.split('=', 1)
-                        params[key.strip()] = value.strip()
-            elif '://' in connection_string:
-                # Format URL
-                params['url'] = connection_string
-            return params
-        except Exception as e:
-            logger.error(f"Error parsing connection string: {e}")
-            return {}
\ No newline at end of file
+        return parse_connection_string(connection_string)
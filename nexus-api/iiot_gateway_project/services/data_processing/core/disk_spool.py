@@ -0,0 +1,277 @@
+# core/disk_spool.py
+import os
+import json
+import mmap
+import time
+import zlib
+import struct
+import logging
+import threading
+from typing import List, Dict, Any, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Header setiap record: panjang body (uint32) + CRC32 body (uint32), little-endian
+RECORD_HEADER = struct.Struct("<II")
+SEGMENT_PREFIX = "segment-"
+SEGMENT_SUFFIX = ".log"
+CURSOR_FILE = "cursor.json"
+# Byte rusak yang dilewati pembaca disalin ke file ini untuk diperiksa manual
+QUARANTINE_PREFIX = "quarantine-"
+# Body record selalu objek JSON, jadi byte pertamanya "{"
+RECORD_BODY_START = b"{"
+
+# Posisi baca pada spool: (nomor segment, offset byte di dalam segment)
+SpoolPosition = Tuple[int, int]
+
+
+def read_segment(path: str, offset: int = 0, max_records: Optional[int] = None) -> Tuple[List[bytes], int, bool]:
+    """
+    Membaca record dari satu file segment mulai dari offset, lewat mmap.
+    Mengembalikan (daftar body, offset setelah record terakhir yang valid, clean).
+    clean=False jika pembacaan berhenti karena record terpotong atau checksum salah.
+    """
+    size = os.path.getsize(path)
+    if size <= offset:
+        return [], offset, True
+
+    bodies: List[bytes] = []
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        position = offset
+        while max_records is None or len(bodies) < max_records:
+            if position == size:
+                return bodies, position, True
+            if position + RECORD_HEADER.size > size:
+                break
+            length, checksum = RECORD_HEADER.unpack_from(mm, position)
+            start = position + RECORD_HEADER.size
+            end = start + length
+            if end > size:
+                break
+            body = mm[start:end]
+            if zlib.crc32(body) != checksum:
+                logger.error(f"Checksum mismatch in spool segment {path} at offset {position}")
+                break
+            bodies.append(body)
+            position = end
+        else:
+            return bodies, position, True
+    return bodies, position, False
+
+
+def find_next_record(path: str, offset: int) -> int:
+    """
+    Mencari record valid berikutnya setelah byte rusak di offset (header cocok dan CRC32
+    body benar). Hanya posisi tepat sebelum byte "{" yang diperiksa. Mengembalikan
+    offset record tersebut, atau ukuran file jika tidak ada lagi record valid.
+    """
+    size = os.path.getsize(path)
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        candidate = mm.find(RECORD_BODY_START, offset + 1 + RECORD_HEADER.size)
+        while candidate != -1:
+            position = candidate - RECORD_HEADER.size
+            length, checksum = RECORD_HEADER.unpack_from(mm, position)
+            if candidate + length <= size and zlib.crc32(mm[candidate:candidate + length]) == checksum:
+                return position
+            candidate = mm.find(RECORD_BODY_START, candidate + 1)
+    return size
+
+
+class DiskSpool:
+    """
+    Spool store-and-forward di disk lokal, satu tier di bawah Redis.
+    Berupa log segment append-only: setiap record diberi prefix panjang dan CRC32,
+    fsync dilakukan per batch (jumlah record atau interval), dan pembacaan memakai mmap.
+    Posisi baca (cursor) disimpan di cursor.json; segment yang sudah habis dibaca dihapus.
+    Ukuran backlog hanya dibatasi oleh disk, bukan RAM.
+    """
+
+    def __init__(self, directory: str, segment_bytes: int = 64 * 1024 * 1024,
+                 fsync_interval_ms: int = 100, fsync_batch: int = 256):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.fsync_interval = fsync_interval_ms / 1000.0
+        self.fsync_batch = fsync_batch
+        self._lock = threading.Lock()
+        self._file = None
+        self._active_seq = 0
+        self._active_size = 0
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+        os.makedirs(directory, exist_ok=True)
+        self._cursor: SpoolPosition = self._load_cursor()
+        self._recover()
+
+    def _segment_path(self, seq: int) -> str:
+        return os.path.join(self.directory, f"{SEGMENT_PREFIX}{seq:012d}{SEGMENT_SUFFIX}")
+
+    def _segments(self) -> List[int]:
+        return sorted(
+            int(name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)])
+            for name in os.listdir(self.directory)
+            if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX)
+        )
+
+    def _load_cursor(self) -> SpoolPosition:
+        path = os.path.join(self.directory, CURSOR_FILE)
+        try:
+            with open(path) as f:
+                cursor = json.load(f)
+            return int(cursor["segment"]), int(cursor["offset"])
+        except FileNotFoundError:
+            segments = self._segments()
+            return (segments[0] if segments else 0), 0
+        except (ValueError, KeyError) as e:
+            logger.error(f"Invalid spool cursor file, restarting from first segment: {e}")
+            segments = self._segments()
+            return (segments[0] if segments else 0), 0
+
+    def _recover(self):
+        """
+        Membuka segment terakhir untuk append. Ekor yang terpotong (crash saat menulis)
+        dipangkas agar record berikutnya tetap bisa dibaca.
+        """
+        segments = self._segments()
+        seq = segments[-1] if segments else self._cursor[0]
+        path = self._segment_path(seq)
+        if os.path.exists(path):
+            _, valid_end, clean = read_segment(path)
+            if not clean:
+                logger.warning(f"Truncating torn tail of spool segment {path} at offset {valid_end}")
+                with open(path, "r+b") as f:
+                    f.truncate(valid_end)
+        self._open_segment(seq)
+
+    def _open_segment(self, seq: int):
+        if self._file is not None:
+            self._sync_locked()
+            self._file.close()
+        self._active_seq = seq
+        self._file = open(self._segment_path(seq), "ab")
+        self._active_size = self._file.tell()
+
+    def _sync_locked(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def append_many(self, records: List[Dict[str, Any]]) -> List[SpoolPosition]:
+        """
+        Menulis record ke segment aktif. fsync dilakukan setiap fsync_batch record
+        atau setelah fsync_interval; sync() memaksa fsync. Mengembalikan posisi tiap record.
+        """
+        positions: List[SpoolPosition] = []
+        with self._lock:
+            for record in records:
+                body = json.dumps(record, separators=(",", ":")).encode()
+                if self._active_size and self._active_size + RECORD_HEADER.size + len(body) > self.segment_bytes:
+                    self._open_segment(self._active_seq + 1)
+                positions.append((self._active_seq, self._active_size))
+                self._file.write(RECORD_HEADER.pack(len(body), zlib.crc32(body)))
+                self._file.write(body)
+                self._active_size += RECORD_HEADER.size + len(body)
+                self._unsynced += 1
+
+            if self._unsynced >= self.fsync_batch or time.monotonic() - self._last_sync >= self.fsync_interval:
+                self._sync_locked()
+        return positions
+
+    def sync(self):
+        """Memaksa fsync record yang belum tersinkron."""
+        with self._lock:
+            if self._unsynced:
+                self._sync_locked()
+
+    def read_batch(self, max_records: int = 1000) -> Tuple[List[Dict[str, Any]], SpoolPosition]:
+        """
+        Membaca hingga max_records record mulai dari cursor, tanpa memajukan cursor.
+        Panggil commit(position) setelah record berhasil diteruskan. Byte rusak
+        (checksum salah atau record terpotong) di-quarantine dan dilewati.
+        """
+        with self._lock:
+            self._file.flush()
+            seq, offset = self._cursor
+            records: List[Dict[str, Any]] = []
+            while len(records) < max_records and seq <= self._active_seq:
+                path = self._segment_path(seq)
+                if os.path.exists(path):
+                    bodies, offset, clean = read_segment(path, offset, max_records - len(records))
+                    records.extend(json.loads(body) for body in bodies)
+                    if len(records) >= max_records:
+                        break
+                    if not clean:
+                        # Lanjut membaca dari record valid berikutnya di segment yang sama
+                        offset = self._quarantine(seq, offset)
+                        continue
+                if seq == self._active_seq:
+                    break
+                seq, offset = seq + 1, 0
+            return records, (seq, offset)
+
+    def _quarantine(self, seq: int, offset: int) -> int:
+        """
+        Menyalin byte rusak mulai dari offset sampai record valid berikutnya ke file
+        quarantine, lalu mengembalikan offset record tersebut. Tanpa ini cursor tertahan
+        di record rusak selamanya dan spool tidak pernah kosong lagi.
+        """
+        path = self._segment_path(seq)
+        resume = find_next_record(path, offset)
+        quarantine_path = os.path.join(self.directory, f"{QUARANTINE_PREFIX}{seq:012d}-{offset:012d}.bin")
+        with open(path, "rb") as src, open(quarantine_path, "wb") as dst:
+            src.seek(offset)
+            dst.write(src.read(resume - offset))
+        logger.error(
+            f"Corrupt record in spool segment {path} at offset {offset}; "
+            f"quarantined {resume - offset} bytes to {quarantine_path}, resuming at offset {resume}"
+        )
+        return resume
+
+    def commit(self, position: SpoolPosition):
+        """Memajukan cursor ke position dan menghapus segment yang sudah habis dibaca."""
+        with self._lock:
+            self._cursor = position
+            cursor_path = os.path.join(self.directory, CURSOR_FILE)
+            tmp_path = f"{cursor_path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump({"segment": position[0], "offset": position[1]}, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, cursor_path)
+
+            for seq in self._segments():
+                if seq < position[0]:
+                    os.remove(self._segment_path(seq))
+
+    def pending_bytes(self) -> int:
+        """Jumlah byte record yang belum diteruskan."""
+        with self._lock:
+            seq, offset = self._cursor
+            total = 0
+            for segment in self._segments():
+                if segment < seq:
+                    continue
+                size = self._active_size if segment == self._active_seq else os.path.getsize(self._segment_path(segment))
+                total += size - (offset if segment == seq else 0)
+            return max(total, 0)
+
+    def is_empty(self) -> bool:
+        """Cek O(1): cursor sudah sampai di akhir segment aktif."""
+        with self._lock:
+            return self._cursor == (self._active_seq, self._active_size)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "directory": self.directory,
+            "segments": len(self._segments()),
+            "pending_bytes": self.pending_bytes(),
+            "cursor": {"segment": self._cursor[0], "offset": self._cursor[1]},
+        }
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._sync_locked()
+                self._file.close()
+                self._file = None
@@ -0,0 +1,231 @@
+# core/forwarder.py
+import json
+import time
+import asyncio
+import logging
+from typing import List, Dict, Any, Optional, Callable, Tuple
+
+from .buffer_manager import BufferManager
+from .db_integrator import DatabaseIntegrator
+from ..config import config
+
+logger = logging.getLogger(__name__)
+
+
+class AdaptiveBatchSize:
+    """
+    Ukuran batch yang menyesuaikan diri dengan latency tulis yang teramati.
+    Latency jauh di bawah target -> batch diperbesar; di atas target -> diperkecil
+    secara proporsional; tulis gagal -> dibagi dua.
+    """
+
+    def __init__(self, initial: int, minimum: int, maximum: int, target_latency: float):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.target_latency = target_latency
+        self.size = max(minimum, min(initial, maximum))
+
+    def record(self, latency: float, success: bool) -> int:
+        if not success:
+            self.size = max(self.minimum, self.size // 2)
+        elif latency > self.target_latency:
+            self.size = max(self.minimum, int(self.size * self.target_latency / latency))
+        elif latency < self.target_latency / 2:
+            self.size = min(self.maximum, self.size * 2)
+        return self.size
+
+
+def merge_payloads(entries: List[dict]) -> Tuple[List[Dict[str, Any]], List[str], List[Tuple[str, str]]]:
+    """
+    Menggabungkan payload beberapa entry buffer menjadi satu list data point.
+    Payload berupa JSON satu data point atau list data point.
+    Mengembalikan (data_points, id entry yang valid, [(id entry, error)] yang tidak valid).
+    """
+    data_points: List[Dict[str, Any]] = []
+    valid_ids: List[str] = []
+    invalid: List[Tuple[str, str]] = []
+    for entry in entries:
+        try:
+            payload = json.loads(entry["payload"])
+        except (TypeError, ValueError) as e:
+            invalid.append((entry["id"], f"Invalid payload: {e}"))
+            continue
+        if isinstance(payload, dict):
+            data_points.append(payload)
+        elif isinstance(payload, list):
+            data_points.extend(payload)
+        else:
+            invalid.append((entry["id"], f"Unsupported payload type: {type(payload).__name__}"))
+            continue
+        valid_ids.append(entry["id"])
+    return data_points, valid_ids, invalid
+
+
+class DestinationStats:
+    def __init__(self, batch_size: int):
+        self.batch_size = batch_size
+        self.forwarded_entries = 0
+        self.forwarded_points = 0
+        self.failed_batches = 0
+        self.dead_lettered = 0
+        self.last_latency_ms: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.started_at = time.monotonic()
+
+    def as_dict(self) -> Dict[str, Any]:
+        elapsed = time.monotonic() - self.started_at
+        return {
+            "batch_size": self.batch_size,
+            "forwarded_entries": self.forwarded_entries,
+            "forwarded_points": self.forwarded_points,
+            "failed_batches": self.failed_batches,
+            "dead_lettered": self.dead_lettered,
+            "last_latency_ms": self.last_latency_ms,
+            "last_error": self.last_error,
+            "entries_per_second": round(self.forwarded_entries / elapsed, 1) if elapsed > 0 else 0.0,
+        }
+
+
+class BufferForwarder:
+    """
+    Meneruskan isi buffer ke storage tujuannya. Satu task per tujuan membaca batch
+    entry (retry yang jatuh tempo, entry macet via XCLAIM, lalu entry baru via XREADGROUP), menggabungkan payload-nya
+    menjadi satu bulk write lewat DatabaseIntegrator.write_data, lalu meng-ack entry
+    jika berhasil. Ukuran batch adaptif per tujuan; jumlah write yang berjalan
+    bersamaan dibatasi oleh satu semaphore.
+    Nama tujuan buffer adalah ID StorageConfig; resolve_config memetakan ID ke konfigurasinya.
+    """
+
+    def __init__(self, buffer_manager: BufferManager, db_integrator: DatabaseIntegrator,
+                 resolve_config: Callable[[str], Optional[Dict[str, Any]]]):
+        self.buffer_manager = buffer_manager
+        self.db_integrator = db_integrator
+        self.resolve_config = resolve_config
+        self._semaphore = asyncio.Semaphore(config.FORWARDER_MAX_CONCURRENCY)
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._sizers: Dict[str, AdaptiveBatchSize] = {}
+        self._stats: Dict[str, DestinationStats] = {}
+        self._discovery_task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        """Memulai task discovery yang menjalankan forwarder untuk setiap tujuan buffer."""
+        if self._discovery_task is None:
+            self._discovery_task = asyncio.create_task(self._discovery_loop())
+            logger.info("Buffer forwarder started.")
+
+    async def stop(self):
+        tasks = list(self._tasks.values())
+        if self._discovery_task:
+            tasks.append(self._discovery_task)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks.clear()
+        self._discovery_task = None
+        logger.info("Buffer forwarder stopped.")
+
+    def ensure_destination(self, destination: str):
+        """Memulai forwarder untuk tujuan jika belum berjalan."""
+        task = self._tasks.get(destination)
+        if task is None or task.done():
+            self._sizers.setdefault(destination, AdaptiveBatchSize(
+                config.FORWARDER_INITIAL_BATCH,
+                config.FORWARDER_MIN_BATCH,
+                config.FORWARDER_MAX_BATCH,
+                config.FORWARDER_TARGET_LATENCY_MS / 1000.0
+            ))
+            self._stats.setdefault(destination, DestinationStats(self._sizers[destination].size))
+            self._tasks[destination] = asyncio.create_task(self._run_destination(destination))
+            logger.info(f"Started buffer forwarder for destination {destination}.")
+
+    async def _discovery_loop(self):
+        while True:
+            try:
+                for destination in await self.buffer_manager.list_destinations():
+                    self.ensure_destination(destination)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Buffer destination discovery failed: {e}")
+            await asyncio.sleep(config.FORWARDER_DISCOVERY_INTERVAL)
+
+    async def _next_batch(self, destination: str, batch_size: int) -> List[dict]:
+        # Retry yang jatuh tempo dan entry yang macet di consumer lain (forwarder mati) didahulukan
+        entries = await self.buffer_manager.lease_due_retries(destination, count=batch_size)
+        if len(entries) < batch_size:
+            entries += await self.buffer_manager.claim_stale_entries(destination, count=batch_size - len(entries))
+        if len(entries) < batch_size:
+            entries += await self.buffer_manager.read_entries(destination, count=batch_size - len(entries))
+        return entries
+
+    async def _run_destination(self, destination: str):
+        sizer = self._sizers[destination]
+        stats = self._stats[destination]
+        while True:
+            try:
+                storage_config = self.resolve_config(destination)
+                if not storage_config or not storage_config.get("is_active", True):
+                    await asyncio.sleep(config.FORWARDER_DISCOVERY_INTERVAL)
+                    continue
+
+                entries = await self._next_batch(destination, sizer.size)
+                if not entries:
+                    await asyncio.sleep(config.FORWARDER_IDLE_INTERVAL)
+                    continue
+
+                async with self._semaphore:
+                    success = await self.forward_batch(destination, entries, storage_config)
+                if not success:
+                    await asyncio.sleep(config.FORWARDER_IDLE_INTERVAL)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                stats.last_error = str(e)
+                logger.error(f"Buffer forwarder for {destination} failed: {e}", exc_info=True)
+                await asyncio.sleep(config.FORWARDER_IDLE_INTERVAL)
+
+    async def forward_batch(self, destination: str, entries: List[dict], storage_config: Dict[str, Any]) -> bool:
+        """Satu bulk write untuk sekumpulan entry. Mengembalikan True jika berhasil."""
+        sizer = self._sizers[destination]
+        stats = self._stats[destination]
+
+        data_points, valid_ids, invalid = merge_payloads(entries)
+        entries_by_id = {entry["id"]: entry for entry in entries}
+        for entry_id, error in invalid:
+            # Payload rusak tidak akan berhasil di-retry: langsung ke dead-letter
+            logger.error(f"Entry {entry_id} for {destination} cannot be forwarded: {error}")
+            stats.dead_lettered += await self.buffer_manager.dead_letter(destination, [entries_by_id[entry_id]], error)
+        if not valid_ids:
+            return True
+
+        start = time.perf_counter()
+        try:
+            await self.db_integrator.write_data(data_points, storage_config)
+        except Exception as e:
+            latency = time.perf_counter() - start
+            stats.batch_size = sizer.record(latency, False)
+            stats.failed_batches += 1
+            stats.last_error = str(e)
+            result = await self.buffer_manager.schedule_retries(
+                destination, [entries_by_id[entry_id] for entry_id in valid_ids], str(e)
+            )
+            stats.dead_lettered += result["dead_lettered"]
+            logger.warning(f"Forwarding {len(valid_ids)} entries to {destination} failed: {e}")
+            return False
+
+        latency = time.perf_counter() - start
+        await self.buffer_manager.acknowledge_and_remove(destination, valid_ids)
+        stats.batch_size = sizer.record(latency, True)
+        stats.forwarded_entries += len(valid_ids)
+        stats.forwarded_points += len(data_points)
+        stats.last_latency_ms = round(latency * 1000, 3)
+        logger.debug(f"Forwarded {len(valid_ids)} entries ({len(data_points)} points) to {destination} "
+                     f"in {stats.last_latency_ms} ms, next batch size {sizer.size}.")
+        return True
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            destination: {**stats.as_dict(), "running": not self._tasks[destination].done()}
+            for destination, stats in self._stats.items()
+            if destination in self._tasks
+        }
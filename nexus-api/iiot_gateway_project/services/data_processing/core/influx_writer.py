@@ -0,0 +1,140 @@
+# core/influx_writer.py
+import time
+import asyncio
+import logging
+from typing import List, Optional, Tuple
+
+import numpy as np
+from influxdb_client import InfluxDBClient, WritePrecision
+from influxdb_client.client.write_api import SYNCHRONOUS
+
+from .columnar import ColumnarBatch
+
+logger = logging.getLogger(__name__)
+
+
+def _escape_measurement(value: str) -> str:
+    """Escape nama measurement sesuai line protocol (koma dan spasi)."""
+    return value.replace("\\", "\\\\").replace(",", "\\,").replace(" ", "\\ ")
+
+
+def _escape_tag(value: str) -> str:
+    """Escape nilai tag sesuai line protocol (koma, spasi, dan '=')."""
+    return _escape_measurement(value).replace("=", "\\=")
+
+
+def to_line_protocol(batch: ColumnarBatch, measurement: str) -> List[str]:
+    """
+    Membangun baris line protocol langsung dari kolom batch (tanpa objek Point):
+    prefix '<measurement>,tag_id=<tag> value=' di-escape sekali per tag, timestamp
+    int64 nanodetik. Nilai NaN/inf dilewati karena tidak valid di InfluxDB.
+    """
+    if None in batch.tag_names:
+        raise ValueError("Every data point needs a tag_id")
+    measurement = _escape_measurement(measurement)
+    prefixes = [f"{measurement},tag_id={_escape_tag(str(tag))} value=" for tag in batch.tag_names]
+    finite = np.isfinite(batch.values)
+    if not finite.all():
+        logger.warning(f"Skipping {int((~finite).sum())} non-finite values for InfluxDB.")
+    codes = batch.tag_codes[finite].tolist()
+    values = batch.values[finite].tolist()
+    timestamps = batch.timestamps_ns[finite].tolist()
+    return [f"{prefixes[c]}{v!r} {t}" for c, v, t in zip(codes, values, timestamps)]
+
+
+class InfluxBatchWriter:
+    """
+    Writer InfluxDB berumur panjang untuk satu bucket. Pemanggil menyerahkan baris
+    line protocol ke antrian terbatas lalu menunggu future-nya; task flush
+    menggabungkan baris dari banyak pemanggil dan menulis sekali per batch_size baris
+    atau per flush_interval, lewat satu write_api SYNCHRONOUS di thread.
+    Jika write gagal, semua pemanggil di flush itu menerima exception-nya
+    (forwarder lalu menjadwalkan retry entry buffer-nya).
+    """
+
+    def __init__(self, client: InfluxDBClient, bucket: str, org: str,
+                 batch_size: int = 5000, flush_interval: float = 0.1, max_queue: int = 100):
+        self.bucket = bucket
+        self.org = org
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._write_api = client.write_api(write_options=SYNCHRONOUS)
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self._task: Optional[asyncio.Task] = None
+        self.written_lines = 0
+        self.failed_flushes = 0
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._flush_loop())
+
+    async def write(self, lines: List[str]):
+        """Menyerahkan baris ke writer dan menunggu sampai flush yang memuatnya selesai."""
+        if not lines:
+            return
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((lines, future))
+        await future
+
+    async def _collect(self) -> List[Tuple[List[str], asyncio.Future]]:
+        """Mengambil item dari antrian sampai batch_size baris atau flush_interval habis."""
+        items = [await self._queue.get()]
+        count = len(items[0][0])
+        deadline = time.monotonic() + self.flush_interval
+        while count < self.batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(self._queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            items.append(item)
+            count += len(item[0])
+        return items
+
+    async def _flush_loop(self):
+        while True:
+            items = await self._collect()
+            # Baris milik pemanggil yang sudah batal (mis. timeout di WriteRouter) sebelum
+            # flush dimulai tidak ditulis: pemanggil itu sudah mengalihkannya ke buffer
+            lines = [line for item_lines, future in items if not future.cancelled() for line in item_lines]
+            try:
+                if lines:
+                    await asyncio.to_thread(
+                        self._write_api.write, bucket=self.bucket, org=self.org,
+                        record="\n".join(lines), write_precision=WritePrecision.NS
+                    )
+                    self.written_lines += len(lines)
+                for _, future in items:
+                    if not future.done():
+                        future.set_result(None)
+                logger.debug(f"Flushed {len(lines)} lines to InfluxDB bucket {self.bucket}.")
+            except asyncio.CancelledError:
+                for _, future in items:
+                    if not future.done():
+                        future.cancel()
+                raise
+            except Exception as e:
+                self.failed_flushes += 1
+                logger.error(f"InfluxDB flush of {len(lines)} lines to bucket {self.bucket} failed: {e}")
+                for _, future in items:
+                    if not future.done():
+                        future.set_exception(e)
+            finally:
+                for _ in items:
+                    self._queue.task_done()
+
+    async def close(self):
+        """Menunggu semua baris di antrian ter-flush lalu menghentikan task flush."""
+        if self._task is None:
+            return
+        await self._queue.join()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        self._write_api.close()
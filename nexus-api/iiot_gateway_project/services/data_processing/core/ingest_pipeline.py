@@ -0,0 +1,254 @@
+# core/ingest_pipeline.py
+import time
+import asyncio
+import logging
+from typing import List, Dict, Any, AsyncIterator, Awaitable, Callable, Optional
+
+from .columnar import ColumnarBatch
+from .ingest_stream import NDJSONBatchParser
+from .pipeline import CompiledPipeline
+from .rule_engine import RuleEngine
+from .alarm_manager import AlarmManager
+from .write_router import WriteRouter
+from ..config import config
+
+logger = logging.getLogger(__name__)
+
+# Urutan stage pipeline ingest
+STAGES = ("decode", "transform", "rules", "alarms", "storage")
+# Stage yang jika gagal membuat batch tidak boleh diteruskan (data belum dalam bentuk akhirnya)
+ABORTING_STAGES = ("transform",)
+
+
+class StageTimer:
+    """Akumulasi latensi satu stage (milidetik)."""
+    __slots__ = ("batches", "total_ms", "max_ms")
+
+    def __init__(self):
+        self.batches = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def record(self, elapsed_ms: float):
+        self.batches += 1
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "batches": self.batches,
+            "total_ms": round(self.total_ms, 3),
+            "avg_ms": round(self.total_ms / self.batches, 3) if self.batches else 0.0,
+            "max_ms": round(self.max_ms, 3),
+        }
+
+
+class IngestBatch:
+    """Satu batch yang melewati stage pipeline ingest, beserta hasil dan latensi per stage."""
+    __slots__ = ("index", "batch", "points", "points_out", "transitions", "alarms", "storage", "latency_ms", "errors",
+                 "failed")
+
+    def __init__(self, index: int, batch: ColumnarBatch):
+        self.index = index
+        self.batch = batch
+        self.points = len(batch)
+        self.points_out = 0
+        self.transitions: List[Any] = []
+        self.alarms: Dict[str, int] = {"raised": 0, "returned": 0}
+        self.storage: Dict[str, Dict[str, Any]] = {}
+        self.latency_ms: Dict[str, float] = {}
+        self.errors: List[str] = []
+        # Batch gagal di stage ABORTING_STAGES: stage berikutnya dilewati
+        self.failed = False
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "batch": self.index,
+            "status": "failed" if self.failed else "ok",
+            "points": self.points,
+            "points_out": self.points_out,
+            "alarms": self.alarms,
+            "storage": self.storage,
+            "latency_ms": self.latency_ms,
+            "errors": self.errors,
+        }
+
+
+class IngestPipeline:
+    """
+    Pipeline ingest per batch: decode -> transform -> rules -> alarms -> storage.
+    Setiap stage berjalan sebagai task sendiri yang dihubungkan antrean asyncio berukuran
+    queue_size, sehingga batch berikutnya sudah di-decode, di-transform, dan dievaluasi
+    selagi batch sebelumnya ditulis, dan stage yang lambat menahan pembacaan input
+    (back-pressure). Batch di-parse sekali menjadi ColumnarBatch yang dipakai semua stage;
+    serialisasi ulang hanya terjadi jika storage dialihkan ke buffer. Satu task per stage
+    menjaga urutan batch, yang diperlukan state machine alarm dan operator streaming.
+    Error di satu stage dicatat pada batch tersebut. Jika transform gagal, batch ditandai
+    gagal dan rules, alarms, serta storage dilewati (data mentah tidak boleh disimpan atau
+    memicu alarm dengan skala yang salah); error di stage setelahnya tidak menahan batch.
+    """
+
+    def __init__(self, rule_engine: RuleEngine, alarm_manager: AlarmManager, write_router: WriteRouter,
+                 queue_size: int = config.INGEST_QUEUE_SIZE):
+        self.rule_engine = rule_engine
+        self.alarm_manager = alarm_manager
+        self.write_router = write_router
+        self.queue_size = queue_size
+        # Latensi kumulatif semua request, untuk endpoint stats
+        self.stage_timers: Dict[str, StageTimer] = {stage: StageTimer() for stage in STAGES}
+
+    async def run(
+        self,
+        chunks: AsyncIterator[bytes],
+        plan: Optional[CompiledPipeline] = None,
+        config_ids: Optional[List[str]] = None,
+        batch_size: int = config.INGEST_BATCH_SIZE,
+        flush_each_chunk: bool = False,
+        on_batch: Optional[Callable[[Dict[str, Any]], Awaitable[None]]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Menjalankan input NDJSON (per chunk) melalui semua stage.
+        flush_each_chunk: setiap chunk diproses sebagai batch sendiri tanpa menunggu
+        batch_size (dipakai WebSocket, satu pesan = satu batch). on_batch dipanggil
+        dengan ringkasan setiap batch yang selesai. Baris melebihi batas -> ValueError.
+        """
+        parser = NDJSONBatchParser(batch_size, config.STORAGE_STREAM_MAX_LINE_BYTES,
+                                   config.STORAGE_STREAM_MAX_REPORTED_ERRORS)
+        timers = {stage: StageTimer() for stage in STAGES}
+        start = time.perf_counter()
+        totals: Dict[str, Any] = {
+            "batches": 0, "failed_batches": 0, "points": 0, "points_out": 0,
+            "alarms": {"raised": 0, "returned": 0}, "storage": {}, "errors": [],
+        }
+
+        async def transform(item: IngestBatch):
+            if plan is not None:
+                item.batch = plan.run(item.batch)
+
+        async def rules(item: IngestBatch):
+            item.transitions = self.rule_engine.evaluate_batch(item.batch)
+
+        async def alarms(item: IngestBatch):
+            if item.transitions:
+                try:
+                    item.alarms = await self.alarm_manager.apply_transitions(item.transitions)
+                except Exception:
+                    # Transisi yang tidak tersimpan dibatalkan di state machine agar terpicu lagi
+                    self.rule_engine.rollback_transitions(item.transitions)
+                    raise
+
+        async def storage(item: IngestBatch):
+            item.points_out = len(item.batch)
+            item.storage = await self.write_router.write_batch(item.batch, config_ids)
+
+        async def finish(item: IngestBatch):
+            item.batch = None
+            item.transitions = []
+            totals["batches"] += 1
+            totals["failed_batches"] += int(item.failed)
+            totals["points"] += item.points
+            totals["points_out"] += item.points_out
+            for kind, count in item.alarms.items():
+                totals["alarms"][kind] = totals["alarms"].get(kind, 0) + count
+            for config_id, result in item.storage.items():
+                statuses = totals["storage"].setdefault(config_id, {})
+                statuses[result["status"]] = statuses.get(result["status"], 0) + 1
+            room = config.STORAGE_STREAM_MAX_REPORTED_ERRORS - len(totals["errors"])
+            totals["errors"].extend(f"batch {item.index}: {e}" for e in item.errors[:max(room, 0)])
+            if on_batch is not None:
+                try:
+                    await on_batch(item.summary())
+                except Exception as e:
+                    logger.warning(f"Failed to report ingest batch {item.index}: {e}")
+
+        queues = [asyncio.Queue(maxsize=self.queue_size) for _ in STAGES[1:]]
+        work = [transform, rules, alarms, storage]
+        tasks = [
+            asyncio.create_task(self._run_stage(
+                stage, work[i], timers, queues[i],
+                queues[i + 1] if i + 1 < len(queues) else None, finish
+            ))
+            for i, stage in enumerate(STAGES[1:])
+        ]
+
+        async def put(item: Optional[IngestBatch]):
+            # Menunggu slot antrean, kecuali ada stage yang berhenti karena error tak terduga
+            putter = asyncio.ensure_future(queues[0].put(item))
+            await asyncio.wait({putter, *tasks}, return_when=asyncio.FIRST_COMPLETED)
+            if not putter.done():
+                putter.cancel()
+                for task in tasks:
+                    if task.done():
+                        task.result()
+
+        decoded = {"batches": 0, "parse_ms": 0.0}
+
+        async def decode(parse: Callable[[], List[List[Dict]]]):
+            parse_start = time.perf_counter()
+            point_batches = parse()
+            # Waktu parse chunk yang belum menghasilkan batch ikut dihitung ke batch berikutnya
+            decoded["parse_ms"] += (time.perf_counter() - parse_start) * 1000
+            for points in point_batches:
+                decode_start = time.perf_counter()
+                item = IngestBatch(decoded["batches"], ColumnarBatch.from_dicts(points))
+                elapsed_ms = decoded["parse_ms"] + (time.perf_counter() - decode_start) * 1000
+                decoded["parse_ms"] = 0.0
+                decoded["batches"] += 1
+                item.latency_ms["decode"] = round(elapsed_ms, 3)
+                self._record("decode", elapsed_ms, timers)
+                await put(item)
+
+        try:
+            async for chunk in chunks:
+                if flush_each_chunk:
+                    await decode(lambda: parser.feed(chunk) + parser.finish())
+                else:
+                    await decode(lambda: parser.feed(chunk))
+            await decode(parser.finish)
+            await put(None)
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+        return {
+            **totals,
+            "lines_read": parser.lines,
+            "rejected": parser.rejected,
+            "parse_errors": parser.errors,
+            "stages": {stage: timer.to_dict() for stage, timer in timers.items()},
+            "elapsed_seconds": round(time.perf_counter() - start, 3),
+        }
+
+    async def _run_stage(self, name: str, work: Callable[[IngestBatch], Awaitable[None]], timers: Dict[str, StageTimer],
+                         inbox: asyncio.Queue, outbox: Optional[asyncio.Queue],
+                         finish: Callable[[IngestBatch], Awaitable[None]]):
+        while True:
+            item = await inbox.get()
+            if item is None:
+                if outbox is not None:
+                    await outbox.put(None)
+                return
+            if not item.failed:
+                stage_start = time.perf_counter()
+                try:
+                    await work(item)
+                except Exception as e:
+                    logger.error(f"Ingest stage {name} failed for batch {item.index}: {e}", exc_info=True)
+                    item.errors.append(f"{name}: {e}")
+                    item.failed = name in ABORTING_STAGES
+                elapsed_ms = (time.perf_counter() - stage_start) * 1000
+                item.latency_ms[name] = round(elapsed_ms, 3)
+                self._record(name, elapsed_ms, timers)
+            if outbox is not None:
+                await outbox.put(item)
+            else:
+                await finish(item)
+
+    def _record(self, stage: str, elapsed_ms: float, timers: Dict[str, StageTimer]):
+        timers[stage].record(elapsed_ms)
+        self.stage_timers[stage].record(elapsed_ms)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {stage: timer.to_dict() for stage, timer in self.stage_timers.items()}
@@ -0,0 +1,156 @@
+# core/ingest_stream.py
+import json
+import time
+import asyncio
+import logging
+from typing import List, Dict, Any, AsyncIterator, Awaitable, Callable, Optional
+
+from .columnar import ColumnarBatch
+
+logger = logging.getLogger(__name__)
+
+
+class StreamIngestError(Exception):
+    """Write gagal di tengah stream; stats berisi progres sampai titik gagal (untuk resume backfill)."""
+
+    def __init__(self, message: str, stats: Dict[str, Any]):
+        super().__init__(message)
+        self.stats = stats
+
+
+class NDJSONBatchParser:
+    """
+    Parser NDJSON inkremental: chunk body diumpankan apa adanya (baris boleh terpotong
+    di antara chunk) dan keluar sebagai batch data point berukuran batch_size.
+    Baris yang tidak valid dilewati dan dihitung; hanya max_errors pesan pertama disimpan.
+    """
+
+    def __init__(self, batch_size: int, max_line_bytes: int, max_errors: int = 10):
+        self.batch_size = batch_size
+        self.max_line_bytes = max_line_bytes
+        self.max_errors = max_errors
+        self.lines = 0
+        self.rejected = 0
+        self.errors: List[str] = []
+        self._pending = b""
+        self._batch: List[Dict] = []
+
+    def feed(self, chunk: bytes) -> List[List[Dict]]:
+        """Memproses satu chunk; mengembalikan batch yang sudah penuh."""
+        data = self._pending + chunk if self._pending else chunk
+        lines = data.split(b"\n")
+        self._pending = lines.pop()
+        # Baris lengkap diperiksa di _parse_lines; sisa yang terpotong diperiksa di sini
+        # agar baris tanpa newline tidak menumpuk di memori
+        if len(self._pending) > self.max_line_bytes:
+            raise ValueError(f"Line {self.lines + len(lines) + 1} exceeds {self.max_line_bytes} bytes")
+        return self._parse_lines(lines)
+
+    def finish(self) -> List[List[Dict]]:
+        """Memproses sisa baris terakhir (tanpa newline) dan batch yang belum penuh."""
+        batches = self._parse_lines([self._pending]) if self._pending.strip() else []
+        self._pending = b""
+        if self._batch:
+            batches.append(self._batch)
+            self._batch = []
+        return batches
+
+    def _parse_lines(self, lines: List[bytes]) -> List[List[Dict]]:
+        batches = []
+        for line in lines:
+            self.lines += 1
+            if len(line) > self.max_line_bytes:
+                raise ValueError(f"Line {self.lines} exceeds {self.max_line_bytes} bytes")
+            if not line.strip():
+                continue
+            try:
+                self._batch.append(self._parse_point(line))
+            except (ValueError, TypeError, KeyError) as e:
+                self.rejected += 1
+                if len(self.errors) < self.max_errors:
+                    self.errors.append(f"line {self.lines}: {e}")
+                continue
+            if len(self._batch) >= self.batch_size:
+                batches.append(self._batch)
+                self._batch = []
+        return batches
+
+    @staticmethod
+    def _parse_point(line: bytes) -> Dict:
+        point = json.loads(line)
+        if not isinstance(point, dict):
+            raise ValueError("expected a JSON object")
+        if not isinstance(point["tag_id"], str):
+            raise ValueError("tag_id must be a string")
+        if not isinstance(point["timestamp"], (str, int, float)):
+            raise ValueError("timestamp must be an ISO string or epoch seconds")
+        point["value"] = float(point["value"])
+        return point
+
+
+async def stream_write(
+    chunks: AsyncIterator[bytes],
+    write: Callable[[ColumnarBatch], Awaitable[Any]],
+    batch_size: int,
+    max_pending: int,
+    max_line_bytes: int,
+    max_errors: int = 10,
+) -> Dict[str, Any]:
+    """
+    Membaca body NDJSON per chunk dan menulis setiap batch yang sudah penuh selagi
+    parsing berlanjut. Parsing dan write dihubungkan oleh antrean berukuran max_pending:
+    jika storage lebih lambat, pembacaan body ikut tertahan, jadi memori yang terpakai
+    sekitar (max_pending + 2) batch berapa pun ukuran upload-nya.
+    Baris melebihi max_line_bytes -> ValueError; write gagal -> StreamIngestError
+    (batch sebelumnya sudah tersimpan).
+    """
+    parser = NDJSONBatchParser(batch_size, max_line_bytes, max_errors)
+    queue: asyncio.Queue = asyncio.Queue(maxsize=max_pending)
+    start = time.perf_counter()
+    written = {"points": 0, "batches": 0}
+
+    def stats() -> Dict[str, Any]:
+        return {
+            "points_written": written["points"],
+            "batches_written": written["batches"],
+            "lines_read": parser.lines,
+            "rejected": parser.rejected,
+            "errors": parser.errors,
+            "elapsed_seconds": round(time.perf_counter() - start, 3),
+        }
+
+    async def consume():
+        while True:
+            points = await queue.get()
+            if points is None:
+                return
+            try:
+                await write(ColumnarBatch.from_dicts(points))
+            except Exception as e:
+                logger.error(f"Streaming ingest stopped after {written['points']} points: {e}")
+                raise StreamIngestError(str(e), stats()) from e
+            written["points"] += len(points)
+            written["batches"] += 1
+
+    consumer = asyncio.create_task(consume())
+
+    async def put(points: Optional[List[Dict]]):
+        # Menunggu slot antrean, kecuali writer sudah berhenti karena error
+        putter = asyncio.ensure_future(queue.put(points))
+        await asyncio.wait({putter, consumer}, return_when=asyncio.FIRST_COMPLETED)
+        if not putter.done():
+            putter.cancel()
+            consumer.result()
+
+    try:
+        async for chunk in chunks:
+            for points in parser.feed(chunk):
+                await put(points)
+        for points in parser.finish():
+            await put(points)
+        await put(None)
+        await consumer
+    finally:
+        if not consumer.done():
+            consumer.cancel()
+    return stats()
@@ -0,0 +1,131 @@
+# core/mongo_writer.py
+import logging
+from datetime import datetime, timezone
+from typing import List, Dict, Any, Optional
+
+import numpy as np
+from pymongo import UpdateOne
+from pymongo.errors import CollectionInvalid, OperationFailure
+from pymongo.write_concern import WriteConcern
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from .columnar import ColumnarBatch, ns_to_datetimes, from_epoch_ns
+
+logger = logging.getLogger(__name__)
+
+# Mode penulisan
+MODE_DOCUMENT = "document"        # satu dokumen per point (koleksi biasa)
+MODE_TIMESERIES = "timeseries"    # satu dokumen per point di koleksi time-series MongoDB
+MODE_BUCKET = "bucket"            # satu dokumen per tag per interval (pre-bucketing)
+MODES = (MODE_DOCUMENT, MODE_TIMESERIES, MODE_BUCKET)
+
+
+def write_concern(w: str, j: bool) -> WriteConcern:
+    """WriteConcern dari konfigurasi: w berupa angka ("0", "1", ...) atau "majority"."""
+    return WriteConcern(w=int(w) if w.isdigit() else w, j=j or None)
+
+
+def point_documents(batch: ColumnarBatch, created_at: datetime) -> List[Dict[str, Any]]:
+    """Satu dokumen per point, dibangun dari kolom batch (created_at dihitung sekali per batch)."""
+    timestamps = ns_to_datetimes(batch.timestamps_ns)
+    tag_ids = np.array(batch.tag_names, dtype=object)[batch.tag_codes].tolist()
+    return [
+        {"timestamp": ts, "tag_id": tag, "value": value, "created_at": created_at}
+        for ts, tag, value in zip(timestamps, tag_ids, batch.values.tolist())
+    ]
+
+
+def bucket_updates(batch: ColumnarBatch, interval_ns: int, created_at: datetime) -> List[UpdateOne]:
+    """
+    Mengelompokkan point per (tag_id, interval) dan menghasilkan satu upsert per bucket:
+    sampel ditambahkan dengan $push, statistik (count/sum/min/max) diperbarui di tempat.
+    Pengelompokan memakai satu lexsort, sampel di dalam bucket terurut waktu.
+    """
+    if not len(batch):
+        return []
+    timestamps_ns = batch.timestamps_ns
+    buckets = timestamps_ns // interval_ns
+    order = np.lexsort((timestamps_ns, buckets, batch.tag_codes))
+    codes, bucket_ids = batch.tag_codes[order], buckets[order]
+    splits = np.flatnonzero((np.diff(codes) != 0) | (np.diff(bucket_ids) != 0)) + 1
+    sample_times = ns_to_datetimes(timestamps_ns[order])
+    sample_values = batch.values[order].tolist()
+
+    updates = []
+    start = 0
+    for end in list(splits.tolist()) + [len(order)]:
+        values = sample_values[start:end]
+        updates.append(UpdateOne(
+            {"tag_id": batch.tag_names[int(codes[start])], "bucket_start": from_epoch_ns(int(bucket_ids[start]) * interval_ns)},
+            {
+                "$push": {"samples": {"$each": [
+                    {"t": t, "v": v} for t, v in zip(sample_times[start:end], values)
+                ]}},
+                "$inc": {"count": len(values), "sum": sum(values)},
+                "$min": {"min": min(values)},
+                "$max": {"max": max(values)},
+                "$setOnInsert": {"interval_seconds": interval_ns // 1_000_000_000, "created_at": created_at},
+                "$set": {"updated_at": created_at},
+            },
+            upsert=True
+        ))
+        start = end
+    return updates
+
+
+class MongoWriter:
+    """
+    Writer MongoDB async (Motor). Mendukung koleksi biasa, koleksi time-series
+    (dibuat otomatis dengan timeField/metaField), dan dokumen bucket per tag per
+    interval yang memangkas jumlah dokumen dan ukuran index. Semua write memakai
+    bulk unordered dengan write concern yang bisa diatur.
+    """
+
+    def __init__(self, client: AsyncIOMotorClient, db_name: str, granularity: str = "seconds",
+                 bucket_interval_seconds: int = 3600, w: str = "1", j: bool = False):
+        self.client = client
+        self.db = client[db_name]
+        self.granularity = granularity
+        self.bucket_interval_ns = int(bucket_interval_seconds * 1_000_000_000)
+        self.w = w
+        self.j = j
+        self._prepared: set = set()
+
+    async def _prepare(self, name: str, mode: str):
+        """Membuat koleksi time-series / index bucket sekali per koleksi."""
+        if (name, mode) in self._prepared:
+            return
+        if mode == MODE_TIMESERIES:
+            try:
+                await self.db.create_collection(name, timeseries={
+                    "timeField": "timestamp", "metaField": "tag_id", "granularity": self.granularity
+                })
+                logger.info(f"Created MongoDB time-series collection {name}.")
+            except (CollectionInvalid, OperationFailure) as e:
+                # Sudah ada (time-series atau koleksi biasa lama): tetap dipakai apa adanya
+                logger.debug(f"MongoDB collection {name} not created: {e}")
+        elif mode == MODE_BUCKET:
+            await self.db[name].create_index([("tag_id", 1), ("bucket_start", 1)], unique=True)
+        self._prepared.add((name, mode))
+
+    async def write(self, batch: ColumnarBatch, collection_name: str, mode: str = MODE_TIMESERIES,
+                    w: Optional[str] = None, j: Optional[bool] = None) -> int:
+        """Menulis batch; mengembalikan jumlah dokumen yang ditulis/di-upsert."""
+        if mode not in MODES:
+            raise ValueError(f"Unknown MongoDB write mode: {mode}")
+        if None in batch.tag_names:
+            raise ValueError("Every data point needs a tag_id")
+        if not len(batch):
+            return 0
+        await self._prepare(collection_name, mode)
+        concern = write_concern(str(w) if w is not None else self.w, self.j if j is None else j)
+        collection = self.db[collection_name].with_options(write_concern=concern)
+        created_at = datetime.now(timezone.utc)
+
+        if mode == MODE_BUCKET:
+            updates = bucket_updates(batch, self.bucket_interval_ns, created_at)
+            result = await collection.bulk_write(updates, ordered=False)
+            # Dengan w=0 hasil tidak di-acknowledge dan tidak punya hitungan
+            return result.upserted_count + result.modified_count if result.acknowledged else len(updates)
+        result = await collection.insert_many(point_documents(batch, created_at), ordered=False)
+        return len(result.inserted_ids)
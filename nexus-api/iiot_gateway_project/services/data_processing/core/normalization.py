@@ -0,0 +1,232 @@
+# core/normalization.py
+import logging
+import threading
+from typing import List, Dict, Any, Optional, Tuple
+
+import numpy as np
+
+from .columnar import ColumnarBatch, TagActivity, suffix_id
+
+logger = logging.getLogger(__name__)
+
+NORMALIZATION_METHODS = ('minmax', 'zscore')
+
+
+def per_tag_stats(tag_codes: np.ndarray, values: np.ndarray, n_tags: int) -> Tuple[np.ndarray, ...]:
+    """
+    Statistik per tag dalam satu pass vektor: (count, min, max, mean, m2).
+    m2 adalah jumlah kuadrat deviasi dari mean (untuk varians, algoritma Welford/Chan).
+    """
+    counts = np.bincount(tag_codes, minlength=n_tags)
+    sums = np.bincount(tag_codes, weights=values, minlength=n_tags)
+    mins = np.full(n_tags, np.inf)
+    maxs = np.full(n_tags, -np.inf)
+    np.minimum.at(mins, tag_codes, values)
+    np.maximum.at(maxs, tag_codes, values)
+    means = np.divide(sums, counts, out=np.zeros(n_tags), where=counts > 0)
+    deviations = values - means[tag_codes]
+    m2 = np.bincount(tag_codes, weights=deviations * deviations, minlength=n_tags)
+    return counts, mins, maxs, means, m2
+
+
+class TagStatsTable:
+    """
+    Tabel statistik berjalan per tag yang ringkas: satu slot per tag pada array NumPy
+    (count, min, max, mean, m2). Statistik batch baru digabung secara inkremental
+    (Chan et al.), sehingga tidak perlu memindai ulang riwayat.
+    """
+
+    def __init__(self, capacity: int = 64):
+        self._index: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._allocate(capacity)
+
+    def _allocate(self, capacity: int):
+        self.count = np.zeros(capacity, dtype=np.int64)
+        self.min = np.full(capacity, np.inf)
+        self.max = np.full(capacity, -np.inf)
+        self.mean = np.zeros(capacity)
+        self.m2 = np.zeros(capacity)
+
+    def _grow(self, needed: int):
+        capacity = len(self.count)
+        if needed <= capacity:
+            return
+        new_capacity = max(needed, capacity * 2)
+        old = (self.count, self.min, self.max, self.mean, self.m2)
+        self._allocate(new_capacity)
+        for new_array, old_array in zip((self.count, self.min, self.max, self.mean, self.m2), old):
+            new_array[:capacity] = old_array
+
+    def slots_for(self, tag_names: List[str]) -> np.ndarray:
+        """Slot tabel untuk setiap tag (dibuat jika belum ada)."""
+        for tag in tag_names:
+            if tag not in self._index:
+                self._index[tag] = len(self._index)
+        self._grow(len(self._index))
+        return np.fromiter((self._index[tag] for tag in tag_names), dtype=np.int64, count=len(tag_names))
+
+    def update(self, batch: ColumnarBatch) -> np.ndarray:
+        """Menggabungkan statistik batch ke tabel. Mengembalikan slot per tag_code batch."""
+        n_tags = len(batch.tag_names)
+        counts_b, mins_b, maxs_b, means_b, m2_b = per_tag_stats(batch.tag_codes, batch.values, n_tags)
+
+        with self._lock:
+            slots = self.slots_for(batch.tag_names)
+            present = counts_b > 0
+            slots_p = slots[present]
+            n_a = self.count[slots_p].astype(np.float64)
+            n_b = counts_b[present].astype(np.float64)
+            total = n_a + n_b
+            delta = means_b[present] - self.mean[slots_p]
+
+            self.mean[slots_p] += delta * n_b / total
+            self.m2[slots_p] += m2_b[present] + delta * delta * n_a * n_b / total
+            self.min[slots_p] = np.minimum(self.min[slots_p], mins_b[present])
+            self.max[slots_p] = np.maximum(self.max[slots_p], maxs_b[present])
+            self.count[slots_p] += counts_b[present]
+        return slots
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        """Ekspor statistik per tag (untuk disimpan atau ditampilkan)."""
+        with self._lock:
+            return {
+                tag: {
+                    'count': int(self.count[slot]),
+                    'min': float(self.min[slot]),
+                    'max': float(self.max[slot]),
+                    'mean': float(self.mean[slot]),
+                    'std': float(np.sqrt(self.m2[slot] / self.count[slot])) if self.count[slot] else 0.0,
+                }
+                for tag, slot in self._index.items()
+            }
+
+    def remove(self, tags: List[str]):
+        """Membuang statistik tag (mis. tag yang sudah lama tidak terlihat); slot dipadatkan ulang."""
+        removed = set(tags)
+        with self._lock:
+            keep = [(tag, slot) for tag, slot in self._index.items() if tag not in removed]
+            if len(keep) == len(self._index):
+                return
+            old_slots = np.fromiter((slot for _, slot in keep), dtype=np.int64, count=len(keep))
+            old = (self.count, self.min, self.max, self.mean, self.m2)
+            self._allocate(max(len(keep), 64))
+            for new_array, old_array in zip((self.count, self.min, self.max, self.mean, self.m2), old):
+                new_array[:len(keep)] = old_array[old_slots]
+            self._index = {tag: slot for slot, (tag, _) in enumerate(keep)}
+
+    def restore(self, stats: Dict[str, Dict[str, float]]):
+        """Memuat statistik dari hasil snapshot()."""
+        with self._lock:
+            slots = self.slots_for(list(stats))
+            for slot, tag_stats in zip(slots.tolist(), stats.values()):
+                count = int(tag_stats['count'])
+                self.count[slot] = count
+                self.min[slot] = tag_stats['min']
+                self.max[slot] = tag_stats['max']
+                self.mean[slot] = tag_stats['mean']
+                self.m2[slot] = (tag_stats['std'] ** 2) * count
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+
+def _apply(batch: ColumnarBatch, offset: np.ndarray, divisor: np.ndarray, method: str,
+           degenerate_value: Optional[float] = None) -> ColumnarBatch:
+    """
+    Menerapkan (x - offset) / divisor per baris. Tag dengan divisor nol
+    (semua nilai sama / std nol) dibiarkan apa adanya, kecuali degenerate_value
+    diberikan: baris tersebut diisi nilai itu agar output tidak mencampur unit asli.
+    """
+    usable = divisor > 0
+    if degenerate_value is not None:
+        new_values = np.full(len(batch), degenerate_value, dtype=np.float64)
+        new_values[usable] = (batch.values[usable] - offset[usable]) / divisor[usable]
+        usable = np.ones(len(batch), dtype=bool)
+    elif not usable.any():
+        logger.warning("All values are the same per tag, normalization not possible.")
+        return batch
+    else:
+        new_values = batch.values.copy()
+        new_values[usable] = (batch.values[usable] - offset[usable]) / divisor[usable]
+    batch.values = new_values
+
+    ids = batch.ids.copy()
+    ids[usable] = [suffix_id(i, "normalized") for i in batch.ids[usable]]
+    batch.ids = ids
+    batch.dirty |= usable
+
+    logger.debug(f"Normalized {int(usable.sum())} points per tag using {method}.")
+    return batch
+
+
+def normalize_per_tag(batch: ColumnarBatch, method: str = 'minmax',
+                      stats_table: Optional[TagStatsTable] = None, per_tag: bool = True) -> ColumnarBatch:
+    """
+    Normalisasi per tag. Tanpa stats_table statistik dihitung dari batch saja;
+    dengan stats_table statistik berjalan diperbarui dulu dengan batch ini lalu dipakai.
+    method: 'minmax' (ke range 0-1) atau 'zscore' ((x - mean) / std).
+    per_tag=False memakai satu statistik untuk seluruh batch (perilaku lama).
+    """
+    if not len(batch):
+        return batch
+    if method not in NORMALIZATION_METHODS:
+        raise ValueError(f"Unknown normalization method: {method}")
+
+    degenerate_value = None
+    if stats_table is not None:
+        # Tag yang belum punya range (baru satu nilai berbeda) -> 0.0, bukan nilai mentah,
+        # agar satu stream tidak mencampur unit asli dengan nilai ternormalisasi
+        degenerate_value = 0.0
+        slots = stats_table.update(batch)
+        rows = slots[batch.tag_codes]
+        if method == 'minmax':
+            offset = stats_table.min[rows]
+            divisor = stats_table.max[rows] - offset
+        else:
+            offset = stats_table.mean[rows]
+            divisor = np.sqrt(stats_table.m2[rows] / stats_table.count[rows])
+    else:
+        if per_tag:
+            codes, n_groups = batch.tag_codes, len(batch.tag_names)
+        else:
+            codes, n_groups = np.zeros(len(batch), dtype=np.int32), 1
+        counts, mins, maxs, means, m2 = per_tag_stats(codes, batch.values, n_groups)
+        if method == 'minmax':
+            offset = mins[codes]
+            divisor = maxs[codes] - offset
+        else:
+            offset = means[codes]
+            divisor = np.sqrt(m2 / np.maximum(counts, 1))[codes]
+
+    return _apply(batch, offset, divisor, method, degenerate_value)
+
+
+def normalize(batch: ColumnarBatch, params: Dict[str, Any]) -> ColumnarBatch:
+    """
+    Kernel untuk transformasi NORMALIZE (tanpa state).
+    Default per tag; scope='batch' mempertahankan perilaku lama (statistik global batch).
+    """
+    method = params.get('method', 'minmax')
+    return normalize_per_tag(batch, method, per_tag=params.get('scope', 'tag') != 'batch')
+
+
+class StatefulNormalizer:
+    """Operator normalisasi per tag dengan statistik berjalan yang bertahan antar batch."""
+
+    def __init__(self, method: str = 'minmax'):
+        if method not in NORMALIZATION_METHODS:
+            raise ValueError(f"Unknown normalization method: {method}")
+        self.method = method
+        self.stats = TagStatsTable()
+        self.activity = TagActivity()
+
+    def run(self, batch: ColumnarBatch) -> ColumnarBatch:
+        self.activity.touch(batch.tag_names)
+        return normalize_per_tag(batch, self.method, self.stats)
+
+    def expire_tags(self, cutoff: float) -> int:
+        expired = self.activity.expire(cutoff)
+        if expired:
+            self.stats.remove(expired)
+        return len(expired)
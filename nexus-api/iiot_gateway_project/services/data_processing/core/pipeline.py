@@ -0,0 +1,181 @@
+# core/pipeline.py
+import json
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from functools import partial
+from typing import List, Dict, Any, Optional, Callable
+
+from ..models.data_processing import TransformFunctionResponse, TransformType
+from . import columnar
+from . import streaming
+from . import aggregation
+from . import normalization
+
+logger = logging.getLogger(__name__)
+
+
+class PipelineStep:
+    """Satu langkah pada pipeline terkompilasi."""
+
+    def __init__(self, name: str, run: Callable[[columnar.ColumnarBatch], columnar.ColumnarBatch]):
+        self.name = name
+        self.run = run
+
+    def __repr__(self) -> str:
+        return f"PipelineStep({self.name})"
+
+
+class CompiledPipeline:
+    """
+    Rantai transformasi yang sudah di-parse dan di-fuse.
+    Transformasi linier yang berdampingan (scale, unit_convert) digabung
+    menjadi satu operasi affine, sehingga parsing dan dispatch hanya terjadi
+    sekali saat kompilasi, bukan per batch.
+    """
+
+    def __init__(self, key: str, steps: List[PipelineStep], source_count: int):
+        self.key = key
+        self.steps = steps
+        self.source_count = source_count
+
+    def run(self, batch: columnar.ColumnarBatch) -> columnar.ColumnarBatch:
+        for step in self.steps:
+            try:
+                batch = step.run(batch)
+            except Exception as e:
+                logger.error(f"Error applying transform {step.name}: {e}")
+                # Sama seperti jalur dict, transformasi yang error dilewati
+                continue
+        return batch
+
+
+def transform_chain_key(transforms: List[Dict]) -> str:
+    """Hash dari rantai transformasi (tipe dan parameter, sesuai urutan)."""
+    chain = [
+        {"type": str(t.get("type")), "parameters": t.get("parameters")}
+        for t in transforms
+    ]
+    encoded = json.dumps(chain, sort_keys=True, default=str).encode()
+    return hashlib.sha1(encoded).hexdigest()
+
+
+def compile_transforms(
+    transforms: List[Dict],
+    key: Optional[str] = None,
+    state_store: Optional[streaming.StreamStateStore] = None,
+) -> CompiledPipeline:
+    """
+    Mem-parse dan mem-fuse daftar transform function dictionaries menjadi CompiledPipeline.
+    Transformasi streaming (lihat core/streaming.py) diikat ke operator dari state_store
+    dengan key "<hash rantai>:<posisi>", sehingga state-nya bertahan antar batch.
+    """
+    key = key or transform_chain_key(transforms)
+    state_store = state_store if state_store is not None else streaming.StreamStateStore()
+    steps: List[PipelineStep] = []
+
+    # Akumulator untuk operasi affine yang sedang digabung
+    pending_affine: Optional[Dict[str, Any]] = None
+
+    def flush_affine():
+        nonlocal pending_affine
+        if pending_affine is not None:
+            steps.append(PipelineStep(
+                "+".join(pending_affine["names"]),
+                partial(columnar.affine, a=pending_affine["a"], b=pending_affine["b"],
+                        id_steps=pending_affine["id_steps"]),
+            ))
+            pending_affine = None
+
+    def push_affine(name: str, a: float, b: float, id_step: Callable[[Any], Any]):
+        nonlocal pending_affine
+        if pending_affine is None:
+            pending_affine = {"a": a, "b": b, "names": [name], "id_steps": [id_step]}
+        else:
+            # Komposisi: a2 * (a1 * x + b1) + b2
+            pending_affine["a"] = a * pending_affine["a"]
+            pending_affine["b"] = a * pending_affine["b"] + b
+            pending_affine["names"].append(name)
+            pending_affine["id_steps"].append(id_step)
+
+    for position, transform_dict in enumerate(transforms):
+        name = transform_dict.get('name', 'Unknown')
+        try:
+            transform = TransformFunctionResponse(**transform_dict)
+            params = transform.parameters
+
+            if streaming.is_streaming(transform.type, params):
+                flush_affine()
+                operator_key = f"{key}:{position}"
+                factory = partial(streaming.create_operator, transform.type, params)
+                # Dibuat sekali di sini untuk validasi parameter; saat run operator diambil
+                # dari state_store agar operator yang dibuang karena idle tidak tertahan di plan
+                state_store.get_or_create(operator_key, factory)
+                steps.append(PipelineStep(name, partial(state_store.run, operator_key, factory)))
+            elif transform.type == TransformType.SCALE:
+                coefficients = columnar.scale_coefficients(params)
+                if coefficients is not None:
+                    push_affine(name, *coefficients, columnar.scaled_id)
+            elif transform.type == TransformType.UNIT_CONVERT:
+                a, b = columnar.unit_convert_coefficients(params)
+                push_affine(name, a, b, partial(columnar.suffix_id, suffix="converted"))
+            elif transform.type == TransformType.NORMALIZE:
+                flush_affine()
+                steps.append(PipelineStep(name, partial(normalization.normalize, params=params)))
+            elif transform.type == TransformType.FILTER:
+                flush_affine()
+                steps.append(PipelineStep(name, partial(columnar.filter_values, params=params)))
+            elif transform.type == TransformType.AGGREGATE:
+                flush_affine()
+                steps.append(PipelineStep(name, partial(aggregation.aggregate, params=params)))
+            else:
+                logger.warning(f"Unknown transform type: {transform.type}")
+        except Exception as e:
+            logger.error(f"Error compiling transform {name}: {e}")
+            # Transformasi yang tidak valid dilewati, sama seperti saat runtime
+            continue
+
+    flush_affine()
+    logger.debug(f"Compiled {len(transforms)} transforms into {len(steps)} steps: {steps}")
+    return CompiledPipeline(key, steps, len(transforms))
+
+
+class PipelineCache:
+    """Cache LRU untuk CompiledPipeline, dengan key hash rantai transformasi."""
+
+    def __init__(self, maxsize: int = 128, state_store: Optional[streaming.StreamStateStore] = None):
+        self.maxsize = maxsize
+        self.state_store = state_store if state_store is not None else streaming.StreamStateStore()
+        self._plans: "OrderedDict[str, CompiledPipeline]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, transforms: List[Dict]) -> CompiledPipeline:
+        """Mengambil pipeline dari cache, atau mengompilasi dan menyimpannya."""
+        key = transform_chain_key(transforms)
+        with self._lock:
+            plan = self._plans.get(key)
+            if plan is not None:
+                self._plans.move_to_end(key)
+                self.hits += 1
+                return plan
+
+        plan = compile_transforms(transforms, key, self.state_store)
+        with self._lock:
+            self.misses += 1
+            self._plans[key] = plan
+            self._plans.move_to_end(key)
+            while len(self._plans) > self.maxsize:
+                evicted_key, _ = self._plans.popitem(last=False)
+                # State streaming rantai yang sudah tidak di-cache ikut dibuang
+                self.state_store.discard_chain(evicted_key)
+        return plan
+
+    def clear(self):
+        with self._lock:
+            self._plans.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {"size": len(self._plans), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,408 @@
+# core/rule_conditions.py
+# Bahasa kondisi rule alarm. Kondisi di-parse sekali menjadi AST lalu dikompilasi
+# menjadi closure yang bekerja pada array NumPy (satu grup point per tag sekaligus).
+# Tidak ada eval(): hanya konstruksi di bawah ini yang dikenali.
+#
+#   value > 80
+#   value >= 10 and value <= 20
+#   value between 10 and 20
+#   not (value == 0) or value != 5
+#   value > 80 deadband 2              -> histeresis: aktif di > 80, baru padam di <= 78
+#   rate(value, 10s) > 0.5             -> laju perubahan per detik dalam window 10 detik
+#   value - tag("TT-102") > 5          -> referensi nilai terakhir tag lain
+#   abs(value - 50) * 2 > 10
+#
+# Opsi alarm di akhir kondisi (dipakai state machine alarm, lihat alarm_states):
+#   value > 80 deadband 2 on_delay 10s off_delay 30s latch
+import re
+import logging
+from functools import lru_cache
+from typing import List, Dict, Any, Optional, Callable, Tuple, Set
+
+import numpy as np
+
+from ..config import config
+from .columnar import parse_time_window
+
+logger = logging.getLogger(__name__)
+
+_EMPTY_NS = np.empty(0, dtype=np.int64)
+_EMPTY_VALUES = np.empty(0, dtype=np.float64)
+
+_TOKEN_PATTERN = re.compile(r"""
+    \s*(?:
+        (?P<duration>\d+(?:\.\d+)?)(?P<unit>ms|s|m|h|d)(?![A-Za-z0-9_.])
+      | (?P<number>(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)(?![A-Za-z0-9_.])
+      | (?P<string>"[^"]*"|'[^']*')
+      | (?P<op><=|>=|==|!=|<|>|\(|\)|,|\+|-|\*|/)
+      | (?P<name>[A-Za-z_][A-Za-z0-9_]*)
+    )""", re.VERBOSE)
+
+_KEYWORDS = {"and", "or", "not", "between", "deadband", "on_delay", "off_delay", "latch"}
+_COMPARISONS = {
+    "<": np.less, "<=": np.less_equal, ">": np.greater,
+    ">=": np.greater_equal, "==": np.equal, "!=": np.not_equal,
+}
+_ARITHMETIC = {"+": np.add, "-": np.subtract, "*": np.multiply, "/": np.divide}
+# Node AST yang hasilnya boolean (sisanya numerik)
+_BOOLEAN_NODES = {"cmp", "between", "and", "or", "not"}
+
+
+class ConditionError(ValueError):
+    """Kondisi rule tidak valid."""
+
+
+class EvaluationContext:
+    """
+    Data yang dibaca kondisi saat evaluasi satu grup point (satu tag):
+    value (array), timestamp nanodetik (dihitung hanya jika dibutuhkan rate),
+    riwayat point tag dari batch sebelumnya, lookup nilai terakhir tag lain,
+    dan state milik rule (histeresis deadband) yang diganti per rule.
+    """
+    __slots__ = ("values", "history", "lookup", "state", "_timestamps", "_timestamps_ns", "_series")
+
+    def __init__(self, values: np.ndarray, timestamps_ns: Callable[[], np.ndarray],
+                 history: Optional[Tuple[np.ndarray, np.ndarray]], lookup: Callable[[str], float]):
+        self.values = values
+        self.history = history
+        self.lookup = lookup
+        self.state: Dict[int, Any] = {}
+        self._timestamps = timestamps_ns
+        self._timestamps_ns: Optional[np.ndarray] = None
+        self._series: Optional[Tuple[np.ndarray, np.ndarray]] = None
+
+    @property
+    def timestamps_ns(self) -> np.ndarray:
+        if self._timestamps_ns is None:
+            self._timestamps_ns = self._timestamps()
+        return self._timestamps_ns
+
+    @property
+    def series(self) -> Tuple[np.ndarray, np.ndarray]:
+        """(timestamp, value) riwayat + grup ini, digabung sekali untuk semua rate() di grup."""
+        if self._series is None:
+            history_ts, history_values = self.history or (_EMPTY_NS, _EMPTY_VALUES)
+            self._series = (
+                np.concatenate((history_ts, self.timestamps_ns)),
+                np.concatenate((history_values, self.values)),
+            )
+        return self._series
+
+
+class CompiledCondition:
+    """Kondisi yang sudah dikompilasi, beserta kebutuhan evaluasinya."""
+    __slots__ = ("source", "_evaluate", "rate_windows", "referenced_tags", "stateful",
+                 "on_delay_ns", "off_delay_ns", "latch")
+
+    def __init__(self, source: str, evaluate: Callable[[EvaluationContext], Any],
+                 rate_windows: Set[int], referenced_tags: Set[str], stateful: bool,
+                 on_delay_ns: int = 0, off_delay_ns: int = 0, latch: bool = False):
+        self.source = source
+        self._evaluate = evaluate
+        # Window rate() dalam nanodetik; engine menyimpan riwayat tag sepanjang window terbesar
+        self.rate_windows = rate_windows
+        self.referenced_tags = referenced_tags
+        self.stateful = stateful
+        # Opsi alarm: kondisi harus bertahan on_delay sebelum aktif / salah selama off_delay
+        # sebelum kembali normal; latch = alarm tetap aktif sampai di-clear operator
+        self.on_delay_ns = on_delay_ns
+        self.off_delay_ns = off_delay_ns
+        self.latch = latch
+
+    @property
+    def history_window(self) -> int:
+        return max(self.rate_windows, default=0)
+
+    def __call__(self, ctx: EvaluationContext) -> np.ndarray:
+        """Mask boolean sepanjang ctx.values."""
+        with np.errstate(divide='ignore', invalid='ignore'):
+            result = self._evaluate(ctx)
+        return np.broadcast_to(np.asarray(result, dtype=bool), ctx.values.shape)
+
+
+def _tokenize(source: str) -> List[Tuple[str, Any, int]]:
+    tokens = []
+    position = 0
+    source = source.rstrip()
+    while position < len(source):
+        match = _TOKEN_PATTERN.match(source, position)
+        if not match:
+            raise ConditionError(f"Unexpected character at position {position}: {source[position:position + 10]!r}")
+        start = match.start() + len(match.group()) - len(match.group().lstrip())
+        if match.group("duration") is not None:
+            # Grammar durasi sama dengan parse_time_window; sisa error-nya (mis. 0s) jadi ConditionError
+            duration = match.group("duration") + match.group("unit")
+            try:
+                tokens.append(("duration", parse_time_window(duration), start))
+            except ValueError as e:
+                raise ConditionError(f"Invalid duration at position {start}: {e}")
+        elif match.group("number") is not None:
+            tokens.append(("number", float(match.group("number")), start))
+        elif match.group("string") is not None:
+            tokens.append(("string", match.group("string")[1:-1], start))
+        elif match.group("op") is not None:
+            tokens.append(("op", match.group("op"), start))
+        else:
+            name = match.group("name")
+            tokens.append(("keyword" if name in _KEYWORDS else "name", name, start))
+        position = match.end()
+    tokens.append(("end", None, len(source)))
+    return tokens
+
+
+class _Parser:
+    """Recursive descent: or > and > not > perbandingan > + - > * / > unary > primary."""
+
+    def __init__(self, source: str):
+        self.tokens = _tokenize(source)
+        self.index = 0
+        self.options: Dict[str, Any] = {}
+
+    def parse(self) -> tuple:
+        node = self._or()
+        self._options()
+        if not self._peek("end"):
+            raise self._unexpected()
+        return node
+
+    def _options(self):
+        """Opsi alarm setelah ekspresi: on_delay <durasi>, off_delay <durasi>, latch."""
+        while self._peek("keyword"):
+            _, option, position = self.tokens[self.index]
+            if option not in ("on_delay", "off_delay", "latch"):
+                break
+            if option in self.options:
+                raise ConditionError(f"Duplicate option {option!r} at position {position}")
+            self.index += 1
+            self.options[option] = True if option == "latch" else self._expect("duration")
+
+    def _unexpected(self, expected: Optional[str] = None) -> ConditionError:
+        kind, text, position = self.tokens[self.index]
+        found = "end of condition" if kind == "end" else repr(text)
+        if expected:
+            return ConditionError(f"Expected {expected} at position {position}, found {found}")
+        return ConditionError(f"Unexpected {found} at position {position}")
+
+    def _peek(self, kind: str, text: Any = None) -> bool:
+        token_kind, token_text, _ = self.tokens[self.index]
+        return token_kind == kind and (text is None or token_text == text)
+
+    def _accept(self, kind: str, text: Any = None) -> Optional[Any]:
+        if self._peek(kind, text):
+            self.index += 1
+            return self.tokens[self.index - 1][1]
+        return None
+
+    def _expect(self, kind: str, text: Any = None) -> Any:
+        if not self._peek(kind, text):
+            raise self._unexpected(text or kind)
+        return self._accept(kind, text)
+
+    def _or(self) -> tuple:
+        node = self._and()
+        while self._accept("keyword", "or"):
+            node = ("or", node, self._and())
+        return node
+
+    def _and(self) -> tuple:
+        node = self._not()
+        while self._accept("keyword", "and"):
+            node = ("and", node, self._not())
+        return node
+
+    def _not(self) -> tuple:
+        if self._accept("keyword", "not"):
+            return ("not", self._not())
+        return self._comparison()
+
+    def _comparison(self) -> tuple:
+        left = self._sum()
+        if self._accept("keyword", "between"):
+            low = self._sum()
+            self._expect("keyword", "and")
+            return ("between", left, low, self._sum())
+        if self._peek("op") and self.tokens[self.index][1] in _COMPARISONS:
+            op = self._accept("op")
+            right = self._sum()
+            deadband = None
+            if self._accept("keyword", "deadband"):
+                if op not in ("<", "<=", ">", ">="):
+                    raise ConditionError(f"deadband needs <, <=, > or >=, not {op}")
+                deadband = self._expect("number")
+            return ("cmp", op, left, right, deadband)
+        return left
+
+    def _sum(self) -> tuple:
+        node = self._term()
+        while self._peek("op", "+") or self._peek("op", "-"):
+            node = ("arith", self._accept("op"), node, self._term())
+        return node
+
+    def _term(self) -> tuple:
+        node = self._unary()
+        while self._peek("op", "*") or self._peek("op", "/"):
+            node = ("arith", self._accept("op"), node, self._unary())
+        return node
+
+    def _unary(self) -> tuple:
+        if self._accept("op", "-"):
+            return ("neg", self._unary())
+        return self._primary()
+
+    def _primary(self) -> tuple:
+        number = self._accept("number")
+        if number is not None:
+            return ("num", number)
+        if self._accept("op", "("):
+            node = self._or()
+            self._expect("op", ")")
+            return node
+        kind, name, position = self.tokens[self.index]
+        if kind != "name":
+            raise self._unexpected()
+        self.index += 1
+        if name == "value":
+            return ("value",)
+        if not self._accept("op", "("):
+            raise ConditionError(f"Unknown name {name!r} at position {position}")
+        if name == "tag":
+            node = ("tag", self._expect("string"))
+        elif name == "rate":
+            self._expect("name", "value")
+            self._expect("op", ",")
+            node = ("rate", self._expect("duration"))
+        elif name == "abs":
+            node = ("abs", self._sum())
+        else:
+            raise ConditionError(f"Unknown function {name!r} at position {position}")
+        self._expect("op", ")")
+        return node
+
+
+def _rate(ctx: EvaluationContext, window_ns: int) -> np.ndarray:
+    """
+    Laju perubahan per detik: (value - value tertua dalam window) / selisih waktunya.
+    Riwayat batch sebelumnya ikut dipakai; NaN jika belum ada point lain dalam window.
+    Mengasumsikan point per tag datang berurutan waktu.
+    """
+    timestamps = ctx.timestamps_ns
+    all_ts, all_values = ctx.series
+    start = np.searchsorted(all_ts, timestamps - window_ns, side='left')
+    elapsed = timestamps - all_ts[start]
+    return np.where(elapsed > 0, (ctx.values - all_values[start]) * 1e9 / np.maximum(elapsed, 1), np.nan)
+
+
+def _hysteresis(on: np.ndarray, off: np.ndarray, previous: bool) -> np.ndarray:
+    """State per point: menyala saat `on`, padam saat `off`, selain itu mempertahankan state sebelumnya."""
+    rows = np.arange(len(on))
+    last_event = np.maximum.accumulate(np.where(on | off, rows, -1))
+    return np.where(last_event >= 0, on[np.maximum(last_event, 0)], previous)
+
+
+class _Compiler:
+    def __init__(self):
+        self.rate_windows: Set[int] = set()
+        self.referenced_tags: Set[str] = set()
+        self.state_slots = 0
+
+    def compile(self, node: tuple, boolean: bool) -> Callable[[EvaluationContext], Any]:
+        kind = node[0]
+        if (kind in _BOOLEAN_NODES) != boolean:
+            expected = "a condition" if boolean else "a number"
+            raise ConditionError(f"Expected {expected}, found {kind} expression")
+        return getattr(self, f"_compile_{kind}")(node)
+
+    def _compile_num(self, node):
+        constant = node[1]
+        return lambda ctx: constant
+
+    def _compile_value(self, node):
+        return lambda ctx: ctx.values
+
+    def _compile_tag(self, node):
+        tag_id = node[1]
+        self.referenced_tags.add(tag_id)
+        return lambda ctx: ctx.lookup(tag_id)
+
+    def _compile_rate(self, node):
+        window_ns = node[1]
+        self.rate_windows.add(window_ns)
+        return lambda ctx: _rate(ctx, window_ns)
+
+    def _compile_abs(self, node):
+        operand = self.compile(node[1], False)
+        return lambda ctx: np.abs(operand(ctx))
+
+    def _compile_neg(self, node):
+        operand = self.compile(node[1], False)
+        return lambda ctx: np.negative(operand(ctx))
+
+    def _compile_arith(self, node):
+        function = _ARITHMETIC[node[1]]
+        left, right = self.compile(node[2], False), self.compile(node[3], False)
+        return lambda ctx: function(left(ctx), right(ctx))
+
+    def _compile_cmp(self, node):
+        _, op, left_node, right_node, deadband = node
+        function = _COMPARISONS[op]
+        left, right = self.compile(left_node, False), self.compile(right_node, False)
+        if deadband is None:
+            return lambda ctx: function(left(ctx), right(ctx))
+
+        # Histeresis: batas padam digeser deadband menjauhi batas nyala
+        release = _COMPARISONS[{">": "<=", ">=": "<", "<": ">=", "<=": ">"}[op]]
+        offset = -deadband if op in (">", ">=") else deadband
+        slot = self.state_slots
+        self.state_slots += 1
+
+        def evaluate(ctx):
+            left_values, right_values = left(ctx), right(ctx)
+            shape = ctx.values.shape
+            on = np.broadcast_to(function(left_values, right_values), shape)
+            off = np.broadcast_to(release(left_values, np.add(right_values, offset)), shape)
+            result = _hysteresis(on, off, ctx.state.get(slot, False))
+            if len(result):
+                ctx.state[slot] = bool(result[-1])
+            return result
+        return evaluate
+
+    def _compile_between(self, node):
+        value, low, high = (self.compile(n, False) for n in node[1:])
+
+        def evaluate(ctx):
+            values = value(ctx)
+            return np.logical_and(values >= low(ctx), values <= high(ctx))
+        return evaluate
+
+    def _compile_and(self, node):
+        left, right = self.compile(node[1], True), self.compile(node[2], True)
+        return lambda ctx: np.logical_and(left(ctx), right(ctx))
+
+    def _compile_or(self, node):
+        left, right = self.compile(node[1], True), self.compile(node[2], True)
+        return lambda ctx: np.logical_or(left(ctx), right(ctx))
+
+    def _compile_not(self, node):
+        operand = self.compile(node[1], True)
+        return lambda ctx: np.logical_not(operand(ctx))
+
+
+@lru_cache(maxsize=config.RULE_CONDITION_CACHE_SIZE)
+def compile_condition(source: str) -> CompiledCondition:
+    """
+    Parse dan kompilasi kondisi rule; ConditionError jika tidak valid.
+    Hasilnya tidak menyimpan state (state ada di EvaluationContext), jadi rule dengan
+    teks kondisi yang sama berbagi satu hasil kompilasi.
+    """
+    if not source or not source.strip():
+        raise ConditionError("Condition is empty")
+    compiler = _Compiler()
+    parser = _Parser(source)
+    evaluate = compiler.compile(parser.parse(), True)
+    return CompiledCondition(
+        source, evaluate, compiler.rate_windows, compiler.referenced_tags,
+        stateful=bool(compiler.rate_windows or compiler.state_slots),
+        on_delay_ns=parser.options.get("on_delay", 0),
+        off_delay_ns=parser.options.get("off_delay", 0),
+        latch=parser.options.get("latch", False)
+    )
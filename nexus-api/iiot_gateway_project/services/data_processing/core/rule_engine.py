@@ -1,58 +1,291 @@
 # core/rule_engine.py
 import logging
-from typing import List
-from ..models import DataPoint, AlarmRule, Alarm
+from typing import List, Dict, Any, Callable, Optional, Tuple
+
+import numpy as np
+
+from ..models import DataPoint, AlarmRule
+from .alarm_states import AlarmStateTable, AlarmTransition, TRANSITION_RAISED
+from .columnar import ColumnarBatch, iter_tag_groups, timestamps_to_ns, from_epoch_ns, to_epoch_ns
+from .rule_conditions import CompiledCondition, ConditionError, EvaluationContext, compile_condition
 
 logger = logging.getLogger(__name__)
 
+
+def rule_version(rule: AlarmRule) -> Tuple[Any, ...]:
+    """Versi rule: hasil kompilasi dan state-nya dipakai ulang selama versi tidak berubah."""
+    return (rule.tag_id, rule.condition, getattr(rule, 'updated_at', None))
+
+
+class CompiledRule:
+    """Rule aktif dengan kondisi yang sudah dikompilasi (di-parse sekali per versi rule)."""
+    __slots__ = ("rule", "condition", "version", "state")
+
+    def __init__(self, rule: AlarmRule, condition: CompiledCondition):
+        self.rule = rule
+        self.condition = condition
+        self.version = rule_version(rule)
+        # State kondisi (histeresis deadband) milik rule ini
+        self.state: Dict[int, Any] = {}
+
+
 class RuleEngine:
     """
     Mengevaluasi aturan alarm berdasarkan data yang masuk.
+    Rule aktif disimpan dalam index tag_id -> daftar CompiledRule, sehingga biaya
+    evaluasi sebuah point bergantung pada jumlah rule untuk tag-nya, bukan total rule.
+    Kondisi dikompilasi sekali per versi rule (lihat rule_conditions); engine menyimpan
+    riwayat singkat per tag untuk rate() dan nilai terakhir tag yang dirujuk tag("...").
+    Hasil kondisi dijalankan lewat state machine alarm per rule (AlarmStateTable),
+    sehingga yang dikembalikan hanya transisi: alarm baru dan alarm yang kembali normal.
     """
     def __init__(self):
-        # Daftar aturan aktif, bisa dimuat dari database
-        self.active_rules: List[AlarmRule] = []
+        # ID rule (string) -> rule aktif yang sudah dikompilasi, dan index per tag
+        self.compiled_rules: Dict[str, CompiledRule] = {}
+        self.rule_index: Dict[str, List[CompiledRule]] = {}
+        # tag -> window rate() terbesar (nanodetik) dan riwayat (timestamp, value) sepanjang window itu
+        self.history_windows: Dict[str, int] = {}
+        self.tag_history: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        # Tag yang dirujuk kondisi lewat tag("...") (-> jumlah rule perujuk) dan nilai terakhirnya
+        self.referenced_tags: Dict[str, int] = {}
+        self.last_values: Dict[str, float] = {}
+        self.alarm_states = AlarmStateTable()
+
+    @property
+    def active_rules(self) -> List[AlarmRule]:
+        return [compiled.rule for compiled in self.compiled_rules.values()]
 
     def load_rules(self, rules: List[AlarmRule]):
-        """Memuat atau memperbarui daftar aturan."""
-        self.active_rules = [rule for rule in rules if rule.is_active]
-        logger.info(f"Loaded {len(self.active_rules)} active alarm rules.")
+        """Memuat atau memperbarui daftar aturan dan membangun ulang index per tag."""
+        compiled_rules: Dict[str, CompiledRule] = {}
+        for rule in rules:
+            if not rule.is_active:
+                continue
+            compiled = self._compile(rule)
+            if compiled is not None:
+                compiled_rules[str(rule.id)] = compiled
+        for rule_id in self.compiled_rules.keys() - compiled_rules.keys():
+            self._drop_state(rule_id)
+        self.compiled_rules = compiled_rules
+        self._rebuild_index()
+        logger.info(f"Loaded {len(compiled_rules)} active alarm rules for {len(self.rule_index)} tags.")
+
+    def upsert_rule(self, rule: AlarmRule):
+        """
+        Menerapkan satu rule yang dibuat/diubah/di-toggle tanpa membangun ulang seluruh
+        index: hanya entri tag lama dan tag baru rule tersebut yang diganti.
+        """
+        rule_id = str(rule.id)
+        compiled = self._compile(rule) if rule.is_active else None
+        if compiled is None:
+            self.remove_rule(rule_id)
+            return
+        previous = self.compiled_rules.get(rule_id)
+        if compiled is previous:
+            # Versi sama (mis. gema pub/sub dari worker ini): _compile sudah memperbarui rule-nya
+            return
+        self.compiled_rules[rule_id] = compiled
+        # Index yang baru dipasang sebelum yang lama dilepas, agar tag yang tetap dipakai
+        # tidak sempat kehilangan riwayat rate() dan nilai terakhir tag("...")
+        self._index(compiled)
+        if previous is not None:
+            self._unindex(previous)
+        logger.info(f"Applied alarm rule {rule_id} for tag {rule.tag_id}.")
+
+    def remove_rule(self, rule_id: Any):
+        """Menghapus rule (dihapus atau dinonaktifkan) dari index dan tabel state."""
+        rule_id = str(rule_id)
+        compiled = self.compiled_rules.pop(rule_id, None)
+        if compiled is None:
+            return
+        self._unindex(compiled)
+        self._drop_state(rule_id)
+        logger.info(f"Removed alarm rule {rule_id} from tag {compiled.rule.tag_id}.")
+
+    def _index(self, compiled: CompiledRule):
+        tag_id = compiled.rule.tag_id
+        # Copy-on-write: list lama tetap utuh untuk evaluasi yang sedang memakainya
+        self.rule_index[tag_id] = self.rule_index.get(tag_id, []) + [compiled]
+        for referenced in compiled.condition.referenced_tags:
+            self.referenced_tags[referenced] = self.referenced_tags.get(referenced, 0) + 1
+        self._refresh_history_window(tag_id)
+
+    def _unindex(self, compiled: CompiledRule):
+        tag_id = compiled.rule.tag_id
+        remaining = [c for c in self.rule_index.get(tag_id, ()) if c is not compiled]
+        if remaining:
+            self.rule_index[tag_id] = remaining
+        else:
+            self.rule_index.pop(tag_id, None)
+        for referenced in compiled.condition.referenced_tags:
+            count = self.referenced_tags.get(referenced, 0) - 1
+            if count > 0:
+                self.referenced_tags[referenced] = count
+            else:
+                self.referenced_tags.pop(referenced, None)
+                self.last_values.pop(referenced, None)
+        self._refresh_history_window(tag_id)
 
-    def evaluate(self, data_point: DataPoint) -> List[Alarm]:
+    def _refresh_history_window(self, tag_id: str):
+        window = max((c.condition.history_window for c in self.rule_index.get(tag_id, ())), default=0)
+        if window:
+            self.history_windows[tag_id] = window
+        else:
+            self.history_windows.pop(tag_id, None)
+            self.tag_history.pop(tag_id, None)
+
+    def _compile(self, rule: AlarmRule) -> Optional[CompiledRule]:
+        """Kompilasi rule, atau pakai hasil sebelumnya (beserta state-nya) jika versinya sama."""
+        existing = self.compiled_rules.get(str(rule.id))
+        if existing is not None and existing.version == rule_version(rule):
+            existing.rule = rule
+            return existing
+        try:
+            return CompiledRule(rule, compile_condition(rule.condition))
+        except (ConditionError, ValueError) as e:
+            # Satu rule rusak di database tidak boleh menggagalkan load_rules untuk semua rule
+            logger.warning(f"Skipping alarm rule {rule.id}: {e}")
+            return None
+
+    def _drop_state(self, rule_id: str):
+        open_alarm = self.alarm_states.remove(rule_id)
+        if open_alarm:
+            logger.info(f"Alarm rule {rule_id} removed while alarm {open_alarm} is still open; it stays until cleared.")
+
+    def restore_alarms(self, active_alarms: List[Dict]):
         """
-        Mengevaluasi sebuah data point terhadap semua aturan aktif.
-        Mengembalikan daftar alarm yang terpicu.
+        Menyambung state dari alarm aktif di database (mis. dari AlarmManager.get_active_alarms
+        saat startup), agar alarm yang masih terbuka tidak di-INSERT ulang.
         """
-        triggered_alarms = []
-        for rule in self.active_rules:
-            if rule.tag_id == data_point.tag_id:
-                # Evaluasi kondisi yang sangat sederhana
-                # Di produksi, gunakan library evaluasi ekspresi yang aman
+        for alarm in active_alarms:
+            self.alarm_states.restore(str(alarm["rule_id"]), str(alarm["id"]))
+        logger.info(f"Restored state of {len(active_alarms)} open alarms.")
+
+    def release_alarm(self, alarm_id: str) -> bool:
+        """Dipanggil saat alarm di-clear operator; alarm latch kembali ke normal."""
+        return self.alarm_states.release(alarm_id)
+
+    def rollback_transitions(self, transitions: List[AlarmTransition]) -> int:
+        """
+        Dipanggil jika AlarmManager.apply_transitions gagal: state alarm dikembalikan
+        (urutan terbalik) agar transisi terpicu lagi oleh point berikutnya, bukan hilang
+        karena state sudah berpindah sementara database tidak berubah.
+        """
+        rolled_back = 0
+        for transition in reversed(transitions):
+            rule_id = str(transition.rule.id)
+            compiled = self.compiled_rules.get(rule_id)
+            if compiled is None:
+                continue
+            delay = compiled.condition.on_delay_ns if transition.kind == TRANSITION_RAISED else compiled.condition.off_delay_ns
+            if self.alarm_states.rollback(rule_id, transition.kind, transition.alarm_id,
+                                          to_epoch_ns(transition.timestamp) - delay):
+                rolled_back += 1
+        if rolled_back:
+            logger.warning(f"Rolled back {rolled_back} of {len(transitions)} unpersisted alarm transitions.")
+        return rolled_back
+
+    def _rebuild_index(self):
+        rule_index: Dict[str, List[CompiledRule]] = {}
+        history_windows: Dict[str, int] = {}
+        referenced_tags: Dict[str, int] = {}
+        for compiled in self.compiled_rules.values():
+            tag_id = compiled.rule.tag_id
+            rule_index.setdefault(tag_id, []).append(compiled)
+            if compiled.condition.rate_windows:
+                history_windows[tag_id] = max(history_windows.get(tag_id, 0), compiled.condition.history_window)
+            for referenced in compiled.condition.referenced_tags:
+                referenced_tags[referenced] = referenced_tags.get(referenced, 0) + 1
+        self.rule_index = rule_index
+        self.history_windows = history_windows
+        self.referenced_tags = referenced_tags
+        self.tag_history = {tag: h for tag, h in self.tag_history.items() if tag in history_windows}
+
+    def evaluate(self, data_point: DataPoint) -> List[AlarmTransition]:
+        """
+        Mengevaluasi sebuah data point terhadap rule aktif untuk tag-nya.
+        Mengembalikan transisi alarm yang terjadi (lihat AlarmManager.apply_transitions).
+        """
+        return self.evaluate_many([data_point])
+
+    def evaluate_many(self, data_points: List[DataPoint]) -> List[AlarmTransition]:
+        """
+        Mengevaluasi banyak data point sekaligus: point dikelompokkan per tag lalu
+        setiap rule tag tersebut dicek dengan satu perbandingan NumPy untuk seluruh grup.
+        """
+        if not data_points or not self.rule_index:
+            return []
+        values = np.fromiter((dp.value for dp in data_points), dtype=np.float64, count=len(data_points))
+        tag_index: Dict[str, int] = {}
+        tag_codes = np.fromiter(
+            (tag_index.setdefault(dp.tag_id, len(tag_index)) for dp in data_points),
+            dtype=np.int32,
+            count=len(data_points),
+        )
+        return self._evaluate_groups(
+            list(tag_index), tag_codes, values,
+            lambda: timestamps_to_ns([dp.timestamp for dp in data_points])
+        )
+
+    def evaluate_batch(self, batch: ColumnarBatch) -> List[AlarmTransition]:
+        """Seperti evaluate_many, untuk batch kolumnar (value dan kode tag sudah berupa array)."""
+        if not len(batch) or not self.rule_index:
+            return []
+        return self._evaluate_groups(
+            batch.tag_names, batch.tag_codes, batch.values,
+            lambda: batch.timestamps_ns
+        )
+
+    def _evaluate_groups(self, tag_names: List[str], tag_codes: np.ndarray, values: np.ndarray,
+                         timestamps_ns: Callable[[], np.ndarray]) -> List[AlarmTransition]:
+        groups = list(iter_tag_groups(tag_codes))
+        if self.referenced_tags:
+            # tag("...") membaca nilai terbaru yang diketahui, termasuk dari batch ini
+            for code, rows in groups:
+                if tag_names[code] in self.referenced_tags:
+                    self.last_values[tag_names[code]] = float(values[rows[-1]])
+
+        all_timestamps: List[np.ndarray] = []
+
+        def group_timestamps(rows: np.ndarray) -> Callable[[], np.ndarray]:
+            def load() -> np.ndarray:
+                if not all_timestamps:
+                    all_timestamps.append(timestamps_ns())
+                return all_timestamps[0][rows]
+            return load
+
+        lookup = lambda tag_id: self.last_values.get(tag_id, np.nan)
+        transitions = []
+        for code, rows in groups:
+            tag_id = tag_names[code]
+            compiled_rules = self.rule_index.get(tag_id)
+            if not compiled_rules:
+                continue
+            ctx = EvaluationContext(values[rows], group_timestamps(rows), self.tag_history.get(tag_id), lookup)
+            for compiled in compiled_rules:
+                condition = compiled.condition
+                ctx.state = compiled.state
                 try:
-                    # WARNING: eval() bisa berbahaya. Gunakan library seperti `simpleeval` untuk produksi.
-                    # condition = f"{data_point.value} {rule.condition}" # e.g., "85 > 80"
-                    # if eval(condition):
-                    
-                    # Contoh evaluasi manual sederhana untuk 'value > X'
-                    if rule.condition.startswith("value > "):
-                        threshold = float(rule.condition.split(">")[1].strip())
-                        if data_point.value > threshold:
-                            alarm = self._create_alarm(rule, data_point)
-                            triggered_alarms.append(alarm)
-                    # Tambahkan kondisi lain seperti <, ==, range, dll.
-                    
+                    mask = condition(ctx)
                 except Exception as e:
-                    logger.error(f"Error evaluating rule {rule.id} for data point {data_point.tag_id}: {e}")
-        return triggered_alarms
-
-    def _create_alarm(self, rule: AlarmRule, data_point: DataPoint) -> Alarm:
-        """Membuat objek alarm berdasarkan rule dan data point."""
-        return Alarm(
-            rule_id=rule.id,
-            name=rule.name,
-            description=rule.description,
-            tag_id=rule.tag_id,
-            severity=rule.severity,
-            timestamp_triggered=data_point.timestamp, # Gunakan timestamp data point
-            value_at_trigger=data_point.value
-        )
+                    logger.error(f"Error evaluating rule {compiled.rule.id} for tag {tag_id}: {e}")
+                    continue
+                changes = self.alarm_states.advance(
+                    str(compiled.rule.id), mask, lambda: ctx.timestamps_ns,
+                    condition.on_delay_ns, condition.off_delay_ns, condition.latch
+                )
+                for kind, alarm_id, group_row in changes:
+                    # Timestamp transisi = timestamp point yang memicunya (UTC)
+                    transitions.append(AlarmTransition(
+                        kind, alarm_id, compiled.rule,
+                        from_epoch_ns(ctx.timestamps_ns[group_row]), float(ctx.values[group_row])
+                    ))
+            if tag_id in self.history_windows:
+                self._remember(tag_id, ctx)
+        return transitions
+
+    def _remember(self, tag_id: str, ctx: EvaluationContext):
+        """Menyimpan point tag sepanjang window rate() terbesar untuk batch berikutnya."""
+        timestamps, group_values = ctx.series
+        keep = timestamps >= timestamps[-1] - self.history_windows[tag_id]
+        self.tag_history[tag_id] = (timestamps[keep], group_values[keep])
@@ -0,0 +1,202 @@
+# core/rule_sync.py
+import json
+import time
+import asyncio
+import logging
+from datetime import datetime
+from typing import Dict, Any, Optional
+
+import redis.asyncio as redis
+from sqlalchemy import select
+
+from ..models.alarm_schema import AlarmRule
+from ..databases import AsyncSessionFactory
+from ..config import config
+from .rule_engine import RuleEngine
+
+logger = logging.getLogger(__name__)
+
+# Jenis event perubahan rule di channel pub/sub
+EVENT_UPSERT = "upsert"    # create, update, toggle
+EVENT_DELETE = "delete"
+EVENT_RELEASE = "release"  # alarm di-clear operator (melepas latch)
+
+
+def rule_to_message(rule: AlarmRule) -> Dict[str, Any]:
+    """Isi rule yang dikirim di event upsert (cukup untuk membangun ulang rule di worker lain)."""
+    return {
+        "id": str(rule.id),
+        "name": rule.name,
+        "description": rule.description,
+        "tag_id": rule.tag_id,
+        "condition": rule.condition,
+        "severity": getattr(rule.severity, "value", rule.severity),
+        "is_active": rule.is_active,
+        "updated_at": rule.updated_at.isoformat() if rule.updated_at else None,
+    }
+
+
+def rule_from_message(data: Dict[str, Any]) -> AlarmRule:
+    """Rule transient (tidak terikat session) dari isi event upsert."""
+    fields = dict(data)
+    if fields.get("updated_at"):
+        fields["updated_at"] = datetime.fromisoformat(fields["updated_at"])
+    return AlarmRule(**fields)
+
+
+class RuleSync:
+    """
+    Menjaga rule di RuleEngine tetap sama dengan tabel alarm_rules di semua worker.
+    Saat startup semua rule dimuat dari database; setelah itu setiap perubahan dari API
+    diterapkan langsung di worker pengirim lalu disiarkan lewat Redis pub/sub, dan worker
+    lain menerapkannya secara inkremental (upsert_rule/remove_rule, hanya entri tag yang
+    berubah). Pub/sub tidak menyimpan pesan, jadi setelah reconnect dan secara berkala
+    rule dimuat ulang penuh dari database.
+    """
+
+    def __init__(self, rule_engine: RuleEngine, channel: Optional[str] = None):
+        self.rule_engine = rule_engine
+        self.channel = channel or config.RULE_SYNC_CHANNEL
+        self._redis: Optional[redis.Redis] = None
+        self._task: Optional[asyncio.Task] = None
+        self.last_reload: Optional[float] = None
+        # Nomor urut perubahan lokal dan ID rule -> nomor urut perubahan terakhirnya,
+        # agar reload tidak menimpa perubahan yang diterapkan selama query database
+        self._sequence = 0
+        self._changed_at: Dict[str, int] = {}
+
+    def _client(self) -> redis.Redis:
+        if self._redis is None:
+            self._redis = redis.Redis(
+                host=config.REDIS_HOST,
+                port=config.REDIS_PORT,
+                db=config.REDIS_DB_CACHE,
+                decode_responses=True,
+                socket_connect_timeout=5,
+                health_check_interval=30
+            )
+        return self._redis
+
+    async def start(self, alarm_manager=None):
+        """
+        Memuat rule dan state alarm terbuka, lalu mulai mendengarkan perubahan.
+        Jika pemuatan awal gagal, listener tetap jalan dan mencoba lagi saat resync.
+        """
+        try:
+            await self.reload()
+            if alarm_manager is not None:
+                self.rule_engine.restore_alarms(await alarm_manager.get_active_alarms())
+        finally:
+            if config.RULE_SYNC_ENABLED and self._task is None:
+                self._task = asyncio.create_task(self._listen())
+
+    async def reload(self):
+        """
+        Memuat ulang semua rule dari database (state rule yang tidak berubah dipertahankan).
+        Rule yang berubah lewat apply selama query berjalan tidak diambil dari snapshot
+        (bisa sudah basi); versi yang sedang dipakai RuleEngine dipertahankan.
+        """
+        started = self._sequence
+        async with AsyncSessionFactory() as session:
+            result = await session.execute(select(AlarmRule))
+            rules = list(result.scalars().all())
+        changed = {rule_id for rule_id, sequence in self._changed_at.items() if sequence > started}
+        if changed:
+            rules = [rule for rule in rules if str(rule.id) not in changed]
+            rules.extend(
+                self.rule_engine.compiled_rules[rule_id].rule
+                for rule_id in changed if rule_id in self.rule_engine.compiled_rules
+            )
+            logger.info(f"Kept {len(changed)} alarm rules changed during reload.")
+        self.rule_engine.load_rules(rules)
+        self._changed_at = {rule_id: sequence for rule_id, sequence in self._changed_at.items() if sequence > started}
+        self.last_reload = time.monotonic()
+
+    async def publish_upsert(self, rule: AlarmRule):
+        """Dipanggil API setelah rule dibuat/diubah/di-toggle dan di-commit."""
+        await self._publish({"event": EVENT_UPSERT, "rule": rule_to_message(rule)})
+
+    async def publish_delete(self, rule_id: Any):
+        """Dipanggil API setelah rule dihapus dan di-commit."""
+        await self._publish({"event": EVENT_DELETE, "rule_id": str(rule_id)})
+
+    async def publish_release(self, alarm_id: str):
+        """Dipanggil API setelah alarm di-clear operator."""
+        await self._publish({"event": EVENT_RELEASE, "alarm_id": str(alarm_id)})
+
+    async def _publish(self, message: Dict[str, Any]):
+        # Worker ini langsung menerapkan perubahan (pesan yang sama kembali lewat
+        # subscriber tidak mengubah apa-apa), worker lain lewat pub/sub
+        self.apply(message)
+        if not config.RULE_SYNC_ENABLED:
+            return
+        try:
+            await self._client().publish(self.channel, json.dumps(message))
+        except Exception as e:
+            # Worker lain menyusul saat resync berkala
+            logger.warning(f"Failed to publish alarm rule change: {e}")
+
+    def apply(self, message: Dict[str, Any]):
+        """Menerapkan satu event perubahan rule ke RuleEngine."""
+        event = message.get("event")
+        if event == EVENT_UPSERT:
+            self.rule_engine.upsert_rule(rule_from_message(message["rule"]))
+            self._mark_changed(message["rule"]["id"])
+        elif event == EVENT_DELETE:
+            self.rule_engine.remove_rule(message["rule_id"])
+            self._mark_changed(message["rule_id"])
+        elif event == EVENT_RELEASE:
+            self.rule_engine.release_alarm(message["alarm_id"])
+        else:
+            logger.warning(f"Ignoring unknown alarm rule event: {event}")
+
+    def _mark_changed(self, rule_id: Any):
+        self._sequence += 1
+        self._changed_at[str(rule_id)] = self._sequence
+
+    async def _listen(self):
+        attempt = 0
+        while True:
+            pubsub = None
+            try:
+                pubsub = self._client().pubsub(ignore_subscribe_messages=True)
+                await pubsub.subscribe(self.channel)
+                if attempt:
+                    # Perubahan selama terputus tidak akan diterima lagi
+                    logger.info("Alarm rule channel reconnected, reloading rules.")
+                    await self.reload()
+                attempt = 0
+                while True:
+                    message = await pubsub.get_message(timeout=1.0)
+                    if message is not None:
+                        try:
+                            self.apply(json.loads(message["data"]))
+                        except Exception as e:
+                            logger.error(f"Failed to apply alarm rule event: {e}", exc_info=True)
+                    if self.last_reload is None or time.monotonic() - self.last_reload >= config.RULE_SYNC_RESYNC_SECONDS:
+                        await self.reload()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                attempt += 1
+                delay = min(config.RULE_SYNC_RECONNECT_MAX_SECONDS, 2 ** (attempt - 1))
+                logger.warning(f"Alarm rule sync interrupted ({e}), retrying in {delay}s.")
+                await asyncio.sleep(delay)
+            finally:
+                if pubsub is not None:
+                    try:
+                        await pubsub.aclose()
+                    except Exception:
+                        pass
+
+    async def close(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._redis is not None:
+            await self._redis.aclose()
+            self._redis = None
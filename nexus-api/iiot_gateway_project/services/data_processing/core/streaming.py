@@ -0,0 +1,445 @@
+# core/streaming.py
+import time
+import logging
+import threading
+from collections import deque
+from typing import List, Dict, Any, Optional, Callable
+
+import numpy as np
+
+from ..models.data_processing import TransformType
+from .columnar import ColumnarBatch, TagActivity, iter_tag_groups, parse_time_window, suffix_id
+from .aggregation import window_point
+from .normalization import StatefulNormalizer
+from ..config import config
+
+logger = logging.getLogger(__name__)
+
+_EMPTY = np.empty(0, dtype=np.float64)
+
+class StreamingMovingAverage:
+    """
+    Moving average per tag yang state-nya bertahan antar batch.
+    Untuk setiap tag disimpan window_size-1 nilai terakhir (isi ring buffer),
+    sehingga point pertama sebuah batch dirata-rata bersama ekor batch sebelumnya.
+    Di awal stream (sebelum window penuh) dipakai rata-rata dari nilai yang tersedia.
+    """
+
+    def __init__(self, window_size: int):
+        self.window_size = int(window_size)
+        if self.window_size < 1:
+            raise ValueError("window_size must be at least 1")
+        self._windows: Dict[str, np.ndarray] = {}
+        self.activity = TagActivity()
+
+    def expire_tags(self, cutoff: float) -> int:
+        expired = self.activity.expire(cutoff)
+        for tag in expired:
+            self._windows.pop(tag, None)
+        return len(expired)
+
+    def run(self, batch: ColumnarBatch) -> ColumnarBatch:
+        if not len(batch):
+            return batch
+        self.activity.touch(batch.tag_names)
+        w = self.window_size
+        new_values = batch.values.copy()
+
+        for code, rows in iter_tag_groups(batch.tag_codes):
+            tag = batch.tag_names[code]
+            history = self._windows.get(tag, _EMPTY)
+            extended = np.concatenate((history, batch.values[rows]))
+
+            # Jumlah trailing window via prefix sum: O(1) per point
+            n = len(extended)
+            prefix = np.concatenate(([0.0], np.cumsum(extended)))
+            ends = np.arange(1, n + 1)
+            starts = np.maximum(ends - w, 0)
+            averages = (prefix[ends] - prefix[starts]) / (ends - starts)
+
+            new_values[rows] = averages[len(history):]
+            self._windows[tag] = extended[max(n - (w - 1), 0):].copy() if w > 1 else _EMPTY
+
+        batch.values = new_values
+        batch.ids = _suffixed(batch.ids, "filtered")
+        batch.dirty[:] = True
+        logger.debug(f"Applied streaming moving average (window {w}) to {len(batch)} points.")
+        return batch
+
+
+class StreamingEWMA:
+    """Exponentially weighted moving average per tag: s = alpha * x + (1 - alpha) * s_prev."""
+
+    def __init__(self, alpha: Optional[float] = None, span: Optional[float] = None):
+        if alpha is None:
+            if span is None:
+                raise ValueError("EWMA requires 'alpha' or 'span'")
+            alpha = 2.0 / (float(span) + 1.0)
+        self.alpha = float(alpha)
+        if not 0.0 < self.alpha <= 1.0:
+            raise ValueError("alpha must be in (0, 1]")
+        self._last: Dict[str, float] = {}
+        self.activity = TagActivity()
+
+    def expire_tags(self, cutoff: float) -> int:
+        expired = self.activity.expire(cutoff)
+        for tag in expired:
+            self._last.pop(tag, None)
+        return len(expired)
+
+    def run(self, batch: ColumnarBatch) -> ColumnarBatch:
+        if not len(batch):
+            return batch
+        self.activity.touch(batch.tag_names)
+        alpha = self.alpha
+        beta = 1.0 - alpha
+        new_values = batch.values.copy()
+
+        for code, rows in iter_tag_groups(batch.tag_codes):
+            tag = batch.tag_names[code]
+            smoothed = self._last.get(tag)
+            out = []
+            for x in batch.values[rows].tolist():
+                smoothed = x if smoothed is None else alpha * x + beta * smoothed
+                out.append(smoothed)
+            new_values[rows] = out
+            self._last[tag] = smoothed
+
+        batch.values = new_values
+        batch.ids = _suffixed(batch.ids, "filtered")
+        batch.dirty[:] = True
+        logger.debug(f"Applied streaming EWMA (alpha {alpha}) to {len(batch)} points.")
+        return batch
+
+
+class _WindowAccumulator:
+    """Akumulator ringkas untuk satu window (satu tag, satu bucket)."""
+    __slots__ = ('bucket', 'count', 'sum', 'min', 'max', 'first', 'last')
+
+    def __init__(self, bucket: int, count: int, total: float, vmin: float, vmax: float, first: float, last: float):
+        self.bucket = bucket
+        self.count = count
+        self.sum = total
+        self.min = vmin
+        self.max = vmax
+        self.first = first
+        self.last = last
+
+    def merge(self, other: "_WindowAccumulator"):
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.last = other.last
+
+    def value(self, aggregation_type: str) -> float:
+        if aggregation_type == 'average':
+            return self.sum / self.count
+        if aggregation_type == 'sum':
+            return self.sum
+        if aggregation_type == 'min':
+            return self.min
+        if aggregation_type == 'max':
+            return self.max
+        if aggregation_type == 'count':
+            return float(self.count)
+        raise ValueError(f"Unknown aggregation type: {aggregation_type}")
+
+
+class TumblingWindowAggregator:
+    """
+    Agregasi tumbling window per tag berdasarkan time_window.
+    Satu point dihasilkan per tag per window, dengan timestamp awal window,
+    dan hanya setelah window tersebut tertutup (point dengan window berikutnya tiba).
+    Window yang masih terbuka disimpan sebagai state dan bisa dipaksa keluar dengan flush().
+    Point yang datang terlambat (window-nya sudah ditutup) dibuang dan dihitung di late_points.
+    """
+    AGGREGATION_TYPES = ('average', 'sum', 'min', 'max', 'count')
+
+    def __init__(self, time_window: Any = '1m', aggregation_type: str = 'average'):
+        if aggregation_type not in self.AGGREGATION_TYPES:
+            raise ValueError(f"Unknown aggregation type: {aggregation_type}")
+        self.time_window = time_window
+        self.window_ns = parse_time_window(time_window)
+        self.aggregation_type = aggregation_type
+        self._open: Dict[str, _WindowAccumulator] = {}
+        self.late_points = 0
+        self.activity = TagActivity()
+
+    def expire_tags(self, cutoff: float) -> int:
+        expired = self.activity.expire(cutoff)
+        dropped = sum(self._open.pop(tag, None) is not None for tag in expired)
+        if dropped:
+            logger.warning(f"Dropped {dropped} open windows of tags idle past the stream state TTL.")
+        return len(expired)
+
+    def run(self, batch: ColumnarBatch) -> ColumnarBatch:
+        if not len(batch):
+            return batch
+        self.activity.touch(batch.tag_names)
+        timestamps = batch.timestamps_ns
+        emitted: List[Dict] = []
+
+        for code, rows in iter_tag_groups(batch.tag_codes):
+            tag = batch.tag_names[code]
+            rows = rows[np.argsort(timestamps[rows], kind='stable')]
+            buckets = timestamps[rows] // self.window_ns
+            values = batch.values[rows]
+
+            state = self._open.get(tag)
+            if state is not None:
+                late = buckets < state.bucket
+                if late.any():
+                    self.late_points += int(late.sum())
+                    buckets = buckets[~late]
+                    values = values[~late]
+            if not len(values):
+                continue
+
+            # Batas grup per bucket dalam satu pass vektor
+            starts = np.flatnonzero(np.concatenate(([True], buckets[1:] != buckets[:-1])))
+            ends = np.append(starts[1:], len(values))
+            groups = zip(
+                buckets[starts].tolist(),
+                (ends - starts).tolist(),
+                np.add.reduceat(values, starts).tolist(),
+                np.minimum.reduceat(values, starts).tolist(),
+                np.maximum.reduceat(values, starts).tolist(),
+                values[starts].tolist(),
+                values[ends - 1].tolist(),
+            )
+            accumulators = [_WindowAccumulator(*group) for group in groups]
+
+            if state is not None:
+                if state.bucket == accumulators[0].bucket:
+                    state.merge(accumulators[0])
+                    accumulators[0] = state
+                else:
+                    emitted.append(self._to_point(tag, state))
+
+            # Semua window kecuali yang terakhir sudah tertutup
+            for accumulator in accumulators[:-1]:
+                emitted.append(self._to_point(tag, accumulator))
+            self._open[tag] = accumulators[-1]
+
+        logger.debug(f"Tumbling aggregation emitted {len(emitted)} closed windows from {len(batch)} points.")
+        return ColumnarBatch.from_dicts(emitted)
+
+    def flush(self) -> List[Dict]:
+        """Mengeluarkan semua window yang masih terbuka."""
+        emitted = [self._to_point(tag, state) for tag, state in self._open.items()]
+        self._open.clear()
+        return emitted
+
+    def _to_point(self, tag: str, accumulator: _WindowAccumulator) -> Dict:
+        return window_point(
+            tag, accumulator.bucket, self.window_ns, accumulator.value(self.aggregation_type),
+            accumulator.count, self.aggregation_type, self.time_window,
+        )
+
+
+class _SlidingState:
+    __slots__ = ('points', 'total', 'min_queue', 'max_queue')
+
+    def __init__(self):
+        self.points = deque()
+        self.total = 0.0
+        # Deque monoton untuk min/max O(1) amortized
+        self.min_queue = deque()
+        self.max_queue = deque()
+
+
+class SlidingWindowAggregator:
+    """
+    Agregasi sliding window per tag: setiap point diganti dengan agregat
+    dari point tag yang sama dalam rentang (ts - time_window, ts].
+    Isi window bertahan antar batch; update O(1) amortized per point.
+    """
+    AGGREGATION_TYPES = ('average', 'sum', 'min', 'max', 'count')
+
+    def __init__(self, time_window: Any = '1m', aggregation_type: str = 'average'):
+        if aggregation_type not in self.AGGREGATION_TYPES:
+            raise ValueError(f"Unknown aggregation type: {aggregation_type}")
+        self.time_window = time_window
+        self.window_ns = parse_time_window(time_window)
+        self.aggregation_type = aggregation_type
+        self._states: Dict[str, _SlidingState] = {}
+        self.activity = TagActivity()
+
+    def expire_tags(self, cutoff: float) -> int:
+        expired = self.activity.expire(cutoff)
+        for tag in expired:
+            self._states.pop(tag, None)
+        return len(expired)
+
+    def run(self, batch: ColumnarBatch) -> ColumnarBatch:
+        if not len(batch):
+            return batch
+        self.activity.touch(batch.tag_names)
+        timestamps = batch.timestamps_ns
+        new_values = batch.values.copy()
+        aggregation_type = self.aggregation_type
+
+        for code, rows in iter_tag_groups(batch.tag_codes):
+            tag = batch.tag_names[code]
+            state = self._states.get(tag)
+            if state is None:
+                state = self._states[tag] = _SlidingState()
+            points, min_queue, max_queue = state.points, state.min_queue, state.max_queue
+
+            out = []
+            for ts, x in zip(timestamps[rows].tolist(), batch.values[rows].tolist()):
+                points.append((ts, x))
+                state.total += x
+                while min_queue and min_queue[-1][1] > x:
+                    min_queue.pop()
+                min_queue.append((ts, x))
+                while max_queue and max_queue[-1][1] < x:
+                    max_queue.pop()
+                max_queue.append((ts, x))
+
+                horizon = ts - self.window_ns
+                while points[0][0] <= horizon:
+                    _, old = points.popleft()
+                    state.total -= old
+                while min_queue[0][0] <= horizon:
+                    min_queue.popleft()
+                while max_queue[0][0] <= horizon:
+                    max_queue.popleft()
+
+                if aggregation_type == 'average':
+                    out.append(state.total / len(points))
+                elif aggregation_type == 'sum':
+                    out.append(state.total)
+                elif aggregation_type == 'min':
+                    out.append(min_queue[0][1])
+                elif aggregation_type == 'max':
+                    out.append(max_queue[0][1])
+                else:
+                    out.append(float(len(points)))
+            new_values[rows] = out
+
+        batch.values = new_values
+        batch.ids = _suffixed(batch.ids, "aggregated")
+        batch.dirty[:] = True
+        logger.debug(f"Applied sliding {aggregation_type} over {self.time_window} to {len(batch)} points.")
+        return batch
+
+
+def _suffixed(ids: np.ndarray, suffix: str) -> np.ndarray:
+    out = np.empty(len(ids), dtype=object)
+    out[:] = [suffix_id(i, suffix) for i in ids]
+    return out
+
+
+def is_streaming(transform_type: TransformType, params: Optional[Dict[str, Any]]) -> bool:
+    """Menentukan apakah sebuah transformasi dijalankan sebagai operator streaming berstate."""
+    if not params:
+        return False
+    if transform_type == TransformType.FILTER:
+        return params.get('filter_type') == 'ewma' or bool(params.get('stateful'))
+    if transform_type == TransformType.AGGREGATE:
+        return bool(params.get('stateful')) or params.get('window_type') in ('tumbling', 'sliding')
+    if transform_type == TransformType.NORMALIZE:
+        return bool(params.get('stateful'))
+    return False
+
+
+def create_operator(transform_type: TransformType, params: Dict[str, Any]):
+    """Membuat operator streaming dari tipe dan parameter transformasi."""
+    if transform_type == TransformType.FILTER:
+        filter_type = params.get('filter_type', 'moving_average')
+        if filter_type == 'moving_average':
+            return StreamingMovingAverage(params.get('window_size', 3))
+        if filter_type == 'ewma':
+            return StreamingEWMA(alpha=params.get('alpha'), span=params.get('span'))
+        raise ValueError(f"Unknown filter type: {filter_type}")
+
+    if transform_type == TransformType.AGGREGATE:
+        window_type = params.get('window_type', 'tumbling')
+        time_window = params.get('time_window', '1m')
+        aggregation_type = params.get('aggregation_type', 'average')
+        if window_type == 'tumbling':
+            return TumblingWindowAggregator(time_window, aggregation_type)
+        if window_type == 'sliding':
+            return SlidingWindowAggregator(time_window, aggregation_type)
+        raise ValueError(f"Unknown window type: {window_type}")
+
+    if transform_type == TransformType.NORMALIZE:
+        return StatefulNormalizer(params.get('method', 'minmax'))
+
+    raise ValueError(f"Transform type {transform_type} has no streaming operator")
+
+
+class StreamStateStore:
+    """
+    Menyimpan operator streaming (beserta state per tag-nya) antar panggilan DataTransformer.
+    Key operator adalah hash rantai transformasi + posisi langkah di dalamnya,
+    sehingga state tetap sama meskipun plan di-compile ulang.
+    Operator yang tidak dipakai selama idle_seconds dibuang, begitu juga state tag yang
+    tidak terlihat selama itu; operator rantai yang dikeluarkan PipelineCache dibuang
+    lewat discard_chain.
+    """
+
+    def __init__(self, idle_seconds: float = config.STREAM_STATE_IDLE_SECONDS):
+        self.idle_seconds = idle_seconds
+        self._operators: Dict[str, Any] = {}
+        self._last_used: Dict[str, float] = {}
+        self._last_sweep = time.monotonic()
+        self._lock = threading.Lock()
+
+    def get_or_create(self, key: str, factory: Callable[[], Any]):
+        now = time.monotonic()
+        with self._lock:
+            operator = self._operators.get(key)
+            if operator is None:
+                operator = self._operators[key] = factory()
+            self._last_used[key] = now
+        if self.idle_seconds > 0 and now - self._last_sweep >= min(self.idle_seconds, 60.0):
+            self.evict_idle(now)
+        return operator
+
+    def run(self, key: str, factory: Callable[[], Any], batch: ColumnarBatch) -> ColumnarBatch:
+        """Menjalankan operator key (dibuat ulang jika sudah dibuang karena idle)."""
+        return self.get_or_create(key, factory).run(batch)
+
+    def discard_chain(self, chain_key: str):
+        """Membuang semua operator milik satu rantai transformasi."""
+        prefix = f"{chain_key}:"
+        with self._lock:
+            for key in [k for k in self._operators if k.startswith(prefix)]:
+                del self._operators[key]
+                self._last_used.pop(key, None)
+
+    def evict_idle(self, now: Optional[float] = None):
+        """Membuang operator yang idle dan state tag yang idle di operator lainnya."""
+        now = now if now is not None else time.monotonic()
+        cutoff = now - self.idle_seconds
+        with self._lock:
+            self._last_sweep = now
+            idle = [key for key, used in self._last_used.items() if used < cutoff]
+            for key in idle:
+                del self._operators[key]
+                del self._last_used[key]
+            operators = list(self._operators.values())
+        expired_tags = sum(op.expire_tags(cutoff) for op in operators if hasattr(op, 'expire_tags'))
+        if idle or expired_tags:
+            logger.info(f"Evicted {len(idle)} idle streaming operators and state of {expired_tags} idle tags.")
+
+    def flush(self) -> List[Dict]:
+        """Mengeluarkan semua window yang masih terbuka dari operator yang mendukungnya."""
+        with self._lock:
+            operators = list(self._operators.values())
+        emitted = []
+        for operator in operators:
+            if hasattr(operator, 'flush'):
+                emitted.extend(operator.flush())
+        return emitted
+
+    def reset(self):
+        with self._lock:
+            self._operators.clear()
+            self._last_used.clear()
+
+    def __len__(self) -> int:
+        return len(self._operators)
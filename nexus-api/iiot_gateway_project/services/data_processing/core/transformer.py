@@ -1,7 +1,6 @@
 # core/transformer.py
 import logging
 from typing import List, Dict, Any
-from datetime import datetime
 import copy
 
 # Import dari schemas, bukan models
@@ -10,6 +9,12 @@ from ..models.data_processing import (
     TransformFunctionResponse, 
     TransformType
 )
+from . import columnar
+from . import aggregation
+from . import normalization
+from .pipeline import PipelineCache, transform_chain_key
+from .streaming import StreamStateStore, is_streaming, create_operator
+from ..config import config
 
 logger = logging.getLogger(__name__)
 
@@ -18,30 +23,53 @@ class DataTransformer:
     Menangani fungsi transformasi data low-code.
     """
 
-    def __init__(self):
-        # Bisa diinisialisasi dengan fungsi transformasi kustom jika diperlukan
-        pass
+    def __init__(self, plan_cache_size: int = config.TRANSFORM_PLAN_CACHE_SIZE):
+        # Cache pipeline terkompilasi untuk mode kolumnar. Instance ini sebaiknya
+        # dibuat sekali (lihat main.py) agar plan dan state streaming dipakai ulang antar request.
+        self.stream_state = StreamStateStore()
+        self.plan_cache = PipelineCache(maxsize=plan_cache_size, state_store=self.stream_state)
 
-    def apply_transformations(self, data_points: List[Dict], transforms: List[Dict]) -> List[Dict]:
+    def apply_transformations(self, data_points: List[Dict], transforms: List[Dict], columnar_mode: bool = False) -> List[Dict]:
         """
         Menerapkan daftar transformasi secara berurutan pada batch data point.
         
         Args:
             data_points: List of data point dictionaries
             transforms: List of transform function dictionaries
+            columnar_mode: Jika True, batch dikonversi ke array NumPy sekali dan
+                transformasi dijalankan sebagai kernel vektor (lihat core/columnar.py)
             
         Returns:
             List of transformed data point dictionaries
         """
         logger.info(f"Applying {len(transforms)} transformations to {len(data_points)} data points.")
+        if columnar_mode:
+            try:
+                batch = columnar.ColumnarBatch.from_dicts(data_points)
+            except (TypeError, ValueError) as e:
+                # Value non-numerik tidak bisa dikonversi ke float64, gunakan jalur dict
+                logger.warning(f"Columnar conversion failed, falling back to dict path: {e}")
+            else:
+                return self._apply_columnar(batch, transforms).to_dicts()
+
         transformed_points = copy.deepcopy(data_points)
+        chain_key = None
 
-        for transform_dict in transforms:
+        for position, transform_dict in enumerate(transforms):
             try:
                 # Konversi ke Pydantic model untuk validasi dan akses yang lebih muda
                 transform = TransformFunctionResponse(**transform_dict)
                 
-                if transform.type == TransformType.SCALE:
+                if is_streaming(transform.type, transform.parameters):
+                    # Operator berstate dipakai bersama dengan mode kolumnar (key yang sama)
+                    chain_key = chain_key or transform_chain_key(transforms)
+                    operator = self.stream_state.get_or_create(
+                        f"{chain_key}:{position}",
+                        lambda: create_operator(transform.type, transform.parameters),
+                    )
+                    batch = columnar.ColumnarBatch.from_dicts(transformed_points)
+                    transformed_points = operator.run(batch).to_dicts()
+                elif transform.type == TransformType.SCALE:
                     transformed_points = self._scale(transformed_points, transform.parameters)
                 elif transform.type == TransformType.NORMALIZE:
                     transformed_points = self._normalize(transformed_points, transform.parameters)
@@ -60,6 +88,18 @@ class DataTransformer:
                 
         return transformed_points
 
+    def _apply_columnar(self, batch: columnar.ColumnarBatch, transforms: List[Dict]) -> columnar.ColumnarBatch:
+        """
+        Menerapkan transformasi pada ColumnarBatch menggunakan pipeline terkompilasi.
+        Rantai transformasi di-parse dan di-fuse sekali, lalu disimpan di plan cache.
+        """
+        plan = self.plan_cache.get(transforms)
+        return plan.run(batch)
+
+    def flush_streaming(self) -> List[Dict]:
+        """Mengeluarkan window agregasi streaming yang masih terbuka (misal saat shutdown)."""
+        return self.stream_state.flush()
+
     def _scale(self, data_points: List[Dict], params: Dict[str, Any]) -> List[Dict]:
         """
         Melakukan scaling linier: y = (x - in_min) * (out_max - out_min) / (in_max - in_min) + out_min
@@ -101,42 +141,15 @@ class DataTransformer:
 
     def _normalize(self, data_points: List[Dict], params: Dict[str, Any]) -> List[Dict]:
         """
-        Melakukan normalisasi data (min-max normalization ke range 0-1).
+        Melakukan normalisasi data per tag (min-max ke range 0-1, atau z-score dengan method='zscore').
+        Dijalankan dengan kernel vektor yang sama dengan mode kolumnar (lihat core/normalization.py).
         """
         if not data_points:
             return data_points
-            
+
         try:
-            # Ekstrak nilai untuk menghitung min/max
-            values = [point.get('value', 0) for point in data_points]
-            if not values:
-                return data_points
-                
-            min_val = min(values)
-            max_val = max(values)
-            
-            if max_val == min_val:
-                logger.warning("All values are the same, normalization not possible.")
-                return data_points
-            
-            normalized_points = []
-            for point_dict in data_points:
-                try:
-                    value = point_dict.get('value', 0)
-                    normalized_value = (value - min_val) / (max_val - min_val)
-                    
-                    new_point_dict = point_dict.copy()
-                    new_point_dict['value'] = normalized_value
-                    new_point_dict['id'] = f"{point_dict.get('id', 'point')}_normalized"
-                    
-                    normalized_points.append(new_point_dict)
-                except Exception as e:
-                    logger.warning(f"Error normalizing point: {e}")
-                    normalized_points.append(point_dict)
-                    
-            logger.debug(f"Normalized {len(normalized_points)} points.")
-            return normalized_points
-            
+            batch = columnar.ColumnarBatch.from_dicts(data_points)
+            return normalization.normalize(batch, params).to_dicts()
         except Exception as e:
             logger.error(f"Error in normalization: {e}")
             return data_points
@@ -216,45 +229,16 @@ class DataTransformer:
 
     def _aggregate(self, data_points: List[Dict], params: Dict[str, Any]) -> List[Dict]:
         """
-        Melakukan agregasi data (contoh: rata-rata per menit).
+        Melakukan agregasi data group-by (tag_id, time_window), satu point per tag per bucket.
+        Dijalankan dengan kernel vektor yang sama dengan mode kolumnar (lihat core/aggregation.py).
+        Dukungan: average/sum/min/max/count/first/last/stddev dan persentil (p50, p95, ...).
         """
-        aggregation_type = params.get('aggregation_type', 'average')
-        time_window = params.get('time_window', '1m')  # 1 menit default
-        
-        # Untuk implementasi sederhana, kita akan menghitung agregasi dasar
         if not data_points:
             return data_points
-            
+
         try:
-            values = [point.get('value', 0) for point in data_points]
-            
-            if aggregation_type == 'average':
-                result_value = sum(values) / len(values) if values else 0
-            elif aggregation_type == 'sum':
-                result_value = sum(values)
-            elif aggregation_type == 'min':
-                result_value = min(values) if values else 0
-            elif aggregation_type == 'max':
-                result_value = max(values) if values else 0
-            else:
-                logger.warning(f"Unknown aggregation type: {aggregation_type}")
-                return data_points
-            
-            # Buat satu point hasil agregasi
-            aggregated_point = {
-                'id': f"aggregated_{datetime.now().isoformat()}",
-                'timestamp': datetime.now().isoformat(),
-                'tag_id': data_points[0].get('tag_id', 'aggregated') if data_points else 'aggregated',
-                'value': result_value,
-                'data_metadata': {
-                    'aggregation_type': aggregation_type,
-                    'original_count': len(data_points)
-                }
-            }
-            
-            logger.debug(f"Aggregated {len(data_points)} points to single value: {result_value}")
-            return [aggregated_point]
-            
+            batch = columnar.ColumnarBatch.from_dicts(data_points)
+            return aggregation.aggregate(batch, params).to_dicts()
         except Exception as e:
             logger.error(f"Error in aggregation: {e}")
             return data_points
\ No newline at end of file
@@ -0,0 +1,174 @@
+# core/write_router.py
+import json
+import time
+import asyncio
+import logging
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Callable
+
+from .buffer_manager import BufferManager
+from .columnar import ColumnarBatch
+from .db_integrator import DatabaseIntegrator
+from ..config import config
+
+logger = logging.getLogger(__name__)
+
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker per storage: setelah failure_threshold kegagalan berturut-turut
+    sirkuit terbuka dan write langsung dialihkan ke buffer selama reset_timeout detik;
+    setelah itu satu write percobaan (half-open) menentukan sirkuit ditutup lagi atau tidak.
+    Percobaan yang dibatalkan tanpa hasil dilepas lewat cancel_trial.
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return STATE_CLOSED
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return STATE_HALF_OPEN
+        return STATE_OPEN
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == STATE_CLOSED:
+            return True
+        if state == STATE_HALF_OPEN and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._trial_in_flight = False
+        if self.failures >= self.failure_threshold or self.opened_at is not None:
+            self.opened_at = time.monotonic()
+
+    def cancel_trial(self):
+        """Write dibatalkan sebelum ada hasil: percobaan half-open berikutnya boleh jalan."""
+        self._trial_in_flight = False
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class WriteRouter:
+    """
+    Fan-out write: satu batch ditulis ke semua StorageConfig aktif secara bersamaan.
+    Batch dikonversi ke ColumnarBatch sekali dan dipakai semua storage. Setiap storage
+    punya timeout dan circuit breaker sendiri; bagian storage yang gagal, timeout,
+    atau sirkuitnya terbuka dialihkan ke buffer (tujuan = ID StorageConfig) untuk
+    dikirim ulang oleh forwarder, tanpa menahan storage yang sehat.
+
+    Pengalihan ke buffer bersifat at-least-once: write yang timeout bisa saja tetap
+    sampai ke storage (mis. baris yang sudah diambil flush InfluxBatchWriter yang sedang
+    berjalan), lalu batch yang sama dikirim lagi dari buffer. Untuk InfluxDB duplikat
+    menimpa titik yang sama (measurement, tag, dan timestamp sama); storage lain bisa
+    menyimpan baris ganda.
+    """
+
+    def __init__(self, db_integrator: DatabaseIntegrator, buffer_manager: BufferManager,
+                 list_configs: Callable[[], List[Dict[str, Any]]]):
+        self.db_integrator = db_integrator
+        self.buffer_manager = buffer_manager
+        self.list_configs = list_configs
+        self._breakers: Dict[str, CircuitBreaker] = {}
+
+    def _breaker(self, config_id: str) -> CircuitBreaker:
+        if config_id not in self._breakers:
+            self._breakers[config_id] = CircuitBreaker(
+                config.FANOUT_BREAKER_FAILURE_THRESHOLD, config.FANOUT_BREAKER_RESET_SECONDS
+            )
+        return self._breakers[config_id]
+
+    async def write(self, data_points: List[Dict], config_ids: Optional[List[str]] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        Menulis data_points ke semua storage aktif (atau hanya config_ids).
+        Mengembalikan hasil per ID storage: status written / buffered / failed.
+        """
+        if not data_points:
+            return {}
+        return await self.write_batch(ColumnarBatch.from_dicts(data_points), config_ids)
+
+    async def write_batch(self, batch: ColumnarBatch, config_ids: Optional[List[str]] = None) -> Dict[str, Dict[str, Any]]:
+        """Seperti write, untuk batch yang sudah kolumnar (mis. hasil transformasi di pipeline ingest)."""
+        storage_configs = [
+            c for c in self.list_configs()
+            if c.get("is_active", True) and (config_ids is None or c["id"] in config_ids)
+        ]
+        if not storage_configs or not len(batch):
+            return {}
+
+        payload_cache: List[str] = []
+
+        def payload() -> str:
+            # Di-serialize sekali, hanya jika ada storage yang perlu dialihkan ke buffer
+            if not payload_cache:
+                payload_cache.append(json.dumps(batch.to_dicts(), default=_json_default))
+            return payload_cache[0]
+
+        results = await asyncio.gather(*(
+            self._write_sink(batch, storage_config, payload) for storage_config in storage_configs
+        ))
+        return {storage_config["id"]: result for storage_config, result in zip(storage_configs, results)}
+
+    async def _write_sink(self, batch: ColumnarBatch, storage_config: Dict[str, Any],
+                          payload: Callable[[], str]) -> Dict[str, Any]:
+        config_id = storage_config["id"]
+        breaker = self._breaker(config_id)
+        timeout = storage_config.get("timeout") or config.FANOUT_SINK_TIMEOUT_SECONDS
+        start = time.perf_counter()
+        error = "circuit open"
+
+        if breaker.allow():
+            try:
+                await asyncio.wait_for(self.db_integrator.write_batch(batch, storage_config), timeout)
+                breaker.record_success()
+                return {"status": "written", "points": len(batch), "circuit": breaker.state,
+                        "latency_ms": round((time.perf_counter() - start) * 1000, 3)}
+            except asyncio.TimeoutError:
+                # Bisa tetap tertulis setelah timeout (at-least-once, lihat docstring kelas)
+                error = f"timed out after {timeout}s"
+                breaker.record_failure()
+            except asyncio.CancelledError:
+                breaker.cancel_trial()
+                raise
+            except Exception as e:
+                error = str(e)
+                breaker.record_failure()
+            logger.warning(f"Fan-out write to storage {config_id} failed ({error}), diverting to buffer.")
+
+        try:
+            entry_id = await self.buffer_manager.enqueue_data(config_id, payload())
+            return {"status": "buffered" if entry_id else "dropped", "points": len(batch), "circuit": breaker.state,
+                    "error": error, "entry_id": entry_id}
+        except Exception as e:
+            logger.error(f"Failed to divert fan-out batch for storage {config_id} to buffer: {e}")
+            return {"status": "failed", "points": len(batch), "circuit": breaker.state,
+                    "error": f"{error}; buffer: {e}"}
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            config_id: {"circuit": breaker.state, "consecutive_failures": breaker.failures}
+            for config_id, breaker in self._breakers.items()
+        }
@@ -4,8 +4,17 @@ import uvicorn
 from .api.v1 import api_router
 from .core.db_integrator import DatabaseIntegrator
 from .core.alarm_manager import AlarmManager
+from .core.buffer_manager import BufferManager
+from .core.forwarder import BufferForwarder
+from .core.write_router import WriteRouter
+from .api.v1.storage import find_storage_config, get_storage_configs_store
+from .core.transformer import DataTransformer
+from .core.rule_engine import RuleEngine
+from .core.rule_sync import RuleSync
+from .core.ingest_pipeline import IngestPipeline
 import logging
 from .databases import init_db, close_db
+from .config import config
 
 # Setup logging yang lebih baik
 logging.basicConfig(level=logging.INFO)
@@ -16,6 +25,13 @@ app = FastAPI(title="IIoT Event & Alarm Service")
 # Inisialisasi komponen inti
 db_integrator = DatabaseIntegrator()
 alarm_manager = AlarmManager() # Instance dibuat di sini
+data_transformer = DataTransformer() # Menyimpan plan cache pipeline transformasi
+buffer_manager = BufferManager() # Satu instance dengan connection pool Redis bersama
+buffer_forwarder = BufferForwarder(buffer_manager, db_integrator, find_storage_config)
+write_router = WriteRouter(db_integrator, buffer_manager, get_storage_configs_store) # Fan-out ke semua storage aktif
+rule_engine = RuleEngine()
+rule_sync = RuleSync(rule_engine) # Memuat rule dari database dan menerapkan perubahan dari API/worker lain
+ingest_pipeline = IngestPipeline(rule_engine, alarm_manager, write_router) # decode -> transform -> rules -> alarms -> storage
 
 @app.on_event("startup")
 async def startup_event():
@@ -47,8 +63,35 @@ async def startup_event():
         # Anda bisa memilih untuk menghentikan startup jika AlarmManager kritis
         # raise # Uncomment jika ingin aplikasi tidak jalan tanpa AlarmManager
 
+    logger.info("Loading alarm rules...")
+    try:
+        await rule_sync.start(alarm_manager if app.state.alarm_manager_initialized else None)
+        logger.info("Alarm rules loaded successfully.")
+    except Exception as e:
+        logger.error(f"Failed to load alarm rules: {e}", exc_info=True)
+    app.state.rule_engine = rule_engine
+    app.state.rule_sync = rule_sync
+
+    logger.info("Initializing BufferManager...")
+    try:
+        await buffer_manager.initialize()
+        app.state.buffer_manager_initialized = True
+        logger.info("BufferManager initialized successfully.")
+    except Exception as e:
+        logger.error(f"Failed to initialize BufferManager: {e}", exc_info=True)
+        app.state.buffer_manager_initialized = False
+    app.state.buffer_manager = buffer_manager
+
+    if config.FORWARDER_ENABLED and app.state.buffer_manager_initialized:
+        # Forwarder per tujuan: mengosongkan buffer ke storage di background
+        await buffer_forwarder.start()
+    app.state.buffer_forwarder = buffer_forwarder
+
     # Simpan db_integrator juga jika diperlukan di tempat lain
     app.state.db_integrator = db_integrator
+    app.state.data_transformer = data_transformer
+    app.state.write_router = write_router
+    app.state.ingest_pipeline = ingest_pipeline
     
     logger.info("Startup process completed (with potential errors logged above)")
 
@@ -57,6 +100,21 @@ async def shutdown_event():
     """Cleanup saat aplikasi shutdown."""
     await close_db()
     logger.info("Shutting down application...")
+    await buffer_forwarder.stop()
+    # Window agregasi streaming yang masih terbuka ditulis ke semua storage aktif
+    # (atau dialihkan ke buffer), bukan hilang saat restart
+    try:
+        window_points = data_transformer.flush_streaming()
+        if window_points:
+            results = await write_router.write(window_points)
+            statuses = {config_id: result["status"] for config_id, result in results.items()}
+            logger.info(f"Flushed {len(window_points)} open streaming windows on shutdown: {statuses}")
+    except Exception as e:
+        logger.error(f"Failed to flush streaming windows on shutdown: {e}", exc_info=True)
+    # Setelah forwarder berhenti: flush antrean writer InfluxDB, hentikan maintenance registry
+    await db_integrator.close()
+    await rule_sync.close()
+    await buffer_manager.close()
     # Tambahkan cleanup jika diperlukan
 
 app.include_router(api_router, prefix="/api/v1")
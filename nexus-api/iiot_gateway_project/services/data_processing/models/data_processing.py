@@ -108,6 +108,22 @@ class BufferedDataEntryResponse(BufferedDataEntryBase):
 
     model_config = ConfigDict(from_attributes=True)
 
+class BufferedBatchEnqueueRequest(BaseModel):
+    destination: str
+    payloads: List[str]
+    max_retries: int = 3
+    chunk_size: Optional[int] = None
+
+class BufferedBatchEnqueueResponse(BaseModel):
+    destination: str
+    enqueued_count: int
+    dropped_count: int = 0
+    chunk_count: int
+    first_id: Optional[str] = None
+    last_id: Optional[str] = None
+    elapsed_ms: float
+    entries_per_second: float
+
 # --- Model untuk TimeSeries Database Integration ---
 class StorageType(str, Enum):
     POSTGRES = "postgres"